@@ -6,7 +6,7 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[('src/assets', 'assets')],
-    hiddenimports=['PIL._tkinter_finder', 'customtkinter', 'pandas', 'openpyxl', 'moviepy'],
+    hiddenimports=['PIL._tkinter_finder', 'customtkinter', 'openpyxl', 'moviepy'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
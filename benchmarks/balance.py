@@ -0,0 +1,63 @@
+"""
+Benchmark the designer balancers on synthetic file groups
+
+Reports runtime and makespan against the lower bound max(total / capacity, largest group)
+for the old linear scan and the heap LPT balancer, in each balance mode.
+
+Usage: python benchmarks/balance.py [--groups 100000] [--designers 60] [--seed 1]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from balance_utils import BALANCE_MODES, BALANCERS, create_balancer, file_weight
+
+def make_groups(count, seed):
+    """Product shot groups: mostly 3-6 files, a long tail of big ones, sizes in the MB range"""
+    rng = random.Random(seed)
+    groups = []
+    for _ in range(count):
+        files = max(1, min(40, int(rng.lognormvariate(1.4, 0.5))))
+        groups.append([(rng.randint(500_000, 30_000_000), rng.random() < 0.5) for _ in range(files)])
+    return groups
+
+def lower_bound(weights, capacities):
+    return max(sum(weights) / sum(capacities), max(weights) / max(capacities))
+
+def run(strategy, weights, capacities):
+    items = list(enumerate(weights))
+    started = time.perf_counter()
+    balancer = create_balancer(len(capacities), capacities, strategy)
+    balancer.distribute(items)
+    return time.perf_counter() - started, balancer.makespan
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--groups', type=int, default=100_000)
+    parser.add_argument('--designers', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    groups = make_groups(args.groups, args.seed)
+    rng = random.Random(args.seed)
+    capacity_sets = {
+        'equal': [1.0] * args.designers,
+        'weighted': [rng.choice([0.5, 1.0, 1.0, 1.5]) for _ in range(args.designers)],
+    }
+
+    print(f"{args.groups} groups, {sum(len(group) for group in groups)} files, {args.designers} designers")
+    print(f"{'mode':<8} {'capacity':<9} {'balancer':<8} {'seconds':>9} {'makespan / bound':>17}")
+    for mode in BALANCE_MODES:
+        weights = [sum(file_weight(mode, size, is_white) for size, is_white in group) for group in groups]
+        for capacity_name, capacities in capacity_sets.items():
+            bound = lower_bound(weights, capacities)
+            for strategy in BALANCERS:
+                seconds, makespan = run(strategy, weights, capacities)
+                print(f"{mode:<8} {capacity_name:<9} {strategy:<8} {seconds:>9.3f} {makespan / bound:>17.5f}")
+
+if __name__ == '__main__':
+    main()
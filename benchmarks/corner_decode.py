@@ -0,0 +1,84 @@
+"""
+Benchmark the corner-only partial decode used by Split Image against a full decode
+
+Usage: python benchmarks/corner_decode.py [--size 8000x6000] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from PIL import Image, ImageDraw
+from image_utils import CORNER_SIZE, is_white_background
+
+FORMATS = [
+    ('.jpg', {'quality': 92}),
+    ('.png', {}),
+    ('.tiff', {'compression': 'tiff_lzw'}),
+    ('.tiff', {}),
+    ('.bmp', {}),
+]
+
+def full_decode_is_white(image_path):
+    """Corner check as it was before partial decoding: load every pixel, then look at the corners"""
+    try:
+        with Image.open(image_path) as img:
+            width, height = img.size
+            pixels = img.load()
+            left = all(pixels[x, y][:3] == (255, 255, 255) for x in range(CORNER_SIZE) for y in range(CORNER_SIZE))
+            right = all(pixels[x, y][:3] == (255, 255, 255) for x in range(width - CORNER_SIZE, width) for y in range(CORNER_SIZE))
+            return left or right
+    except Exception:
+        return False
+
+def make_product_shot(path, size, white, save_args):
+    """Draw a studio-style shot: flat background with a product block in the middle"""
+    width, height = size
+    img = Image.new('RGB', size, (255, 255, 255) if white else (182, 176, 168))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((width // 4, height // 6, width * 3 // 4, height * 5 // 6), fill=(40, 60, 90))
+    draw.ellipse((width // 3, height // 3, width * 2 // 3, height * 2 // 3), fill=(200, 30, 60))
+    img.save(path, **save_args)
+
+def time_call(func, path, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(path)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size', default='8000x6000', help='image size as WIDTHxHEIGHT')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measurement, best is kept')
+    args = parser.parse_args()
+    size = tuple(int(part) for part in args.size.lower().split('x'))
+
+    print(f"{'format':<18}{'background':<12}{'full (s)':>10}{'partial (s)':>13}{'speedup':>10}  match")
+    mismatches = 0
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for index, (ext, save_args) in enumerate(FORMATS):
+            for white in (True, False):
+                path = os.path.join(temp_dir, f"shot_{index}_{int(white)}{ext}")
+                make_product_shot(path, size, white, save_args)
+                full_time, full_result = time_call(full_decode_is_white, path, args.repeat)
+                partial_time, partial_result = time_call(is_white_background, path, args.repeat)
+                match = full_result == partial_result
+                mismatches += not match
+                label = ext + (f" ({save_args['compression']})" if 'compression' in save_args else '')
+                print(f"{label:<18}{'white' if white else 'grey':<12}{full_time:>10.4f}{partial_time:>13.4f}"
+                      f"{full_time / max(partial_time, 1e-9):>9.1f}x  {'yes' if match else 'NO'}")
+                os.remove(path)
+
+    if mismatches:
+        print(f"{mismatches} classification mismatch(es)")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+Generate a synthetic Split Image source tree
+
+Files are product shots grouped by a 13-digit file ID, as vendors deliver them: a flat white
+or grey background with a product block, in a mix of formats and sizes, spread over subfolders.
+The same arguments and seed always produce the same tree.
+
+Usage: python benchmarks/dataset.py DEST [--files 2000] [--formats .jpg,.png,.tiff,.bmp,.gif]
+           [--sizes 1200x900,800x600] [--group-size 1-6] [--white-ratio 0.5] [--subfolders 4]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+from PIL import Image, ImageDraw
+
+FORMATS = ('.jpg', '.png', '.tiff', '.bmp', '.gif')
+
+# Encoder settings close to what vendors deliver
+SAVE_OPTIONS = {
+    '.jpg': {'quality': 90},
+    '.png': {'compress_level': 6},
+    '.tiff': {'compression': 'tiff_lzw'},
+    '.bmp': {},
+    '.gif': {},
+}
+
+# Background of non-white shots: a light studio grey that fails the corner check
+GREY_BACKGROUND = (182, 176, 168)
+
+MANIFEST_FILE = 'dataset.json'
+
+class SyntheticFile(NamedTuple):
+    relpath: str
+    size: Tuple[int, int]
+    white: bool
+
+def parse_sizes(text: str) -> List[Tuple[int, int]]:
+    sizes = []
+    for item in text.split(','):
+        width, _, height = item.strip().lower().partition('x')
+        sizes.append((int(width), int(height)))
+    return sizes
+
+def parse_range(text: str) -> Tuple[int, int]:
+    low, _, high = text.partition('-')
+    low, high = int(low), int(high or low)
+    if low < 1 or high < low:
+        raise ValueError(f"invalid range: {text}")
+    return low, high
+
+def plan_tree(files: int, formats: Sequence[str] = FORMATS, sizes: Sequence[Tuple[int, int]] = ((1200, 900),),
+              group_size: Tuple[int, int] = (1, 6), white_ratio: float = 0.5, subfolders: int = 4,
+              seed: int = 1) -> List[SyntheticFile]:
+    """
+    Decide every file's name, folder, format, size and background without writing anything
+    """
+    rng = random.Random(seed)
+    planned = []
+    file_id = 4000000000000
+    while len(planned) < files:
+        file_id += rng.randint(1, 20)
+        folder = f"Shoot_{rng.randrange(subfolders):02d}" if subfolders else ''
+        # Views of a product share a background, like a real shoot
+        white = rng.random() < white_ratio
+        size = rng.choice(sizes)
+        for view in range(min(rng.randint(*group_size), files - len(planned))):
+            name = f"{file_id}_{view}{rng.choice(formats)}"
+            planned.append(SyntheticFile(os.path.join(folder, name), size, white))
+    return planned
+
+def draw_shot(path: str, size: Tuple[int, int], white: bool, seed: int):
+    rng = random.Random(seed)
+    width, height = size
+    img = Image.new('RGB', size, (255, 255, 255) if white else GREY_BACKGROUND)
+    draw = ImageDraw.Draw(img)
+    left, top = rng.randint(width // 8, width // 3), rng.randint(height // 8, height // 3)
+    draw.rectangle((left, top, width - left, height - top),
+                   fill=(rng.randrange(40, 200), rng.randrange(40, 200), rng.randrange(40, 200)))
+    draw.ellipse((left + 10, top + 10, left + width // 6, top + height // 6), fill=(250, 250, 250))
+    ext = os.path.splitext(path)[1]
+    if ext == '.gif':
+        img = img.convert('P', palette=Image.ADAPTIVE)
+    img.save(path, **SAVE_OPTIONS[ext])
+
+def _draw_batch(batch):
+    for path, size, white, seed in batch:
+        draw_shot(path, size, white, seed)
+
+def generate_tree(dest: str, planned: Sequence[SyntheticFile], jobs: int = 1, settings: Dict = None) -> Dict:
+    """
+    Write the planned files under dest, plus a manifest of how the tree was made; returns the manifest
+    """
+    work = []
+    for number, item in enumerate(planned):
+        path = os.path.join(dest, item.relpath)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        work.append((path, item.size, item.white, number))
+    batches = [work[start:start + 50] for start in range(0, len(work), 50)]
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            list(executor.map(_draw_batch, batches))
+    else:
+        for batch in batches:
+            _draw_batch(batch)
+
+    manifest = dict(settings or {}, files=len(planned), white=sum(item.white for item in planned),
+                    bytes=sum(os.path.getsize(path) for path, _, _, _ in work))
+    with open(os.path.join(dest, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--files', type=int, default=2000)
+    parser.add_argument('--formats', default=','.join(FORMATS), help='Comma separated extensions')
+    parser.add_argument('--sizes', default='1200x900', help='Comma separated WxH sizes, picked per group')
+    parser.add_argument('--group-size', default='1-6', help='Files per group, MIN-MAX')
+    parser.add_argument('--white-ratio', type=float, default=0.5)
+    parser.add_argument('--subfolders', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='Processes encoding images')
+
+def settings_from_args(args) -> Dict:
+    formats = [ext if ext.startswith('.') else f'.{ext}' for ext in args.formats.lower().split(',')]
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        raise ValueError(f"unsupported formats: {', '.join(sorted(unknown))}")
+    return dict(formats=formats, sizes=parse_sizes(args.sizes), group_size=parse_range(args.group_size),
+                white_ratio=args.white_ratio, subfolders=args.subfolders, seed=args.seed)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('dest')
+    add_arguments(parser)
+    args = parser.parse_args()
+    try:
+        settings = settings_from_args(args)
+    except ValueError as e:
+        parser.error(str(e))
+    if os.path.exists(args.dest) and os.listdir(args.dest):
+        parser.error(f"{args.dest} is not empty")
+    manifest = generate_tree(args.dest, plan_tree(args.files, **settings), args.jobs, settings)
+    json.dump(manifest, sys.stdout, indent=2)
+    print()
+
+if __name__ == '__main__':
+    main()
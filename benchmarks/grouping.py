@@ -0,0 +1,92 @@
+"""
+Measure memory and time for grouping a large catalog by file ID
+
+Compares the old dict of path lists plus a path -> size dict with GroupIndex, on synthetic
+paths shaped like a product shoot delivery. Nothing touches the disk.
+
+Usage: python benchmarks/grouping.py [--files 500000] [--folders 200]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from group_utils import FileIdExtractor, GroupIndex
+
+def make_entries(count, folders, seed=1):
+    """Yield (path, name, size) like a scan would, folder by folder, with fresh strings each time"""
+    rng = random.Random(seed)
+    roots = [f"/Volumes/Ingest/2024-06-{day % 30 + 1:02d}/Shoot_{shoot:03d}" for shoot, day in
+             enumerate(range(folders))]
+    per_folder = -(-count // folders)
+    product = 4000000000000
+    produced = 0
+    for folder in roots:
+        in_folder = 0
+        while in_folder < per_folder and produced < count:
+            product += rng.randint(1, 50)
+            for view in range(min(rng.randint(1, 8), per_folder - in_folder, count - produced)):
+                name = f"{product}_{view}_{rng.choice(['A', 'B', 'C'])}.{rng.choice(['jpg', 'tif', 'png'])}"
+                yield f"{folder}/{name}", name, rng.randint(500000, 30000000)
+                in_folder += 1
+                produced += 1
+
+def legacy_extract(filename):
+    if len(filename) >= 13 and filename[:13].isdigit():
+        return filename[:13]
+    elif len(filename) >= 12:
+        return filename[:12]
+    return None
+
+def group_legacy(entries):
+    image_groups = {}
+    file_sizes = {}
+    for path, name, size in entries:
+        file_id = legacy_extract(name)
+        if file_id:
+            if file_id not in image_groups:
+                image_groups[file_id] = []
+            image_groups[file_id].append(path)
+            file_sizes[path] = size
+    return image_groups, file_sizes
+
+def group_indexed(entries):
+    extract = FileIdExtractor()
+    index = GroupIndex()
+    for path, name, size in entries:
+        file_id = extract(name)
+        if file_id:
+            index.add(path, file_id, size, name)
+    index.members(0)
+    return index
+
+def measure(function, count, folders):
+    started = time.perf_counter()
+    function(make_entries(count, folders))
+    elapsed = time.perf_counter() - started
+
+    # Memory is measured on a second run, since tracing slows allocation down
+    tracemalloc.start()
+    result = function(make_entries(count, folders))
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return elapsed, used
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--files', type=int, default=500000)
+    parser.add_argument('--folders', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{args.files} files in {args.folders} folders; time includes generating the entries")
+    for label, function in (('dict of lists', group_legacy), ('GroupIndex', group_indexed)):
+        elapsed, used = measure(function, args.files, args.folders)
+        print(f"{label:<14} {elapsed:6.2f}s  {used / 2**20:8.1f} MiB  {used / args.files:6.0f} bytes/file")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+"""
+Benchmark Split Image end to end on a synthetic tree
+
+Generates a tree with benchmarks/dataset.py, then runs ImageProcessor on fresh copies of it,
+each in its own process. Prints per-phase seconds and files/sec, total throughput and peak RSS
+as JSON. With --baseline, compares against an earlier result and exits 1 on a regression.
+
+Usage: python benchmarks/split_image.py [--files 2000] [--designers 6] [--repeat 3]
+           [--dataset DIR] [--output result.json] [--baseline result.json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC)
+
+from dataset import MANIFEST_FILE, add_arguments, generate_tree, plan_tree, settings_from_args
+
+# Phases shorter than this in the baseline are too noisy to compare
+MIN_COMPARABLE_SECONDS = 0.05
+
+# Settings that must match for two results to be compared
+COMPARED_CONFIG = ('files', 'formats', 'sizes', 'group_size', 'white_ratio', 'subfolders', 'seed',
+                   'designers', 'workers', 'pipeline', 'balance')
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process and of its largest finished child, in MiB
+    """
+    try:
+        import resource
+    except ImportError:
+        return None, None
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    scale = 1 if sys.platform == 'darwin' else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale / 2**20
+    return round(own, 1), round(children, 1)
+
+def run_once(source, config):
+    """
+    Split one copy of the tree in this process and return its measurements
+    """
+    from image_processor import ImageProcessor
+
+    finished = {}
+    processor = ImageProcessor(source, config['designers'], lambda *_: None, finished.update, lambda *_: None,
+                               max_workers=config['workers'], use_cache=False, resume=False,
+                               pipeline=config['pipeline'], balance_mode=config['balance'])
+    started = time.perf_counter()
+    # ImageProcessor logs with print; stdout is reserved for the JSON result
+    with contextlib.redirect_stdout(sys.stderr):
+        processor.run()
+    elapsed = time.perf_counter() - started
+    own, children = peak_rss_mb()
+    return dict(completed=bool(finished), files=finished.get('total_images', 0), seconds=round(elapsed, 4),
+                phases={name: round(seconds, 4) for name, seconds in processor.phase_times.items()},
+                peak_rss_mb=own, worker_peak_rss_mb=children)
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SRC, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def summarize(runs, files):
+    """
+    Median of each phase over the runs, so one slow run does not decide the result
+    """
+    phases = {}
+    for name in dict.fromkeys(name for run in runs for name in run['phases']):
+        seconds = statistics.median(run['phases'].get(name, 0.0) for run in runs)
+        phases[name] = dict(seconds=round(seconds, 4),
+                            files_per_second=round(files / seconds, 1) if seconds > 0 else None)
+    seconds = statistics.median(run['seconds'] for run in runs)
+    rss = [run['peak_rss_mb'] for run in runs if run['peak_rss_mb'] is not None]
+    worker_rss = [run['worker_peak_rss_mb'] for run in runs if run['worker_peak_rss_mb'] is not None]
+    return dict(seconds=round(seconds, 4), files_per_second=round(files / seconds, 1) if seconds > 0 else None,
+                peak_rss_mb=max(rss) if rss else None, worker_peak_rss_mb=max(worker_rss) if worker_rss else None,
+                phases=phases)
+
+def compare(result, baseline, max_slowdown, max_rss_growth):
+    """
+    Regressions of result against baseline, as readable strings
+    """
+    regressions = []
+    for name, phase in baseline['phases'].items():
+        current = result['phases'].get(name)
+        if current is None or phase['seconds'] < MIN_COMPARABLE_SECONDS:
+            continue
+        if current['seconds'] > phase['seconds'] * (1 + max_slowdown):
+            regressions.append(f"{name}: {current['seconds']:.3f}s vs {phase['seconds']:.3f}s")
+    if baseline['files_per_second'] and result['files_per_second'] and \
+            result['files_per_second'] * (1 + max_slowdown) < baseline['files_per_second']:
+        regressions.append(f"throughput: {result['files_per_second']} vs {baseline['files_per_second']} files/sec")
+    for key in ('peak_rss_mb', 'worker_peak_rss_mb'):
+        if baseline.get(key) and result.get(key) and result[key] > baseline[key] * (1 + max_rss_growth):
+            regressions.append(f"{key}: {result[key]} vs {baseline[key]} MiB")
+    return regressions
+
+def prepare_dataset(folder, args, settings):
+    """
+    Reuse the tree in folder if it was made with the same settings, otherwise generate it
+    """
+    manifest_path = os.path.join(folder, MANIFEST_FILE)
+    wanted = json.loads(json.dumps(dict(settings, files=args.files)))
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if {key: manifest.get(key) for key in wanted} == wanted:
+            return manifest
+        shutil.rmtree(folder)
+    elif os.path.isdir(folder) and os.listdir(folder):
+        raise ValueError(f"{folder} is not empty and was not made by this benchmark")
+    print(f"Generating {args.files} files in {folder}", file=sys.stderr)
+    return generate_tree(folder, plan_tree(args.files, **settings), args.jobs, settings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_arguments(parser)
+    parser.add_argument('--designers', type=int, default=6)
+    parser.add_argument('--workers', type=int, default=None, help='Classification processes (default: CPU count)')
+    parser.add_argument('--pipeline', action='store_true')
+    parser.add_argument('--balance', default='count')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--dataset', default=None, metavar='DIR',
+                        help='Keep the generated tree here and reuse it on later runs')
+    parser.add_argument('--output', default=None, metavar='FILE', help='Also write the result to FILE')
+    parser.add_argument('--baseline', default=None, metavar='FILE', help='Earlier result to compare against')
+    parser.add_argument('--max-slowdown', type=float, default=0.25,
+                        help='Allowed fractional slowdown of any phase, or of throughput (default: 0.25)')
+    parser.add_argument('--max-rss-growth', type=float, default=0.25,
+                        help='Allowed fractional growth of peak RSS (default: 0.25)')
+    parser.add_argument('--run-one', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    config = dict(designers=args.designers, workers=args.workers, pipeline=args.pipeline, balance=args.balance)
+    if args.run_one:
+        json.dump(run_once(args.run_one, config), sys.stdout)
+        return 0
+
+    try:
+        settings = settings_from_args(args)
+    except ValueError as e:
+        parser.error(str(e))
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            parser.error(f"--baseline: {e}")
+    scratch = tempfile.mkdtemp(prefix='sg_one_bench_')
+    try:
+        pristine = os.path.abspath(args.dataset) if args.dataset else os.path.join(scratch, 'pristine')
+        try:
+            manifest = prepare_dataset(pristine, args, settings)
+        except ValueError as e:
+            parser.error(f"--dataset: {e}")
+
+        runs = []
+        for number in range(args.repeat):
+            work = os.path.join(scratch, f'run_{number}')
+            shutil.copytree(pristine, work, ignore=shutil.ignore_patterns(MANIFEST_FILE))
+            # A process per run, so peak RSS belongs to that run alone
+            child = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-one', work,
+                                    *sys.argv[1:]], stdout=subprocess.PIPE, text=True)
+            shutil.rmtree(work, ignore_errors=True)
+            if child.returncode != 0 or not child.stdout.strip():
+                print(f"Run {number + 1} failed", file=sys.stderr)
+                return 2
+            run = json.loads(child.stdout)
+            if not run['completed']:
+                print(f"Run {number + 1} did not complete", file=sys.stderr)
+                return 2
+            runs.append(run)
+            print(f"Run {number + 1}: {run['seconds']:.2f}s", file=sys.stderr)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    result = dict(benchmark='split_image', commit=git_commit(), python=platform.python_version(),
+                  platform=platform.platform(), cpu_count=os.cpu_count(),
+                  config=dict(json.loads(json.dumps(settings)), files=manifest['files'], **config),
+                  dataset=dict(files=manifest['files'], white=manifest['white'], bytes=manifest['bytes']),
+                  **summarize(runs, manifest['files']), runs=runs)
+
+    status = 0
+    if baseline is not None:
+        mismatched = [key for key in COMPARED_CONFIG if baseline['config'].get(key) != result['config'].get(key)]
+        if mismatched:
+            print(f"Baseline was run with different settings: {', '.join(mismatched)}", file=sys.stderr)
+            return 2
+        result['baseline_commit'] = baseline.get('commit')
+        result['regressions'] = compare(result, baseline, args.max_slowdown, args.max_rss_growth)
+        status = 1 if result['regressions'] else 0
+
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    print(text)
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -45,7 +45,6 @@ def create_macos_app():
         '--add-data=src/assets:assets',  # Include assets
         '--hidden-import=PIL._tkinter_finder',
         '--hidden-import=customtkinter',
-        '--hidden-import=pandas',
         '--hidden-import=openpyxl',
         '--hidden-import=moviepy',
         '--osx-bundle-identifier=com.saksglobal.sgone',  # Bundle identifier
@@ -73,7 +72,6 @@ def create_windows_exe():
         '--add-data=src/assets;assets',
         '--hidden-import=PIL._tkinter_finder',
         '--hidden-import=customtkinter',
-        '--hidden-import=pandas',
         '--hidden-import=openpyxl',
         '--hidden-import=moviepy',
         '--uac-admin',
@@ -1,9 +1,14 @@
 import os
+import time
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tkinter import filedialog, messagebox, scrolledtext
 import customtkinter as ctk
-from utils import CompressionUtils, ExtractionUtils, get_archive_type
+from utils import CompressionUtils, ExtractionUtils, collect_files, get_archive_type, total_size
 from datetime import datetime
+from job_utils import BackgroundJob, JobCancelled
+from progress_utils import ProgressBus
+from store_utils import format_bytes
 
 class FileCompressApp(ctk.CTkFrame):
     def __init__(self, root, dashboard):
@@ -17,6 +22,13 @@ class FileCompressApp(ctk.CTkFrame):
         self.last_save_location = os.path.expanduser("~")
         self.last_batch_parent_location = os.path.expanduser("~")  # New variable for batch zip parent folder
         
+        # Folders Batch Zip compresses at once
+        self.batch_workers_var = tk.StringVar(value=str(min(4, os.cpu_count() or 1)))
+        
+        # Jobs run on a worker thread and report back through the bus
+        self.progress_bus = ProgressBus()
+        self.job = None
+        
         # Create main container to hold content and log
         main_container = ctk.CTkFrame(self, fg_color="transparent")
         main_container.pack(fill=tk.BOTH, expand=True)
@@ -127,6 +139,32 @@ class FileCompressApp(ctk.CTkFrame):
         )
         batch_zip_btn.pack(fill=tk.X)
         
+        # Batch Zip concurrency
+        batch_workers_frame = ctk.CTkFrame(selection_frame, fg_color="transparent")
+        batch_workers_frame.pack(fill=tk.X, pady=(10, 0))
+        
+        ctk.CTkLabel(
+            batch_workers_frame,
+            text="Batch folders at once:",
+            font=ctk.CTkFont(size=14),
+            text_color="#FFFFFF"
+        ).pack(side=tk.LEFT, padx=5)
+        
+        ctk.CTkOptionMenu(
+            batch_workers_frame,
+            values=[str(i) for i in range(1, 17)],
+            variable=self.batch_workers_var,
+            width=80,
+            height=30,
+            font=ctk.CTkFont(size=14),
+            dropdown_font=ctk.CTkFont(size=14),
+            fg_color="#404040",
+            button_color="#404040",
+            button_hover_color="#505050",
+            dropdown_fg_color="#404040",
+            dropdown_hover_color="#505050"
+        ).pack(side=tk.LEFT, padx=10)
+        
         # Extract button
         extract_btn = ctk.CTkButton(
             buttons_frame,
@@ -139,6 +177,7 @@ class FileCompressApp(ctk.CTkFrame):
             corner_radius=10
         )
         extract_btn.pack(fill=tk.X, pady=10)
+        self.action_buttons = [select_files_btn, select_folder_btn, batch_zip_btn, extract_btn]
         
         # Progress bar with modern style
         self.progress = ctk.CTkProgressBar(
@@ -151,6 +190,25 @@ class FileCompressApp(ctk.CTkFrame):
         )
         self.progress.set(0)
         
+        self.progress_label = ctk.CTkLabel(
+            content_frame,
+            text="",
+            font=ctk.CTkFont(size=12),
+            text_color="#AAAAAA"
+        )
+        
+        # Cancel button, shown while a job runs
+        self.cancel_btn = ctk.CTkButton(
+            content_frame,
+            text="Cancel",
+            font=ctk.CTkFont(size=14, weight="bold"),
+            height=36,
+            command=self.cancel_job,
+            fg_color="#333333",
+            hover_color="#404040",
+            corner_radius=10
+        )
+        
         # Create log panel
         log_frame = ctk.CTkFrame(main_container, fg_color="#252525", corner_radius=15, width=300)
         log_frame.pack(side=tk.RIGHT, fill=tk.BOTH, padx=(10, 0), pady=0)
@@ -232,49 +290,74 @@ class FileCompressApp(ctk.CTkFrame):
         # Get the directory of the first selected item
         base_dir = os.path.dirname(paths[0])
             
-        # Show progress
-        self.progress.pack(pady=20)
-        self.progress.start()
-        
-        # Log files being excluded
-        for path in paths:
-            if os.path.isfile(path):
-                if CompressionUtils.should_exclude_file(path):
-                    self.add_log(f"Excluding system file: {os.path.basename(path)}")
-            else:
-                # Check directory contents
-                for root, dirs, files in os.walk(path):
-                    excluded_files = [f for f in files if CompressionUtils.should_exclude_file(f)]
-                    if excluded_files:
-                        self.add_log(f"Excluding system files from {os.path.basename(root)}: {', '.join(excluded_files)}")
+        outputs = self.selected_outputs(base_dir, base_name, self.selected_formats())
         
-        # Compress files in selected formats
-        success_messages = []
-        error_messages = []
-        
-        if self.zip_var.get():
-            output_path = os.path.join(base_dir, f"{base_name}.zip")
-            self.add_log(f"Starting compression in ZIP format...")
-            success, message = CompressionUtils.compress_to_zip(paths, output_path)
-            if success:
-                success_messages.append(f"ZIP: {message}")
-            else:
-                error_messages.append(f"ZIP: {message}")
-                
-        if self.sevenz_var.get():
-            output_path = os.path.join(base_dir, f"{base_name}.7z")
-            self.add_log(f"Starting compression in 7Z format...")
-            success, message = CompressionUtils.compress_to_7z(paths, output_path)
-            if success:
-                success_messages.append(f"7Z: {message}")
-            else:
-                error_messages.append(f"7Z: {message}")
+        def work(control):
+            # Walk the selection once, for the log and for every format
+            all_files, excluded = collect_files(paths)
+            self.log_excluded(excluded, control.log)
+            control.expect(total_size(all_files))
             
-        # Hide progress
-        self.progress.stop()
-        self.progress.pack_forget()
+            # Compress files in selected formats, reading each file once for all of them
+            if outputs:
+                control.log(f"Starting compression in {' and '.join(kind.upper() for kind in outputs)} format...")
+            return self.collect_results(
+                CompressionUtils.compress_to_formats(paths, outputs, files=all_files, control=control))
         
-        # Show results
+        self.start_job(work)
+    
+    def start_job(self, work):
+        """Run work(control) on a worker thread, keeping the window responsive"""
+        for button in self.action_buttons:
+            button.configure(state="disabled")
+        self.progress.set(0)
+        self.progress_label.configure(text="")
+        self.progress.pack(pady=(20, 5))
+        self.progress_label.pack()
+        self.cancel_btn.pack(pady=10)
+        self.cancel_btn.configure(state="normal")
+        self.job = BackgroundJob(work, self.progress_bus)
+        self.progress_bus.start(self, self.apply_updates)
+        self.job.start()
+    
+    def cancel_job(self):
+        if self.job is not None:
+            self.job.cancel()
+            self.cancel_btn.configure(state="disabled")
+            self.add_log("Cancelling...")
+    
+    def finish_job(self):
+        self.progress_bus.stop()
+        self.job = None
+        self.progress.pack_forget()
+        self.progress_label.pack_forget()
+        self.cancel_btn.pack_forget()
+        for button in self.action_buttons:
+            button.configure(state="normal")
+    
+    def apply_updates(self, updates, logs):
+        """Apply one frame of job updates on the Tk thread"""
+        for message in logs:
+            self.add_log(message)
+        if 'progress' in updates:
+            self.update_progress(*updates['progress'])
+        if 'complete' in updates:
+            self.finish_job()
+            self.show_results(*updates['complete'][0])
+        elif 'cancelled' in updates:
+            self.finish_job()
+            self.add_log("Cancelled; the unfinished output was removed")
+        elif 'failed' in updates:
+            self.finish_job()
+            self.show_results([], updates['failed'])
+    
+    def update_progress(self, done, total, elapsed):
+        self.progress.set(min(1, done / total) if total else 0)
+        rate = done / elapsed if elapsed > 0 else 0
+        self.progress_label.configure(
+            text=f"{format_bytes(done)} of {format_bytes(total)} ({format_bytes(rate)}/s)")
+    
+    def show_results(self, success_messages, error_messages):
         if success_messages:
             self.add_log("Success: " + "\n".join(success_messages))
             messagebox.showinfo("Success", "\n".join(success_messages))
@@ -282,6 +365,48 @@ class FileCompressApp(ctk.CTkFrame):
             self.add_log("Error: " + "\n".join(error_messages))
             messagebox.showerror("Error", "\n".join(error_messages))
     
+    def log_excluded(self, excluded, log):
+        """Log the system files left out, one line per folder"""
+        by_folder = {}
+        for path in excluded:
+            by_folder.setdefault(os.path.dirname(path), []).append(os.path.basename(path))
+        for folder, names in by_folder.items():
+            log(f"Excluding system files from {os.path.basename(folder)}: {', '.join(names)}")
+    
+    def selected_formats(self):
+        """Formats ticked in the window, read on the Tk thread before a job starts"""
+        return [kind for kind, var in (('zip', self.zip_var), ('7z', self.sevenz_var)) if var.get()]
+    
+    def selected_outputs(self, folder, name, formats):
+        """Archive path of each selected format"""
+        return {kind: os.path.join(folder, f"{name}.{kind}") for kind in formats}
+    
+    def compress_batch_folder(self, parent_folder, folder_path, all_files, size, formats, zip_workers, control):
+        """Compress one Batch Zip folder on a batch worker and log its throughput"""
+        control.check()
+        folder_name = os.path.basename(folder_path)
+        
+        # Compress in selected formats
+        outputs = self.selected_outputs(parent_folder, folder_name, formats)
+        if outputs:
+            control.log(f"Compressing {folder_name} to {' and '.join(kind.upper() for kind in outputs)}...")
+        started = time.monotonic()
+        results = CompressionUtils.compress_to_formats([folder_path], outputs, workers=zip_workers,
+                                                       files=all_files, control=control)
+        seconds = time.monotonic() - started
+        control.log(f"Finished {folder_name}: {format_bytes(size)} in {seconds:.1f}s "
+                    f"({format_bytes(size / seconds if seconds > 0 else 0)}/s)")
+        return self.collect_results(results, folder_name)
+    
+    def collect_results(self, results, label=None):
+        """Split compress_to_formats results into success and error messages"""
+        success_messages = []
+        error_messages = []
+        for kind, (success, message) in results.items():
+            prefix = f"{kind.upper()}: {label} - " if label else f"{kind.upper()}: "
+            (success_messages if success else error_messages).append(prefix + message)
+        return success_messages, error_messages
+    
     def extract_files(self):
         self.add_log("Opening archive selection dialog...")
         archive_path = filedialog.askopenfilename(
@@ -306,32 +431,20 @@ class FileCompressApp(ctk.CTkFrame):
             self.add_log("Extraction directory selection cancelled")
             return
             
-        # Show progress
-        self.progress.pack(pady=20)
-        self.progress.start()
-        
         # Extract archive
         archive_type = get_archive_type(archive_path)
         self.add_log(f"Starting extraction of {archive_type.upper()} archive...")
         
-        if archive_type == 'zip':
-            success, message = ExtractionUtils.extract_zip(archive_path, extract_dir)
-        elif archive_type == '7z':
-            success, message = ExtractionUtils.extract_7z(archive_path, extract_dir)
-        else:
-            success, message = False, "Unsupported archive format"
-            
-        # Hide progress
-        self.progress.stop()
-        self.progress.pack_forget()
+        def work(control):
+            if archive_type == 'zip':
+                success, message = ExtractionUtils.extract_zip(archive_path, extract_dir, control=control)
+            elif archive_type == '7z':
+                success, message = ExtractionUtils.extract_7z(archive_path, extract_dir, control=control)
+            else:
+                success, message = False, "Unsupported archive format"
+            return ([message], []) if success else ([], [message])
         
-        # Show result
-        if success:
-            self.add_log(f"Success: {message}")
-            messagebox.showinfo("Success", message)
-        else:
-            self.add_log(f"Error: {message}")
-            messagebox.showerror("Error", message) 
+        self.start_job(work)
     
     def handle_batch_zip(self):
         """Handle batch compression of multiple folders"""
@@ -365,53 +478,54 @@ class FileCompressApp(ctk.CTkFrame):
             
         self.add_log(f"Found {len(folder_paths)} folders for batch compression")
         
-        # Show progress
-        self.progress.pack(pady=20)
-        self.progress.start()
-        
-        success_messages = []
-        error_messages = []
-        
-        # Process each folder
-        for i, folder_path in enumerate(folder_paths):
-            self.progress.set(i / len(folder_paths))
-            self.root.update()
+        formats = self.selected_formats()
+        batch_workers = int(self.batch_workers_var.get())
+        self.add_log(f"Compressing up to {batch_workers} folders at once")
+        
+        def work(control):
+            # Walk every folder first, so progress covers the whole batch and folders can be ordered by size
+            folder_files = []
+            for folder_path in folder_paths:
+                control.check()
+                all_files, excluded = collect_files([folder_path])
+                self.log_excluded(excluded, control.log)
+                folder_files.append(all_files)
+            folder_sizes = [total_size(all_files) for all_files in folder_files]
+            control.expect(sum(folder_sizes))
             
-            folder_name = os.path.basename(folder_path)
+            # Largest folders first, so the longest jobs are not left running alone at the end
+            order = sorted(range(len(folder_paths)), key=lambda index: folder_sizes[index], reverse=True)
+            # Share the cores between the folders compressing at once
+            zip_workers = max(1, (os.cpu_count() or 1) // batch_workers)
+            started = time.monotonic()
+            results = {}
             
-            # Log files being excluded
-            for root, dirs, files in os.walk(folder_path):
-                excluded_files = [f for f in files if CompressionUtils.should_exclude_file(f)]
-                if excluded_files:
-                    self.add_log(f"Excluding system files from {os.path.basename(root)}: {', '.join(excluded_files)}")
+            with ThreadPoolExecutor(max_workers=batch_workers) as executor:
+                futures = {
+                    executor.submit(self.compress_batch_folder, parent_folder, folder_paths[index],
+                                    folder_files[index], folder_sizes[index], formats, zip_workers, control): index
+                    for index in order
+                }
+                try:
+                    for future in as_completed(futures):
+                        results[futures[future]] = future.result()
+                except JobCancelled:
+                    for future in futures:
+                        future.cancel()
+                    raise
             
-            # Compress in selected formats
-            if self.zip_var.get():
-                output_path = os.path.join(parent_folder, f"{folder_name}.zip")
-                self.add_log(f"Compressing {folder_name} to ZIP...")
-                success, message = CompressionUtils.compress_to_zip([folder_path], output_path)
-                if success:
-                    success_messages.append(f"ZIP: {folder_name} - {message}")
-                else:
-                    error_messages.append(f"ZIP: {folder_name} - {message}")
-                    
-            if self.sevenz_var.get():
-                output_path = os.path.join(parent_folder, f"{folder_name}.7z")
-                self.add_log(f"Compressing {folder_name} to 7Z...")
-                success, message = CompressionUtils.compress_to_7z([folder_path], output_path)
-                if success:
-                    success_messages.append(f"7Z: {folder_name} - {message}")
-                else:
-                    error_messages.append(f"7Z: {folder_name} - {message}")
-        
-        # Hide progress
-        self.progress.stop()
-        self.progress.pack_forget()
-        
-        # Show results
-        if success_messages:
-            self.add_log("Success: " + "\n".join(success_messages))
-            messagebox.showinfo("Success", "\n".join(success_messages))
-        if error_messages:
-            self.add_log("Error: " + "\n".join(error_messages))
-            messagebox.showerror("Error", "\n".join(error_messages)) 
\ No newline at end of file
+            seconds = time.monotonic() - started
+            total = sum(folder_sizes)
+            control.log(f"Batch of {len(folder_paths)} folders: {format_bytes(total)} in {seconds:.1f}s "
+                        f"({format_bytes(total / seconds if seconds > 0 else 0)}/s)")
+            
+            # Report in folder order, whatever order they finished in
+            success_messages = []
+            error_messages = []
+            for index in range(len(folder_paths)):
+                successes, errors = results[index]
+                success_messages.extend(successes)
+                error_messages.extend(errors)
+            return success_messages, error_messages
+        
+        self.start_job(work) 
\ No newline at end of file
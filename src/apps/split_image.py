@@ -1,237 +1,11 @@
 import os
-import time
-import pandas as pd
 from datetime import datetime
 from pathlib import Path
 import customtkinter as ctk
 import tkinter as tk
 from tkinter import filedialog, messagebox, scrolledtext
-from PIL import Image
-import subprocess
-import threading
-import openpyxl.styles
-
-class ImageProcessor(threading.Thread):
-    def __init__(self, source_folder, num_designers, progress_callback, complete_callback, scan_callback):
-        super().__init__()
-        self.source_folder = source_folder
-        self.num_designers = num_designers
-        self.progress_callback = progress_callback
-        self.complete_callback = complete_callback
-        self.scan_callback = scan_callback
-        self.supported_formats = {'.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tiff'}
-        self.stats = {
-            'total_images': 0,
-            'white_background': 0,
-            'non_white_background': 0,
-            'extensions': {},
-            'designer_files': {}
-        }
-
-    def run(self):
-        try:
-            start_time = time.time()
-            
-            # Create designer folders
-            for i in range(self.num_designers):
-                folder_path = os.path.join(self.source_folder, f'Designer_{i+1}')
-                os.makedirs(folder_path, exist_ok=True)
-                self.stats['designer_files'][f'Designer_{i+1}'] = []
-
-            # First scan to count files and group by file ID
-            image_groups = {}
-            image_files = []
-            for root, _, files in os.walk(self.source_folder):
-                for file in files:
-                    ext = os.path.splitext(file)[1].lower()
-                    if ext in self.supported_formats:
-                        file_id = self.extract_file_id(file)
-                        if file_id:
-                            if file_id not in image_groups:
-                                image_groups[file_id] = []
-                            image_groups[file_id].append(os.path.join(root, file))
-                            image_files.append(os.path.join(root, file))
-                            self.stats['extensions'][ext] = self.stats['extensions'].get(ext, 0) + 1
-                            self.scan_callback(len(image_files))
-
-            self.stats['total_images'] = len(image_files)
-            processed = 0
-
-            # Sort groups by size (number of files in each group)
-            sorted_groups = sorted(image_groups.items(), key=lambda x: len(x[1]), reverse=True)
-            
-            # Initialize designer loads
-            designer_loads = [0] * self.num_designers
-            designer_groups = [[] for _ in range(self.num_designers)]
-            
-            # Distribute groups to designers
-            for file_id, group_files in sorted_groups:
-                # Find designer with minimum load
-                min_load_designer = designer_loads.index(min(designer_loads))
-                
-                # Add group to the designer with minimum load
-                designer_groups[min_load_designer].append((file_id, group_files))
-                designer_loads[min_load_designer] += len(group_files)
-            
-            # Process the distributed groups
-            for designer_index, groups in enumerate(designer_groups):
-                designer_folder = os.path.join(self.source_folder, f'Designer_{designer_index + 1}')
-                
-                for file_id, group_files in groups:
-                    for image_path in group_files:
-                        image_file = os.path.basename(image_path)
-                        dest_path = os.path.join(designer_folder, image_file)
-                        self.stats['designer_files'][f'Designer_{designer_index + 1}'].append(image_file)
-
-                        try:
-                            os.rename(image_path, dest_path)
-                            
-                            if self.is_white_background(dest_path):
-                                self.stats['white_background'] += 1
-                                self.apply_mac_tag(dest_path, 6)
-                            else:
-                                self.stats['non_white_background'] += 1
-                                self.apply_mac_tag(dest_path, 4)
-                            
-                            processed += 1
-                            elapsed_time = time.time() - start_time
-                            self.progress_callback(processed, self.format_time(elapsed_time), self.stats)
-
-                        except Exception as e:
-                            print(f"Error processing {image_file}: {str(e)}")
-
-            self.create_excel_report(start_time)
-            self.complete_callback(self.stats)
-
-        except Exception as e:
-            print(f"Error in processing thread: {str(e)}")
-
-    def format_time(self, seconds):
-        hours = int(seconds // 3600)
-        minutes = int((seconds % 3600) // 60)
-        seconds = int(seconds % 60)
-        return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-
-    def apply_mac_tag(self, file_path, tag_index):
-        try:
-            file_path = file_path.replace('"', '\\"')
-            script = f"""osascript -e 'tell application "Finder" to set label index of (POSIX file "{file_path}" as alias) to {tag_index}'"""
-            os.system(script)
-        except Exception as e:
-            print(f"Error applying tag: {str(e)}")
-
-    def is_white_background(self, image_path):
-        try:
-            with Image.open(image_path) as img:
-                width, height = img.size
-                pixels = img.load()
-                
-                is_left_white = True
-                for x in range(5):
-                    for y in range(5):
-                        if pixels[x, y][:3] != (255, 255, 255):
-                            is_left_white = False
-                            break
-                    if not is_left_white:
-                        break
-                
-                is_right_white = True
-                for x in range(width-5, width):
-                    for y in range(5):
-                        if pixels[x, y][:3] != (255, 255, 255):
-                            is_right_white = False
-                            break
-                    if not is_right_white:
-                        break
-                
-                return is_left_white or is_right_white
-        except Exception as e:
-            print(f"Error checking white background: {e}")
-            return False
-
-    def extract_file_id(self, filename):
-        if len(filename) >= 13 and filename[:13].isdigit():
-            return filename[:13]
-        elif len(filename) >= 12:
-            return filename[:12]
-        return None
-
-    def create_excel_report(self, start_time):
-        try:
-            max_files = max(len(files) for files in self.stats['designer_files'].values()) if self.stats['designer_files'] else 0
-            data = {designer: files + [''] * (max_files - len(files)) 
-                   for designer, files in self.stats['designer_files'].items()}
-            
-            df = pd.DataFrame(data)
-            excel_path = os.path.join(self.source_folder, 'SplitImg_Report.xlsx')
-            
-            with pd.ExcelWriter(excel_path, engine='openpyxl') as writer:
-                # Write the main data
-                df.to_excel(writer, sheet_name='Designer Files', index=False)
-                
-                # Get the worksheet
-                worksheet = writer.sheets['Designer Files']
-                
-                # Define colors
-                dark_blue = "D9E1F2"  # Dark Blue, Text 2, Lighter 80%
-                olive_green = "E2EFDA"  # Olive Green, Accent 3, Lighter 80%
-                
-                # Apply colors based on background detection
-                for col in range(1, len(df.columns) + 1):
-                    for row in range(2, len(df) + 2):  # Start from 2 to skip header
-                        cell_value = worksheet.cell(row=row, column=col).value
-                        if cell_value:
-                            # Check if the file has white background
-                            is_white = False
-                            for designer, files in self.stats['designer_files'].items():
-                                if cell_value in files:
-                                    # Find the file in the source folder
-                                    file_path = os.path.join(self.source_folder, designer, cell_value)
-                                    if os.path.exists(file_path):
-                                        is_white = self.is_white_background(file_path)
-                                    break
-                            
-                            # Apply the appropriate color
-                            fill_color = olive_green if is_white else dark_blue
-                            worksheet.cell(row=row, column=col).fill = openpyxl.styles.PatternFill(
-                                start_color=fill_color,
-                                end_color=fill_color,
-                                fill_type="solid"
-                            )
-                
-                # Write the summary sheet
-                extensions_text = ', '.join(f"{ext} ({count})" for ext, count in self.stats['extensions'].items())
-                
-                total_time = time.time() - start_time
-                hours = int(total_time // 3600)
-                minutes = int((total_time % 3600) // 60)
-                seconds = int(total_time % 60)
-                processing_time = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-                
-                summary_data = {
-                    'Metric': [
-                        'Total Images Processed',
-                        'White Background Images',
-                        'Non-White Background Images',
-                        'Supported Extensions',
-                        'Total Processing Time'
-                    ],
-                    'Value': [
-                        self.stats['total_images'],
-                        self.stats['white_background'],
-                        self.stats['non_white_background'],
-                        extensions_text,
-                        processing_time
-                    ]
-                }
-                pd.DataFrame(summary_data).to_excel(writer, sheet_name='Summary', index=False)
-            
-            print(f"Excel report created: {excel_path}")
-            return excel_path
-            
-        except Exception as e:
-            print(f"Error creating Excel report: {str(e)}")
-            return None
+from image_processor import ImageProcessor
+from progress_utils import ProgressBus
 
 class SplitImageApp(ctk.CTkFrame):
     def __init__(self, root, dashboard):
@@ -240,6 +14,7 @@ class SplitImageApp(ctk.CTkFrame):
         self.root = root
         self.dashboard = dashboard
         self.processor = None
+        self.progress_bus = ProgressBus()
         
         # Bind window state change event
         self.root.bind('<Unmap>', self.on_window_minimize)
@@ -550,13 +325,16 @@ class SplitImageApp(ctk.CTkFrame):
             source_folder = self.folder_input.get()
             
             if 1 <= num_designers <= 60 and source_folder:
+                # Worker callbacks only publish to the bus; widgets are updated on the Tk thread
                 self.processor = ImageProcessor(
                     source_folder,
                     num_designers,
-                    self.update_progress,
-                    self.processing_complete,
-                    self.update_scan_progress
+                    lambda processed, time_taken, stats: self.progress_bus.publish('progress', processed, time_taken, dict(stats)),
+                    self.progress_bus.callback('complete'),
+                    self.progress_bus.callback('scan'),
+                    progress_bus=self.progress_bus
                 )
+                self.progress_bus.start(self, self.apply_updates)
                 self.processor.start()
                 self.run_button.configure(state="disabled")
                 self.reset_progress()
@@ -576,10 +354,22 @@ class SplitImageApp(ctk.CTkFrame):
         self.non_white_bg_label.configure(text="Non-White Background Images: 0")
         self.time_label.configure(text="Time Taken: 00:00:00")
     
+    def apply_updates(self, updates, logs):
+        """Apply one frame of coalesced worker updates on the Tk thread"""
+        if 'scan' in updates:
+            count = updates['scan'][0]
+            self.update_scan_progress(count)
+            logs.append(f"Found {count} image files")
+        if 'progress' in updates:
+            self.update_progress(*updates['progress'])
+        self.add_logs(logs)
+        if 'complete' in updates:
+            self.progress_bus.stop()
+            self.processing_complete(*updates['complete'])
+    
     def update_scan_progress(self, count):
         self.scan_progress_bar.set(count)
         self.scan_progress_label.configure(text=f"Scanning Images... ({count} files found)")
-        self.add_log(f"Found {count} image files")
     
     def update_progress(self, processed, time_taken, stats):
         total = stats['total_images']
@@ -626,9 +416,15 @@ class SplitImageApp(ctk.CTkFrame):
             self.validate_inputs()
     
     def add_log(self, message):
+        self.add_logs([message])
+    
+    def add_logs(self, messages):
+        """Insert several log lines with a single widget update"""
+        if not messages:
+            return
         timestamp = datetime.now().strftime("%H:%M:%S")
         self.log_text.configure(state='normal')
-        self.log_text.insert(tk.END, f"[{timestamp}] {message}\n")
+        self.log_text.insert(tk.END, ''.join(f"[{timestamp}] {message}\n" for message in messages))
         self.log_text.see(tk.END)
         self.log_text.configure(state='disabled')
     
@@ -0,0 +1,119 @@
+import heapq
+from typing import Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+
+# How much a file counts towards a designer's load in each balance mode
+BALANCE_MODES = ('count', 'bytes', 'effort')
+
+# Retouch effort of a non-white background shot relative to a white one
+NON_WHITE_EFFORT = 3.0
+
+def parse_capacities(text: str, num_designers: int) -> List[float]:
+    """
+    Parse per-designer capacity weights such as "1,1,0.5"; a single value applies to everyone
+    """
+    values = [float(value) for value in text.split(',') if value.strip()]
+    if len(values) == 1:
+        values = values * num_designers
+    if len(values) != num_designers:
+        raise ValueError(f"expected {num_designers} capacity weights, got {len(values)}")
+    if any(value <= 0 for value in values):
+        raise ValueError("capacity weights must be greater than 0")
+    return values
+
+def file_weight(mode: str, size: int = 0, is_white: Optional[bool] = None) -> float:
+    """
+    Load one file adds in the given balance mode; effort counts unknown verdicts as white
+    """
+    if mode == 'bytes':
+        return float(size)
+    if mode == 'effort':
+        return NON_WHITE_EFFORT if is_white is False else 1.0
+    return 1.0
+
+class Balancer:
+    """
+    Spreads weighted work over designers so the most loaded one finishes as early as possible.
+
+    Load is measured relative to each designer's capacity, so a designer with capacity 2 is
+    given about twice the work of one with capacity 1.
+    """
+    def __init__(self, num_designers: int, capacities: Optional[Sequence[float]] = None):
+        self.capacities = list(capacities) if capacities else [1.0] * num_designers
+        if len(self.capacities) != num_designers:
+            raise ValueError(f"expected {num_designers} capacity weights, got {len(self.capacities)}")
+        self.loads = [0.0] * num_designers
+
+    @property
+    def makespan(self) -> float:
+        """
+        Finishing time of the most loaded designer, in weight per unit of capacity
+        """
+        return max(load / capacity for load, capacity in zip(self.loads, self.capacities))
+
+    def least_loaded(self) -> int:
+        raise NotImplementedError
+
+    def add(self, designer_index: int, weight: float):
+        self.loads[designer_index] += weight
+
+    def assign(self, weight: float) -> int:
+        """
+        Give work to the designer with the lowest relative load and return its index
+        """
+        designer_index = self.least_loaded()
+        self.add(designer_index, weight)
+        return designer_index
+
+    def distribute(self, items: Sequence[Tuple[Hashable, float]]) -> List[List[Hashable]]:
+        """
+        Longest processing time first: hand out (key, weight) items heaviest first
+        """
+        assigned = [[] for _ in self.loads]
+        for key, weight in sorted(items, key=lambda item: item[1], reverse=True):
+            assigned[self.assign(weight)].append(key)
+        return assigned
+
+class LinearBalancer(Balancer):
+    """
+    Scans every designer for the lowest load; O(designers) per assignment
+    """
+    def least_loaded(self) -> int:
+        relative = [load / capacity for load, capacity in zip(self.loads, self.capacities)]
+        return relative.index(min(relative))
+
+class HeapBalancer(Balancer):
+    """
+    Keeps relative loads in a min-heap; O(log designers) per assignment.
+
+    Loads only grow, so stale heap entries are skipped when popped instead of being updated
+    in place. Ties go to the lowest designer index, as with LinearBalancer.
+    """
+    def __init__(self, num_designers: int, capacities: Optional[Sequence[float]] = None):
+        super().__init__(num_designers, capacities)
+        self.heap = [(0.0, index) for index in range(num_designers)]
+
+    def least_loaded(self) -> int:
+        while True:
+            relative, designer_index = self.heap[0]
+            if relative == self.loads[designer_index] / self.capacities[designer_index]:
+                return designer_index
+            heapq.heappop(self.heap)
+
+    def add(self, designer_index: int, weight: float):
+        super().add(designer_index, weight)
+        heapq.heappush(self.heap, (self.loads[designer_index] / self.capacities[designer_index], designer_index))
+        if len(self.heap) > 4 * len(self.loads):
+            self.heap = [(load / capacity, index)
+                         for index, (load, capacity) in enumerate(zip(self.loads, self.capacities))]
+            heapq.heapify(self.heap)
+
+BALANCERS: Dict[str, Callable[..., Balancer]] = {
+    'lpt': HeapBalancer,
+    'linear': LinearBalancer,
+}
+
+def create_balancer(num_designers: int, capacities: Optional[Sequence[float]] = None,
+                    strategy: str = 'lpt') -> Balancer:
+    if strategy not in BALANCERS:
+        raise ValueError(f"unknown balancer '{strategy}', expected one of {', '.join(BALANCERS)}")
+    return BALANCERS[strategy](num_designers, capacities)
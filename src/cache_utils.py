@@ -0,0 +1,292 @@
+import hashlib
+import os
+import sqlite3
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+from image_utils import Classification
+
+# Entries kept before the least recently used ones are evicted
+DEFAULT_MAX_ENTRIES = 200000
+
+# Thumbnails are a few KB each, so fewer are kept
+DEFAULT_MAX_THUMBNAILS = 50000
+
+# Bytes hashed from each end of a file when fingerprinting by content
+CONTENT_SAMPLE_SIZE = 64 * 1024
+
+CLASSIFICATION_CACHE_FILE = 'classification_cache.sqlite3'
+
+# Perceptual hashes wider than 64 bits do not fit an SQLite integer and are not cached
+HASH_MASK = (1 << 64) - 1
+
+def default_cache_dir() -> str:
+    """
+    Per-user cache directory for SG One, following each platform's convention
+    """
+    if sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Caches')
+    elif sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~\\AppData\\Local')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'SG One')
+
+def file_fingerprint(path: str, key_mode: str = 'inode', stat_result: Optional[os.stat_result] = None) -> str:
+    """
+    Identify a file version without decoding it.
+
+    'inode' uses device, inode, size and mtime, which survive the rename into a designer folder.
+    'content' hashes the size plus the first and last 64 KB, which also matches re-delivered copies.
+    """
+    st = stat_result or os.stat(path)
+    if key_mode == 'content':
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            digest.update(f.read(CONTENT_SAMPLE_SIZE))
+            if st.st_size > CONTENT_SAMPLE_SIZE:
+                f.seek(max(CONTENT_SAMPLE_SIZE, st.st_size - CONTENT_SAMPLE_SIZE))
+                digest.update(f.read(CONTENT_SAMPLE_SIZE))
+        return f"content:{st.st_size}:{digest.hexdigest()}"
+    return f"inode:{st.st_dev}:{st.st_ino}:{st.st_size}:{st.st_mtime_ns}"
+
+class ClassificationCache:
+    """
+    SQLite store of background verdicts and image sizes, keyed by file fingerprint and
+    classifier settings, plus perceptual hashes and thumbnails keyed by fingerprint and size,
+    with least-recently-used eviction
+    """
+    def __init__(self, db_path: Optional[str] = None, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 key_mode: str = 'inode', max_thumbnails: int = DEFAULT_MAX_THUMBNAILS):
+        if db_path is None:
+            db_path = os.path.join(default_cache_dir(), CLASSIFICATION_CACHE_FILE)
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_thumbnails = max_thumbnails
+        self.key_mode = key_mode
+        self.hits = 0
+        self.misses = 0
+        self._pending = []
+        self._pending_hashes = []
+        self._pending_thumbnails = []
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS classifications ('
+            ' fingerprint TEXT NOT NULL,'
+            ' settings TEXT NOT NULL,'
+            ' is_white INTEGER NOT NULL,'
+            ' width INTEGER NOT NULL,'
+            ' height INTEGER NOT NULL,'
+            ' last_used REAL NOT NULL,'
+            ' PRIMARY KEY (fingerprint, settings))'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_last_used ON classifications (last_used)')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS perceptual_hashes ('
+            ' fingerprint TEXT NOT NULL,'
+            ' hash_size INTEGER NOT NULL,'
+            ' dhash INTEGER NOT NULL,'
+            ' last_used REAL NOT NULL,'
+            ' PRIMARY KEY (fingerprint, hash_size))'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_hash_last_used ON perceptual_hashes (last_used)')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS thumbnails ('
+            ' fingerprint TEXT NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' data BLOB NOT NULL,'
+            ' last_used REAL NOT NULL,'
+            ' PRIMARY KEY (fingerprint, size))'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_thumbnail_last_used ON thumbnails (last_used)')
+        self._conn.commit()
+
+    @staticmethod
+    def settings_key(patch_size: int, tolerance: int) -> str:
+        return f"{patch_size}:{tolerance}"
+
+    def fingerprint(self, path: str, stat_result: Optional[os.stat_result] = None) -> str:
+        return file_fingerprint(path, self.key_mode, stat_result)
+
+    def lookup(self, paths: List[str], patch_size: int, tolerance: int) -> Tuple[List[Classification], Dict[str, str]]:
+        """
+        Split paths into cached classifications and a path -> fingerprint map of misses
+        """
+        settings = self.settings_key(patch_size, tolerance)
+        fingerprints = {}
+        for path in paths:
+            try:
+                fingerprints[path] = self.fingerprint(path)
+            except OSError:
+                continue
+
+        hits = []
+        misses = {}
+        used = []
+        for path, fingerprint in fingerprints.items():
+            row = self._conn.execute(
+                'SELECT is_white, width, height FROM classifications WHERE fingerprint = ? AND settings = ?',
+                (fingerprint, settings)
+            ).fetchone()
+            if row is None:
+                misses[path] = fingerprint
+            else:
+                hits.append(Classification(path, bool(row[0]), row[1], row[2]))
+                used.append((fingerprint, settings))
+
+        # Paths that could not be stat'ed are still classified, which reports the error as before
+        for path in paths:
+            if path not in fingerprints:
+                misses[path] = None
+
+        now = time.time()
+        self._conn.executemany(
+            'UPDATE classifications SET last_used = ? WHERE fingerprint = ? AND settings = ?',
+            [(now, fingerprint, settings) for fingerprint, settings in used]
+        )
+        self._conn.commit()
+        self.hits += len(hits)
+        self.misses += len(misses)
+        return hits, misses
+
+    def lookup_hashes(self, paths: List[str], hash_size: int) -> Tuple[Dict[str, int], Dict[str, Optional[str]]]:
+        """
+        Split paths into a path -> cached perceptual hash map and a path -> fingerprint map of misses
+        """
+        hits = {}
+        misses = {}
+        used = []
+        for path in paths:
+            try:
+                fingerprint = self.fingerprint(path)
+            except OSError:
+                misses[path] = None
+                continue
+            row = self._conn.execute(
+                'SELECT dhash FROM perceptual_hashes WHERE fingerprint = ? AND hash_size = ?',
+                (fingerprint, hash_size)
+            ).fetchone()
+            if row is None:
+                misses[path] = fingerprint
+            else:
+                # SQLite integers are signed 64-bit, so hashes are stored two's complement
+                hits[path] = row[0] & HASH_MASK
+                used.append(fingerprint)
+
+        now = time.time()
+        self._conn.executemany(
+            'UPDATE perceptual_hashes SET last_used = ? WHERE fingerprint = ? AND hash_size = ?',
+            [(now, fingerprint, hash_size) for fingerprint in used]
+        )
+        self._conn.commit()
+        return hits, misses
+
+    def store_hash(self, fingerprint: Optional[str], value: Optional[int], hash_size: int):
+        """
+        Queue a perceptual hash for writing; failed hashes are not cached so they are retried
+        """
+        if fingerprint is None or value is None or value > HASH_MASK:
+            return
+        signed = value - (1 << 64) if value >= 1 << 63 else value
+        self._pending_hashes.append((fingerprint, hash_size, signed, time.time()))
+        if len(self._pending_hashes) >= 500:
+            self.flush()
+
+    def lookup_thumbnails(self, paths: List[str], size: int) -> Tuple[Dict[str, bytes], Dict[str, Optional[str]]]:
+        """
+        Split paths into a path -> cached JPEG thumbnail map and a path -> fingerprint map of misses
+        """
+        hits = {}
+        misses = {}
+        used = []
+        for path in paths:
+            try:
+                fingerprint = self.fingerprint(path)
+            except OSError:
+                misses[path] = None
+                continue
+            row = self._conn.execute(
+                'SELECT data FROM thumbnails WHERE fingerprint = ? AND size = ?', (fingerprint, size)
+            ).fetchone()
+            if row is None:
+                misses[path] = fingerprint
+            else:
+                hits[path] = row[0]
+                used.append(fingerprint)
+
+        now = time.time()
+        self._conn.executemany(
+            'UPDATE thumbnails SET last_used = ? WHERE fingerprint = ? AND size = ?',
+            [(now, fingerprint, size) for fingerprint in used]
+        )
+        self._conn.commit()
+        return hits, misses
+
+    def store_thumbnail(self, fingerprint: Optional[str], data: Optional[bytes], size: int):
+        """
+        Queue a thumbnail for writing; failed thumbnails are not cached so they are retried
+        """
+        if fingerprint is None or not data:
+            return
+        self._pending_thumbnails.append((fingerprint, size, data, time.time()))
+        if len(self._pending_thumbnails) >= 500:
+            self.flush()
+
+    def get(self, path: str, patch_size: int, tolerance: int) -> Optional[Classification]:
+        hits, _ = self.lookup([path], patch_size, tolerance)
+        return hits[0] if hits else None
+
+    def store(self, fingerprint: Optional[str], result: Classification, patch_size: int, tolerance: int):
+        """
+        Queue a classification for writing; unreadable images are not cached so they are retried
+        """
+        if fingerprint is None or result.width == 0:
+            return
+        self._pending.append((fingerprint, self.settings_key(patch_size, tolerance),
+                              int(result.is_white), result.width, result.height, time.time()))
+        if len(self._pending) >= 500:
+            self.flush()
+
+    def flush(self):
+        """
+        Write queued classifications and evict the least recently used entries over the limit
+        """
+        if self._pending:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO classifications '
+                '(fingerprint, settings, is_white, width, height, last_used) VALUES (?, ?, ?, ?, ?, ?)',
+                self._pending
+            )
+            self._pending = []
+        if self._pending_hashes:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO perceptual_hashes '
+                '(fingerprint, hash_size, dhash, last_used) VALUES (?, ?, ?, ?)',
+                self._pending_hashes
+            )
+            self._pending_hashes = []
+        if self._pending_thumbnails:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO thumbnails (fingerprint, size, data, last_used) VALUES (?, ?, ?, ?)',
+                self._pending_thumbnails
+            )
+            self._pending_thumbnails = []
+        for table, limit in (('classifications', self.max_entries), ('perceptual_hashes', self.max_entries),
+                             ('thumbnails', self.max_thumbnails)):
+            count = self._conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+            if count > limit:
+                self._conn.execute(
+                    f'DELETE FROM {table} WHERE rowid IN '
+                    f'(SELECT rowid FROM {table} ORDER BY last_used ASC LIMIT ?)',
+                    (count - limit,)
+                )
+        self._conn.commit()
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._conn.close()
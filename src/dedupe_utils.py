@@ -0,0 +1,125 @@
+from typing import Dict, Hashable, List, Optional
+
+# Hashes this many bits apart or fewer (of 64) count as the same shot
+DEFAULT_DUPLICATE_THRESHOLD = 6
+
+# int.bit_count (Python 3.10+) is several times faster than counting characters
+BIT_COUNT = getattr(int, 'bit_count', None)
+
+def hamming_distance(a: int, b: int) -> int:
+    if BIT_COUNT is not None:
+        return BIT_COUNT(a ^ b)
+    return bin(a ^ b).count('1')
+
+class MultiIndexHash:
+    """
+    Multi-index hashing: each hash is cut into chunks, each chunk indexed in its own table.
+    Two hashes within threshold bits must have some chunk within threshold // chunks bits of
+    each other, so a search only probes those chunk values and checks the few candidates found
+    """
+    def __init__(self, threshold: int, bits: int = 64):
+        self.threshold = threshold
+        # Enough chunks that the per-chunk radius stays at 0 or 1
+        self.chunk_count = max(1, min(bits, threshold // 2 + 1))
+        self.chunk_radius = threshold // self.chunk_count
+        widths = [bits // self.chunk_count + (1 if i < bits % self.chunk_count else 0)
+                  for i in range(self.chunk_count)]
+        self.chunks = []
+        shift = 0
+        for width in widths:
+            # Chunk values within the per-chunk radius of a probe: itself, then single bit flips
+            flips = (0,) + (tuple(1 << bit for bit in range(width)) if self.chunk_radius else ())
+            self.chunks.append((shift, (1 << width) - 1, flips))
+            shift += width
+        self.tables: List[Dict[int, List[int]]] = [{} for _ in self.chunks]
+        self.values: List[int] = []
+        self.keys: List[Hashable] = []
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def add(self, value: int, key: Hashable):
+        number = len(self.values)
+        self.values.append(value)
+        self.keys.append(key)
+        for table, (shift, mask, _) in zip(self.tables, self.chunks):
+            table.setdefault((value >> shift) & mask, []).append(number)
+
+    def search(self, value: int) -> List[Hashable]:
+        """
+        Keys of every hash within threshold bits of value
+        """
+        candidates = set()
+        for table, (shift, mask, flips) in zip(self.tables, self.chunks):
+            chunk = (value >> shift) & mask
+            get = table.get
+            for flip in flips:
+                bucket = get(chunk ^ flip)
+                if bucket is not None:
+                    candidates.update(bucket)
+        if not candidates:
+            return []
+        values = self.values
+        threshold = self.threshold
+        if BIT_COUNT is not None:
+            return [self.keys[number] for number in candidates
+                    if BIT_COUNT(value ^ values[number]) <= threshold]
+        return [self.keys[number] for number in candidates
+                if hamming_distance(value, values[number]) <= threshold]
+
+class DisjointSets:
+    """
+    Union-find over hashable keys with path halving
+    """
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, key: Hashable) -> Hashable:
+        parent = self.parent.setdefault(key, key)
+        while parent != key:
+            grandparent = self.parent[parent]
+            self.parent[key] = grandparent
+            key, parent = grandparent, self.parent[grandparent]
+        return key
+
+    def union(self, a: Hashable, b: Hashable):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[root_b] = root_a
+
+class DuplicateIndex:
+    """
+    Perceptual hashes of every file seen so far, clustered into sets of near-duplicates.
+
+    Each set is a star around its first file: a file joins the set of the nearest representative
+    within the threshold, or becomes the representative of a new set. Every member is within the
+    threshold of its representative, so a chain of small differences never merges into one set
+    """
+    def __init__(self, threshold: int = DEFAULT_DUPLICATE_THRESHOLD, bits: int = 64):
+        self.threshold = threshold
+        self.representatives = MultiIndexHash(threshold, bits)
+        self.values: Dict[Hashable, int] = {}
+        # Representative -> keys of its set, the representative first
+        self.members: Dict[Hashable, List[Hashable]] = {}
+
+    def add(self, key: Hashable, value: Optional[int]) -> Optional[Hashable]:
+        """
+        Index a file's hash and return the representative of the set it joined, or None
+        """
+        if value is None:
+            return None
+        matches = self.representatives.search(value)
+        if matches:
+            representative = min(matches, key=lambda match: hamming_distance(value, self.values[match]))
+            self.members[representative].append(key)
+            return representative
+        self.representatives.add(value, key)
+        self.values[key] = value
+        self.members[key] = [key]
+        return None
+
+    def duplicate_sets(self) -> List[List[Hashable]]:
+        """
+        Sets of two or more near-duplicates, in the order their representatives were indexed
+        """
+        return [keys for keys in self.members.values() if len(keys) > 1]
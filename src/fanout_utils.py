@@ -0,0 +1,216 @@
+import io
+import os
+import queue
+import threading
+from typing import Dict, List, Optional, Tuple
+import py7zr
+from py7zr.helpers import ArchiveTimestamp
+from job_utils import JobControl
+from store_utils import StorePolicy
+from zip_utils import read_blocks
+
+# Blocks queued ahead of the 7z writer; the reader waits when it is this far ahead
+QUEUED_BLOCKS = 8
+
+# Seconds between checks that the 7z thread is still alive while waiting on it
+WAIT_INTERVAL = 0.2
+
+class WriterAborted(Exception):
+    pass
+
+class BlockStream(io.BufferedIOBase):
+    """
+    Read-only stream of one member's blocks, handed over by the reader thread so py7zr can
+    pull the same bytes the other writers were fed
+    """
+    def __init__(self, size: int):
+        self.size = size
+        self.position = 0
+        self.blocks = queue.Queue(QUEUED_BLOCKS)
+        self.current = b''
+        self.finished = False
+
+    def readable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        # py7zr only seeks to the end and back to learn the size before it reads
+        self.position = self.size + offset if whence == io.SEEK_END else offset
+        return self.position
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        while not self.current and not self.finished:
+            block = self.blocks.get()
+            if block is None:
+                self.finished = True
+            elif isinstance(block, WriterAborted):
+                raise block
+            else:
+                self.current = block
+        if size is None or size < 0 or size >= len(self.current):
+            data, self.current = self.current, b''
+        else:
+            data, self.current = self.current[:size], self.current[size:]
+        return data
+
+class SevenZipWriter:
+    """
+    7z archive fed blocks the same way as the ZIP writers. py7zr pulls its input, so it runs
+    on its own thread and reads each member from a BlockStream.
+
+    7z picks filters per folder, so each change between compressed and stored members
+    appends a folder with the other filters.
+    """
+    def __init__(self, output_path: str, password: Optional[str] = None):
+        self.output_path = output_path
+        self.password = password
+        self.members = queue.Queue(1)
+        self.stream = None
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def filters(self, stored: bool):
+        if not stored:
+            return None
+        copy_filters = [{'id': py7zr.FILTER_COPY}]
+        if self.password:
+            copy_filters.append({'id': py7zr.FILTER_CRYPTO_AES256_SHA256})
+        return copy_filters
+
+    def run(self):
+        archive = None
+        archive_stored = None
+        try:
+            while True:
+                member = self.members.get()
+                if member is None or isinstance(member, WriterAborted):
+                    break
+                path, arcname, stored, stream = member
+                if archive is None or stored != archive_stored:
+                    mode = 'w' if archive is None else 'a'
+                    if archive is not None:
+                        archive.close()
+                    archive = py7zr.SevenZipFile(self.output_path, mode, password=self.password,
+                                                 filters=self.filters(stored))
+                    archive_stored = stored
+                if stream.size == 0:
+                    # Nothing to share; py7zr records empty files as such only when it stats them
+                    archive.write(path, arcname)
+                    continue
+                archive.writef(stream, arcname)
+                # writef stamps members with the current time; keep the file's own
+                archive.header.files_info.files[-1]['lastwritetime'] = \
+                    ArchiveTimestamp.from_datetime(os.stat(path).st_mtime)
+            if archive is None:
+                archive = py7zr.SevenZipFile(self.output_path, 'w', password=self.password)
+            archive.close()
+        except Exception as e:
+            self.error = e
+            if archive is not None:
+                try:
+                    archive.close()
+                except Exception:
+                    pass
+
+    def put(self, target: queue.Queue, item):
+        while True:
+            if self.error is not None:
+                raise self.error
+            if not self.thread.is_alive():
+                raise RuntimeError("7z writer stopped")
+            try:
+                target.put(item, timeout=WAIT_INTERVAL)
+                return
+            except queue.Full:
+                continue
+
+    def begin(self, path: str, arcname: str, stored: bool = False):
+        self.stream = BlockStream(os.path.getsize(path))
+        self.put(self.members, (path, arcname, stored, self.stream))
+
+    def feed(self, data: bytes, last: bool):
+        if data:
+            self.put(self.stream.blocks, data)
+        if last:
+            self.put(self.stream.blocks, None)
+
+    def close(self):
+        self.put(self.members, None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def abort(self):
+        aborted = WriterAborted("Compression was stopped")
+        try:
+            if self.stream is not None and not self.stream.finished:
+                self.put(self.stream.blocks, aborted)
+            self.put(self.members, aborted)
+        except Exception:
+            pass
+        self.thread.join()
+
+def abort(writer):
+    try:
+        writer.abort()
+    except Exception as e:
+        print(f"Error stopping archive writer: {e}")
+
+def write_archives(members: List[Tuple[str, str]], writers: Dict[str, object],
+                   policy: Optional[StorePolicy] = None,
+                   control: Optional[JobControl] = None) -> Dict[str, Optional[Exception]]:
+    """
+    Read each (path, archive name) member once and feed the same blocks to every writer,
+    which compress concurrently. Returns each writer's error, or None if it succeeded.
+
+    A writer that fails is dropped while the others carry on; a file that cannot be read
+    fails every archive, as it would have one at a time. With a control, cancellation is
+    checked before each block and every block read counts as progress; a cancelled run
+    reports JobCancelled for every writer.
+    """
+    errors = {}
+    active = dict(writers)
+
+    def call(name, method, *args):
+        try:
+            method(*args)
+        except Exception as e:
+            errors[name] = e
+            abort(active.pop(name))
+
+    try:
+        # Files stored for their extension go last, so a 7z archive usually needs one folder of
+        # each kind; only a file found to be compressed by its contents adds another
+        ordered = sorted(members, key=lambda member: bool(policy and policy.stored_by_extension(member[0])))
+        for path, arcname in ordered:
+            if not active:
+                break
+            first = True
+            for data, last in read_blocks(path):
+                if control is not None:
+                    control.check()
+                if first:
+                    # Sniffed from the first block, so the file is never opened a second time
+                    stored = bool(policy and policy.should_store(path, os.path.getsize(path), data))
+                    for name, writer in list(active.items()):
+                        call(name, writer.begin, path, arcname, stored)
+                    first = False
+                for name, writer in list(active.items()):
+                    call(name, writer.feed, data, last)
+                if control is not None:
+                    control.advance(len(data))
+    except Exception as e:
+        for name, writer in active.items():
+            errors[name] = e
+            abort(writer)
+        active.clear()
+    for name, writer in list(active.items()):
+        try:
+            writer.close()
+        except Exception as e:
+            errors[name] = e
+    return {name: errors.get(name) for name in writers}
@@ -0,0 +1,188 @@
+import json
+import os
+import re
+import sys
+from array import array
+from typing import Iterator, List, NamedTuple, Optional, Sequence
+
+class IdRule(NamedTuple):
+    """
+    How to find the file ID in a file name: the given regex group of a match at the start of the
+    name. With a prefix set the rule only applies to names starting with it
+    """
+    name: str
+    pattern: str
+    group: int = 1
+    prefix: str = ''
+
+# Split Image's original grouping: 13 leading digits, otherwise the first 12 characters
+DEFAULT_ID_RULES = (
+    IdRule('catalog_number', r'(\d{13})'),
+    IdRule('first_12_characters', r'(.{12})'),
+)
+
+class FileIdExtractor:
+    """
+    Applies ID rules in order and returns the first match; IDs are interned so every file of a
+    group shares one string
+    """
+    def __init__(self, rules: Sequence[IdRule] = DEFAULT_ID_RULES):
+        self.rules = list(rules)
+        self._compiled = []
+        for rule in self.rules:
+            try:
+                self._compiled.append((rule.prefix, re.compile(rule.pattern, re.DOTALL), rule.group))
+            except re.error as e:
+                raise ValueError(f"invalid pattern for ID rule '{rule.name}': {e}")
+        self._combined = self._combine()
+
+    def _combine(self):
+        """
+        Fold prefix-free rules with numbered groups into one alternation, so a name costs one
+        match call; returns the regex and the ID group of each alternative, or None
+        """
+        if any(prefix or not isinstance(group, int) for prefix, _, group in self._compiled):
+            return None
+        groups = []
+        offset = 0
+        for _, regex, group in self._compiled:
+            groups.append(offset + group)
+            offset += regex.groups
+        try:
+            combined = re.compile('|'.join(f'(?:{rule.pattern})' for rule in self.rules), re.DOTALL)
+        except re.error:
+            return None
+        return combined, groups
+
+    def __call__(self, filename: str) -> Optional[str]:
+        if self._combined is not None:
+            combined, groups = self._combined
+            match = combined.match(filename)
+            if match is None:
+                return None
+            for group in groups:
+                file_id = match.group(group)
+                if file_id is not None:
+                    return sys.intern(file_id) if file_id else None
+            return None
+        for prefix, regex, group in self._compiled:
+            if prefix and not filename.startswith(prefix):
+                continue
+            match = regex.match(filename)
+            if match and match.group(group):
+                return sys.intern(match.group(group))
+        return None
+
+def load_id_rules(path: str) -> FileIdExtractor:
+    """
+    Read ID rules from a JSON file: a list of {"name", "pattern", "group", "prefix"} objects,
+    optionally under a "rules" key. Only "pattern" is required
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get('rules')
+    if not isinstance(data, list) or not data:
+        raise ValueError(f"{path} does not contain a list of ID rules")
+    rules = []
+    for number, item in enumerate(data, 1):
+        if not isinstance(item, dict) or 'pattern' not in item:
+            raise ValueError(f"ID rule {number} in {path} has no pattern")
+        rules.append(IdRule(str(item.get('name', f'rule_{number}')), item['pattern'],
+                            item.get('group', 1), item.get('prefix', '')))
+    return FileIdExtractor(rules)
+
+class GroupIndex:
+    """
+    Files grouped by file ID in flat arrays.
+
+    Each file costs its UTF-8 name in one shared buffer, a name offset, a directory number,
+    a group number and a size; folders and IDs are stored once. Group members are kept in
+    offset/member arrays (CSR), built on first use.
+    """
+    def __init__(self):
+        self.ids = []
+        self.dirs = []
+        self.name_data = bytearray()
+        self.name_offsets = array('Q', [0])
+        self.file_dirs = array('I')
+        self.file_groups = array('I')
+        self.sizes = array('q')
+        self._group_numbers = {}
+        self._dir_numbers = {}
+        self._offsets = None
+        self._members = None
+
+    def __len__(self) -> int:
+        return len(self.file_dirs)
+
+    @property
+    def group_count(self) -> int:
+        return len(self.ids)
+
+    def add(self, path: str, file_id: str, size: int = 0, name: Optional[str] = None) -> int:
+        """
+        Add a file and return its number; pass the name when it is already known (a ScanEntry)
+        """
+        if name is None or len(path) <= len(name) or not path.endswith(name):
+            folder, name = os.path.split(path)
+        else:
+            folder = path[:len(path) - len(name) - 1]
+        # Scans list a folder at a time, so the last folder is nearly always the one we want
+        if self.dirs and self.dirs[-1] == folder:
+            dir_number = len(self.dirs) - 1
+        else:
+            dir_number = self._dir_numbers.get(folder)
+            if dir_number is None:
+                dir_number = self._dir_numbers[folder] = len(self.dirs)
+                self.dirs.append(folder)
+        group_number = self._group_numbers.get(file_id)
+        if group_number is None:
+            group_number = self._group_numbers[file_id] = len(self.ids)
+            self.ids.append(file_id)
+        self.name_data += name.encode('utf-8', 'surrogateescape')
+        self.name_offsets.append(len(self.name_data))
+        self.file_dirs.append(dir_number)
+        self.file_groups.append(group_number)
+        self.sizes.append(size)
+        self._offsets = None
+        return len(self.file_dirs) - 1
+
+    def name(self, file_number: int) -> str:
+        start, end = self.name_offsets[file_number], self.name_offsets[file_number + 1]
+        return self.name_data[start:end].decode('utf-8', 'surrogateescape')
+
+    def path(self, file_number: int) -> str:
+        return os.path.join(self.dirs[self.file_dirs[file_number]], self.name(file_number))
+
+    def paths(self) -> Iterator[str]:
+        for file_number in range(len(self)):
+            yield self.path(file_number)
+
+    def _build(self):
+        counts = array('I', bytes(4 * (len(self.ids) + 1)))
+        for group_number in self.file_groups:
+            counts[group_number + 1] += 1
+        for group_number in range(len(self.ids)):
+            counts[group_number + 1] += counts[group_number]
+        members = array('I', bytes(4 * len(self)))
+        fill = array('I', counts[:-1])
+        for file_number, group_number in enumerate(self.file_groups):
+            members[fill[group_number]] = file_number
+            fill[group_number] += 1
+        self._offsets = counts
+        self._members = members
+
+    def members(self, group_number: int) -> Sequence[int]:
+        """
+        File numbers in a group, in the order they were added
+        """
+        if self._offsets is None:
+            self._build()
+        return self._members[self._offsets[group_number]:self._offsets[group_number + 1]]
+
+    def group_paths(self, group_number: int) -> List[str]:
+        return [self.path(file_number) for file_number in self.members(group_number)]
+
+    def group_number(self, file_id: str) -> Optional[int]:
+        return self._group_numbers.get(file_id)
@@ -0,0 +1,1059 @@
+import os
+import time
+import threading
+import queue
+import json
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from balance_utils import create_balancer, file_weight
+from cache_utils import ClassificationCache
+from dedupe_utils import DEFAULT_DUPLICATE_THRESHOLD, DisjointSets, DuplicateIndex
+from group_utils import FileIdExtractor, GroupIndex
+from image_utils import (CORNER_SIZE, HASH_SIZE, Classification, classify_batch, classify_image,
+                         classify_thumbnail_batch, classify_with_thumbnail, default_worker_count, dhash_image,
+                         is_white_background, make_thumbnail, pool_chunksize)
+from journal_utils import RunJournal, default_journal_path, journal_relpath, read_journal
+from move_utils import MoveEngine, finished_copy, remove_partial
+from plan_utils import (PLAN_FILE, UNDO_FILE, JsonLinesWriter, PlanEntry, designer_name, read_plan,
+                        rename_in_batches, write_plan)
+from report_utils import FileRecord, RecordSpool, StreamingReportWriter
+from scan_utils import FileScanner
+from tag_utils import BLUE_LABEL, GREEN_LABEL, BatchTagger, default_tag_backend
+from thumbnail_utils import CONTACT_SHEET_FOLDER, THUMBNAIL_SIZE, ThumbnailSpool, write_contact_sheets
+from watch_utils import DEFAULT_POLL_INTERVAL, DEFAULT_SETTLE_SECONDS, create_watcher, wait_for_batch
+
+# Marks the end of a pipeline queue
+END_OF_STAGE = None
+
+# Minimum seconds between scan_callback calls while scanning
+SCAN_CALLBACK_INTERVAL = 0.1
+
+# Files handed to a pool worker at once in pipeline mode
+PIPELINE_BATCH_SIZE = 16
+
+# Minimum seconds between report rewrites in watch mode
+WATCH_REPORT_INTERVAL = 30
+
+# Largest near-duplicate set kept with one designer, as a fraction of the smallest designer's share
+MAX_DUPLICATE_SET_SHARE = 0.5
+
+class ImageProcessor(threading.Thread):
+    def __init__(self, source_folder, num_designers, progress_callback, complete_callback, scan_callback, max_workers=None,
+                 patch_size=CORNER_SIZE, white_tolerance=0, use_cache=True, cache_path=None, tag_backend=None,
+                 tag_manifest=None, pipeline=False, mover_workers=1, queue_size=1000, scan_threads=1,
+                 balance_mode='count', capacities=None, mode='run', plan_path=None, resume=True, watch=False,
+                 watch_polling=False, poll_interval=DEFAULT_POLL_INTERVAL, settle_seconds=DEFAULT_SETTLE_SECONDS,
+                 report_interval=WATCH_REPORT_INTERVAL, id_extractor=None, output_folder=None, find_duplicates=False,
+                 duplicate_threshold=DEFAULT_DUPLICATE_THRESHOLD, thumbnails=False, thumbnail_size=THUMBNAIL_SIZE,
+                 progress_bus=None):
+        super().__init__()
+        if output_folder and mode != 'run':
+            # Plan files record destinations relative to the source folder
+            raise ValueError(f"an output folder cannot be used in {mode} mode")
+        self.source_folder = source_folder
+        # Designer folders go here; on another volume files are copied, then removed from the source
+        self.output_folder = output_folder or source_folder
+        self.mover = None
+        self.num_designers = num_designers
+        self.max_workers = max_workers or default_worker_count()
+        self.patch_size = patch_size
+        self.white_tolerance = white_tolerance
+        self.use_cache = use_cache
+        self.cache_path = cache_path
+        self.cache = None
+        self.tag_backend = tag_backend
+        # Off macOS, tags are only recorded when a manifest path is given
+        self.tag_manifest = tag_manifest
+        self.tagger = None
+        self.pipeline = pipeline
+        self.mover_workers = max(1, mover_workers)
+        self.queue_size = queue_size
+        self.tag_queue = None
+        self.scan_threads = max(1, scan_threads)
+        self.last_scan_report = 0
+        self.processed = 0
+        self.stats_lock = threading.Lock()
+        self.balance_mode = balance_mode
+        self.capacities = capacities
+        self.balancer = None
+        # 'run' moves and classifies, 'plan' writes a plan file without moving, 'apply' executes one
+        self.mode = mode
+        self.plan_path = plan_path
+        self.resume = resume
+        self.journal = None
+        # Watch mode keeps the journal between sessions so designer loads carry over
+        self.watch = watch
+        self.watch_polling = watch_polling
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        self.report_interval = report_interval
+        self.report_dirty = False
+        self.last_report = 0
+        self.stop_event = threading.Event()
+        # File name -> group ID; FileIdExtractor rules can be loaded from a JSON file
+        self.id_extractor = id_extractor or FileIdExtractor()
+        self.group_designers = {}
+        # Perceptual hashes of scanned files; near-duplicate sets stay with one designer
+        self.duplicates = DuplicateIndex(duplicate_threshold) if find_duplicates else None
+        # Source path relative to the source folder -> file ID, and -> destination once moved
+        self.duplicate_ids = {}
+        self.duplicate_dests = {}
+        # Thumbnails made while classifying, spooled to a temporary file until the contact sheets are written
+        self.make_thumbnails = thumbnails
+        self.thumbnail_size = thumbnail_size
+        self.thumbnails = None
+        self.sheets_dirty = set()
+        self.sheet_pages = {}
+        # Log lines go to the bus when the GUI attaches one, to stdout otherwise
+        self.progress_bus = progress_bus
+        self.progress_callback = progress_callback
+        self.complete_callback = complete_callback
+        self.scan_callback = scan_callback
+        self.supported_formats = {'.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tiff'}
+        self.stats = {
+            'total_images': 0,
+            'white_background': 0,
+            'non_white_background': 0,
+            'extensions': {},
+            'designer_files': {}
+        }
+        # (designer, file name) -> FileRecord, filled in as files are classified and spooled to disk
+        self.records = None
+        self.report_path = None
+        # Seconds spent in each phase of the run, summed over watch batches
+        self.phase_times = {}
+
+    def run(self):
+        try:
+            start_time = time.time()
+            self.records = RecordSpool()
+            self.open_cache()
+            if self.mode != 'plan':
+                backend = self.tag_backend or default_tag_backend(self.tag_manifest)
+                if backend:
+                    self.tagger = BatchTagger(backend)
+
+            plan_entries = None
+            journal_state = None
+            if self.mode == 'apply':
+                header, plan_entries = read_plan(self.plan_path or os.path.join(self.source_folder, PLAN_FILE))
+                self.num_designers = header['num_designers']
+            elif self.mode == 'run':
+                journal_state = self.open_journal()
+            self.balancer = create_balancer(self.num_designers, self.capacities)
+            self.mover = MoveEngine(self.source_folder, self.mover_workers)
+            if self.make_thumbnails and self.mode != 'plan':
+                self.thumbnails = ThumbnailSpool()
+
+            # Create designer folders; a dry run only names them
+            for i in range(self.num_designers):
+                folder_path = self.designer_folder(i)
+                if self.mode != 'plan':
+                    os.makedirs(folder_path, exist_ok=True)
+                self.stats['designer_files'][f'Designer_{i+1}'] = []
+
+            if journal_state is not None:
+                with self.phase('recover'):
+                    self.recover_run(journal_state, start_time)
+
+            if self.mode == 'plan':
+                self.run_plan(start_time)
+            elif self.mode == 'apply':
+                with self.phase('apply'):
+                    self.run_apply(start_time, plan_entries)
+            elif self.watch:
+                self.run_watch(start_time)
+            elif self.pipeline:
+                if self.duplicates:
+                    self.log("Duplicate detection needs the whole scan before distributing; skipped in pipeline mode")
+                    self.duplicates = None
+                with self.phase('pipeline'):
+                    self.run_pipeline(start_time)
+            else:
+                self.run_batch(start_time)
+
+            if self.cache:
+                self.cache.flush()
+            with self.phase('tag'):
+                self.close_tagger()
+
+            if self.mode != 'plan':
+                self.write_report(start_time)
+            if self.journal and not self.watch:
+                # The run finished, so there is nothing left to resume
+                self.journal.close(remove=True)
+                self.journal = None
+            self.complete_callback(self.stats)
+
+        except Exception as e:
+            self.log(f"Error in processing thread: {str(e)}")
+        finally:
+            self.close_tagger()
+            self.close_cache()
+            if self.thumbnails:
+                self.thumbnails.close()
+                self.thumbnails = None
+            if self.journal:
+                self.journal.close()
+                self.journal = None
+            if self.records:
+                self.records.close()
+                self.records = None
+
+    def log(self, message):
+        if self.progress_bus:
+            self.progress_bus.log(message)
+        else:
+            print(message)
+
+    @contextmanager
+    def phase(self, name):
+        """Add the time spent in the block to phase_times[name]"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_times[name] = self.phase_times.get(name, 0.0) + time.perf_counter() - started
+
+    def scan_groups(self):
+        """Scan the source folder into a GroupIndex of files by file ID"""
+        index = GroupIndex()
+        scanner = self.create_scanner()
+        for entry in scanner.scan():
+            file_id = self.extract_file_id(entry.name)
+            if file_id:
+                index.add(entry.path, file_id, entry.size, entry.name)
+                self.stats['extensions'][entry.ext] = self.stats['extensions'].get(entry.ext, 0) + 1
+                self.report_scan(len(index))
+        self.report_scan(len(index), final=True)
+        self.log_scan_rate(scanner)
+
+        self.stats['total_images'] += len(index)
+        return index
+
+    def distribute_groups(self, index, verdicts, linked=None):
+        """
+        Assign groups to designers, heaviest first; returns the group numbers for each designer.
+        Groups linked to the same key (group number -> key) are assigned together
+        """
+        designer_groups = [[] for _ in range(self.num_designers)]
+        weights = {}
+        units = {}
+        for group_number, file_id in enumerate(index.ids):
+            weight = self.group_weight(index, group_number, verdicts)
+            # Groups partly moved before a resumed run stay with their designer
+            designer_index = self.group_designers.get(file_id)
+            if designer_index is None:
+                unit = linked.get(group_number, group_number) if linked else group_number
+                weights[unit] = weights.get(unit, 0.0) + weight
+                units.setdefault(unit, []).append(group_number)
+            else:
+                self.balancer.add(designer_index, weight)
+                designer_groups[designer_index].append(group_number)
+        for designer_index, unit_keys in enumerate(self.balancer.distribute(list(weights.items()))):
+            for unit in unit_keys:
+                for group_number in units[unit]:
+                    self.group_designers[index.ids[group_number]] = designer_index
+                    designer_groups[designer_index].append(group_number)
+        return designer_groups
+
+    def group_weight(self, index, group_number, verdicts=None):
+        """Load a group adds in the current balance mode"""
+        weight = 0.0
+        for file_number in index.members(group_number):
+            verdict = verdicts.get(index.path(file_number)) if verdicts else None
+            weight += file_weight(self.balance_mode, index.sizes[file_number], verdict.is_white if verdict else None)
+        return weight
+
+    def link_duplicates(self, index, verdicts=None):
+        """
+        Hash every file in the index and link groups holding near-duplicates; returns group number
+        -> link key for distribute_groups. Sets that reach a group already assigned are pinned to it.
+        A set whose groups would weigh more than MAX_DUPLICATE_SET_SHARE of the smallest designer's
+        share is not linked, so its groups are placed like any others
+        """
+        if not self.duplicates:
+            return None
+        file_numbers = {index.path(file_number): file_number for file_number in range(len(index))}
+        touched = {}
+        for image_path, value in self.hash_images(list(file_numbers)):
+            file_id = index.ids[index.file_groups[file_numbers[image_path]]]
+            key = os.path.relpath(image_path, self.source_folder)
+            self.duplicate_ids[key] = file_id
+            if value is None:
+                # Unreadable files are not indexed, so they are placed like any other
+                continue
+            representative = self.duplicates.add(key, value)
+            touched[key if representative is None else representative] = None
+
+        # Share of the whole load, this batch included, that the smallest designer should get
+        weights = [self.group_weight(index, group_number, verdicts) for group_number in range(index.group_count)]
+        capacities = self.balancer.capacities
+        limit = (sum(weights) + sum(self.balancer.loads)) * min(capacities) / sum(capacities) * MAX_DUPLICATE_SET_SHARE
+
+        def own_weight(file_id):
+            # Groups from earlier batches are already counted in the balancer
+            group_number = index.group_number(file_id)
+            return weights[group_number] if group_number is not None else 0.0
+
+        links = DisjointSets()
+        unit_weights = {}
+        oversized = 0
+        for representative in touched:
+            keys = self.duplicates.members[representative]
+            roots = list(dict.fromkeys(links.find(self.duplicate_ids[key]) for key in keys))
+            if len(roots) < 2:
+                continue
+            combined = sum(unit_weights.get(root, own_weight(root)) for root in roots)
+            if combined > limit:
+                oversized += 1
+                continue
+            for root in roots[1:]:
+                links.union(roots[0], root)
+            unit_weights[links.find(roots[0])] = combined
+        if oversized:
+            self.log(f"{oversized} near-duplicate sets are too large to keep with one designer; "
+                     f"their groups are placed normally")
+
+        # File ID -> link key, then pin whole sets that include a group with a designer already
+        sets = {}
+        for file_id in list(links.parent):
+            sets.setdefault(links.find(file_id), []).append(file_id)
+        # Duplicates within one group need no linking
+        sets = {root: file_ids for root, file_ids in sets.items() if len(file_ids) > 1}
+        linked = {}
+        linked_groups = 0
+        for root, file_ids in sets.items():
+            designer_index = next((self.group_designers[file_id] for file_id in file_ids
+                                   if file_id in self.group_designers), None)
+            for file_id in file_ids:
+                group_number = index.group_number(file_id)
+                if group_number is None:
+                    continue
+                linked_groups += 1
+                if designer_index is not None:
+                    self.group_designers.setdefault(file_id, designer_index)
+                else:
+                    linked[group_number] = root
+        if sets:
+            self.log(f"{linked_groups} groups hold near-duplicates, in {len(sets)} sets")
+        return linked
+
+    def run_batch(self, start_time):
+        """Scan everything, distribute the groups largest first, then move and classify"""
+        with self.phase('scan'):
+            index = self.scan_groups()
+        self.distribute_and_move(index, start_time)
+
+    def distribute_and_move(self, index, start_time):
+        """Distribute scanned groups, then move and classify them"""
+        # Verdicts are needed before distributing when balancing by retouch effort
+        verdicts = {}
+        if self.balance_mode == 'effort':
+            with self.phase('classify'):
+                verdicts = {result.path: result for result in self.classify_images(list(index.paths()))}
+
+        with self.phase('duplicates'):
+            linked = self.link_duplicates(index, verdicts)
+        with self.phase('distribute'):
+            designer_groups = self.distribute_groups(index, verdicts, linked)
+        self.move_and_classify(index, designer_groups, verdicts, start_time)
+
+    def move_and_classify(self, index, designer_groups, verdicts, start_time):
+        """Move distributed groups into their designer folders, then classify them unless verdicts are known"""
+        with self.phase('move'):
+            moved = self.move_groups(index, designer_groups)
+
+        # Classify the moved files and merge the results back into the stats
+        if verdicts:
+            if self.thumbnails:
+                for dest_path, (file_number, _) in moved.items():
+                    self.thumbnails.move(index.path(file_number), dest_path)
+            results = (verdicts[index.path(file_number)]._replace(path=dest_path)
+                       for dest_path, (file_number, _) in moved.items())
+        else:
+            results = self.classify_images(list(moved))
+        with self.phase('classify'):
+            for result in results:
+                file_number, designer_index = moved[result.path]
+                self.handle_result(result, f'Designer_{designer_index + 1}', index.sizes[file_number], start_time)
+
+    def move_groups(self, index, designer_groups):
+        """Move distributed groups into their designer folders; returns destination path -> (file number, designer index)"""
+        # Destinations are reserved and journalled in order, then the moves run on mover_workers threads
+        jobs = []
+        planned = {}
+        for designer_index, group_numbers in enumerate(designer_groups):
+            designer_folder = self.designer_folder(designer_index)
+            for group_number in group_numbers:
+                for file_number in index.members(group_number):
+                    job = self.mover.reserve(index.path(file_number), designer_folder, index.sizes[file_number])
+                    self.journal_move(job.source, job.dest, designer_index, job.size)
+                    jobs.append(job)
+                    planned[job.dest] = (file_number, designer_index)
+
+        moved = {}
+        for job, error in self.mover.move_many(jobs):
+            file_number, designer_index = planned[job.dest]
+            image_file = os.path.basename(job.dest)
+            self.stats['designer_files'][designer_name(designer_index)].append(image_file)
+            if error:
+                self.log(f"Error processing {os.path.basename(job.source)}: {error}")
+            else:
+                moved[job.dest] = planned[job.dest]
+                if self.duplicates:
+                    self.duplicate_dests[os.path.relpath(job.source, self.source_folder)] = job.dest
+        if jobs:
+            self.log(self.mover.summary())
+        return moved
+
+    def run_watch(self, start_time):
+        """Split what is already in the source folder, then keep distributing files as they arrive"""
+        watcher = create_watcher(self.source_folder, self.supported_formats, self.stats['designer_files'],
+                                 polling=self.watch_polling, poll_interval=self.poll_interval)
+        try:
+            # The watcher starts first so nothing that lands during the initial pass is missed
+            self.run_batch(start_time)
+            self.update_watch_report(start_time, force=True)
+            self.log(f"Watching {self.source_folder} for new images ({type(watcher).__name__})")
+
+            while not self.stop_event.is_set():
+                arrived = wait_for_batch(watcher, self.stop_event, self.settle_seconds)
+                if arrived:
+                    self.process_arrivals(arrived, start_time)
+                self.update_watch_report(start_time)
+        finally:
+            watcher.close()
+
+    def process_arrivals(self, image_paths, start_time):
+        """Distribute newly arrived files; groups already seen go to the same designer as before"""
+        index = GroupIndex()
+        for image_path in image_paths:
+            file_id = self.extract_file_id(os.path.basename(image_path))
+            if not file_id:
+                continue
+            try:
+                size = os.stat(image_path).st_size
+            except OSError:
+                # Already moved by an earlier pass, or removed again
+                continue
+            index.add(image_path, file_id, size)
+            ext = os.path.splitext(image_path)[1].lower()
+            self.stats['extensions'][ext] = self.stats['extensions'].get(ext, 0) + 1
+        if not len(index):
+            return
+        self.stats['total_images'] += len(index)
+        self.distribute_and_move(index, start_time)
+
+        if self.tagger:
+            self.tagger.flush()
+        if self.cache:
+            self.cache.flush()
+        self.report_dirty = True
+        self.log(f"Distributed {len(index)} new files in {index.group_count} groups")
+
+    def update_watch_report(self, start_time, force=False):
+        """Rewrite the report from the recorded verdicts, at most every report_interval seconds"""
+        now = time.time()
+        if force or (self.report_dirty and now - self.last_report >= self.report_interval):
+            self.write_report(start_time)
+            self.report_dirty = False
+            self.last_report = now
+
+    def write_report(self, start_time):
+        with self.phase('contact_sheets'):
+            self.write_contact_sheets()
+        with self.phase('report'):
+            self.report_path = self.create_excel_report(start_time)
+
+    def stop(self):
+        """Ask a watching run to finish; the report is written before run returns"""
+        self.stop_event.set()
+
+    def run_plan(self, start_time):
+        """Dry run: scan, classify and distribute in place, then write the moves to a plan file"""
+        with self.phase('scan'):
+            index = self.scan_groups()
+
+        verdicts = {}
+        with self.phase('classify'):
+            for result in self.classify_images(list(index.paths())):
+                verdicts[result.path] = result
+                if result.is_white:
+                    self.stats['white_background'] += 1
+                else:
+                    self.stats['non_white_background'] += 1
+                self.processed += 1
+                self.progress_callback(self.processed, self.format_time(time.time() - start_time), self.stats)
+
+        with self.phase('duplicates'):
+            linked = self.link_duplicates(index, verdicts)
+        with self.phase('distribute'):
+            designer_groups = self.distribute_groups(index, verdicts, linked)
+        entries = []
+        for designer_index, group_numbers in enumerate(designer_groups):
+            for group_number in group_numbers:
+                for file_number in index.members(group_number):
+                    image_path = index.path(file_number)
+                    verdict = verdicts.get(image_path)
+                    if verdict is None:
+                        continue
+                    # Reserved like a real move, so files with the same name never share a destination
+                    job = self.mover.reserve(image_path, self.designer_folder(designer_index), index.sizes[file_number])
+                    self.stats['designer_files'][designer_name(designer_index)].append(os.path.basename(job.dest))
+                    entries.append(PlanEntry(os.path.relpath(image_path, self.source_folder), designer_index,
+                                             verdict.is_white, index.sizes[file_number], verdict.width,
+                                             verdict.height, os.path.relpath(job.dest, self.source_folder)))
+
+        plan_path = self.plan_path or os.path.join(self.source_folder, PLAN_FILE)
+        write_plan(plan_path, self.source_folder, self.num_designers, entries, balance_mode=self.balance_mode,
+                   capacities=self.capacities, patch_size=self.patch_size, tolerance=self.white_tolerance)
+        self.plan_path = plan_path
+        self.log(f"Plan with {len(entries)} moves written to {plan_path}")
+
+    def run_apply(self, start_time, entries):
+        """Execute a plan: rename in batches, reuse its verdicts for tags and the report, write an undo file"""
+        self.stats['total_images'] = len(entries)
+        for entry in entries:
+            ext = os.path.splitext(entry.source)[1].lower()
+            self.stats['extensions'][ext] = self.stats['extensions'].get(ext, 0) + 1
+
+        planned = {}
+        moves = []
+        for entry in entries:
+            if entry.dest in planned:
+                # Only plans written before destinations were reserved can repeat one
+                self.log(f"Error processing {os.path.basename(entry.source)}: {entry.dest} is planned for "
+                         f"{planned[entry.dest].source} too, not moved")
+                continue
+            planned[entry.dest] = entry
+            moves.append((entry.source, entry.dest))
+            self.stats['designer_files'][designer_name(entry.designer_index)].append(os.path.basename(entry.dest))
+
+        undo = JsonLinesWriter(os.path.join(self.source_folder, UNDO_FILE),
+                               dict(kind='undo', source_folder=self.source_folder, num_designers=self.num_designers))
+        try:
+            for results in rename_in_batches(self.source_folder, moves, self.mover_workers):
+                for source, destination, error in results:
+                    if error:
+                        self.log(f"Error processing {os.path.basename(source)}: {error}")
+                        continue
+                    undo.add((destination, source))
+                    entry = planned[destination]
+                    result = Classification(os.path.join(self.source_folder, destination), entry.is_white,
+                                            entry.width, entry.height)
+                    self.handle_result(result, designer_name(entry.designer_index), entry.size, start_time)
+                undo.flush()
+        finally:
+            undo.close()
+        self.log(f"Applied {undo.rows} of {len(entries)} planned moves; undo file: {undo.path}")
+
+    def run_pipeline(self, start_time):
+        """Scan, move, classify, tag and collect in concurrent stages joined by bounded queues"""
+        scanned = queue.Queue(self.queue_size)
+        moved = queue.Queue(self.queue_size)
+        classified = queue.Queue(self.queue_size)
+        self.tag_queue = queue.Queue(self.queue_size)
+
+        stages = [threading.Thread(target=self.scan_stage, args=(scanned,), daemon=True)]
+        stages += [threading.Thread(target=self.move_stage, args=(scanned, moved), daemon=True)
+                   for _ in range(self.mover_workers)]
+        stages.append(threading.Thread(target=self.classify_stage, args=(moved, classified), daemon=True))
+        tag_stage = threading.Thread(target=self.tag_stage, args=(self.tag_queue,), daemon=True)
+        for stage in stages + [tag_stage]:
+            stage.start()
+
+        try:
+            # The report accumulator runs on this thread
+            while True:
+                item = classified.get()
+                if item is END_OF_STAGE:
+                    break
+                result, designer, size = item
+                self.handle_result(result, designer, size, start_time)
+        finally:
+            for stage in stages:
+                stage.join()
+            self.log(self.mover.summary())
+            self.tag_queue.put(END_OF_STAGE)
+            tag_stage.join()
+            self.tag_queue = None
+
+    def scan_stage(self, scanned):
+        """Stream supported files from the scanner into the pipeline"""
+        scanner = self.create_scanner()
+        try:
+            for entry in scanner.scan():
+                file_id = self.extract_file_id(entry.name)
+                if file_id:
+                    with self.stats_lock:
+                        self.stats['extensions'][entry.ext] = self.stats['extensions'].get(entry.ext, 0) + 1
+                        self.stats['total_images'] += 1
+                        found = self.stats['total_images']
+                    self.report_scan(found)
+                    scanned.put((entry.path, file_id, entry.size))
+            self.report_scan(self.stats['total_images'], final=True)
+            self.log_scan_rate(scanner)
+        except Exception as e:
+            self.log(f"Error scanning {self.source_folder}: {str(e)}")
+        finally:
+            for _ in range(self.mover_workers):
+                scanned.put(END_OF_STAGE)
+
+    def create_scanner(self):
+        """Scanner over the source folder that skips the designer folders being filled"""
+        return FileScanner(self.source_folder, self.supported_formats,
+                           exclude_dirs=self.stats['designer_files'], threads=self.scan_threads)
+
+    def report_scan(self, count, final=False):
+        """Pass the running file count to scan_callback at most every SCAN_CALLBACK_INTERVAL seconds"""
+        now = time.time()
+        if final or now - self.last_scan_report >= SCAN_CALLBACK_INTERVAL:
+            self.last_scan_report = now
+            self.scan_callback(count)
+
+    def log_scan_rate(self, scanner):
+        self.log(f"Scanned {scanner.files_found} files in {scanner.dirs_scanned} folders "
+                 f"in {scanner.elapsed:.2f}s ({scanner.files_per_second:.0f} files/sec)")
+
+    def assign_group(self, file_id, size):
+        """Online distribution: a group goes to the least loaded designer when its first file arrives"""
+        # Verdicts are not known yet when pipelined files are moved, so effort counts files
+        weight = file_weight('bytes' if self.balance_mode == 'bytes' else 'count', size)
+        with self.stats_lock:
+            designer_index = self.group_designers.get(file_id)
+            if designer_index is None:
+                designer_index = self.balancer.assign(weight)
+                self.group_designers[file_id] = designer_index
+            else:
+                self.balancer.add(designer_index, weight)
+            return designer_index
+
+    def move_stage(self, scanned, moved):
+        try:
+            while True:
+                item = scanned.get()
+                if item is END_OF_STAGE:
+                    break
+                image_path, file_id, size = item
+                designer_index = self.assign_group(file_id, size)
+                designer = f'Designer_{designer_index + 1}'
+                job = self.mover.reserve(image_path, self.designer_folder(designer_index), size)
+                with self.stats_lock:
+                    self.stats['designer_files'][designer].append(os.path.basename(job.dest))
+
+                try:
+                    self.journal_move(job.source, job.dest, designer_index, size)
+                    self.mover.move(job)
+                    moved.put((job.dest, designer, size))
+                except Exception as e:
+                    self.log(f"Error processing {os.path.basename(image_path)}: {str(e)}")
+        finally:
+            moved.put(END_OF_STAGE)
+
+    def classify_stage(self, moved, classified):
+        """Classify moved files in batches on the process pool, keeping a bounded number in flight"""
+        executor = None
+        if self.max_workers > 1:
+            try:
+                executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            except (OSError, ValueError) as e:
+                self.log(f"Process pool unavailable, classifying serially: {str(e)}")
+        inflight = deque()
+        max_inflight = self.max_workers * 2
+        moved_files = {}
+        open_producers = self.mover_workers
+        if self.thumbnails:
+            classify_pending = partial(classify_thumbnail_batch, patch_size=self.patch_size,
+                                       tolerance=self.white_tolerance, thumbnail_size=self.thumbnail_size)
+        else:
+            classify_pending = partial(classify_batch, patch_size=self.patch_size, tolerance=self.white_tolerance)
+
+        def emit(results, fingerprints, cached=False):
+            for result in results:
+                if self.thumbnails and not cached:
+                    result = self.keep_thumbnail(result, fingerprints.get(result[0].path))
+                if result.error:
+                    self.log(result.error)
+                if self.cache:
+                    self.cache.store(fingerprints.get(result.path), result, self.patch_size, self.white_tolerance)
+                designer, size = moved_files.pop(result.path)
+                classified.put((result, designer, size))
+
+        def finish_oldest():
+            nonlocal executor
+            future, paths, fingerprints = inflight.popleft()
+            try:
+                results = future.result()
+            except (BrokenProcessPool, OSError) as e:
+                if executor:
+                    self.log(f"Process pool failed, classifying serially: {str(e)}")
+                    executor.shutdown(wait=False)
+                    executor = None
+                results = classify_pending(paths)
+            emit(results, fingerprints)
+
+        try:
+            while open_producers:
+                try:
+                    item = moved.get(timeout=0.1 if inflight else None)
+                except queue.Empty:
+                    while inflight and inflight[0][0].done():
+                        finish_oldest()
+                    continue
+
+                batch = [item]
+                while len(batch) < PIPELINE_BATCH_SIZE:
+                    try:
+                        batch.append(moved.get_nowait())
+                    except queue.Empty:
+                        break
+                paths = []
+                for entry in batch:
+                    if entry is END_OF_STAGE:
+                        open_producers -= 1
+                    else:
+                        dest_path, designer, size = entry
+                        moved_files[dest_path] = (designer, size)
+                        paths.append(dest_path)
+                if not paths:
+                    continue
+
+                fingerprints = dict.fromkeys(paths)
+                if self.cache:
+                    hits, fingerprints = self.cache.lookup(paths, self.patch_size, self.white_tolerance)
+                    emit(hits, fingerprints, cached=True)
+                pending = list(fingerprints)
+                if not pending:
+                    continue
+                if executor:
+                    future = executor.submit(classify_pending, pending)
+                    inflight.append((future, pending, fingerprints))
+                    while len(inflight) >= max_inflight:
+                        finish_oldest()
+                else:
+                    emit(classify_pending(pending), fingerprints)
+
+            while inflight:
+                finish_oldest()
+        except Exception as e:
+            self.log(f"Error in classification stage: {str(e)}")
+            # Keep draining, or movers blocked on the full queue never finish and the pipeline never joins
+            while open_producers:
+                if moved.get() is END_OF_STAGE:
+                    open_producers -= 1
+        finally:
+            if executor:
+                executor.shutdown()
+            classified.put(END_OF_STAGE)
+
+    def tag_stage(self, tag_queue):
+        while True:
+            item = tag_queue.get()
+            if item is END_OF_STAGE:
+                break
+            if self.tagger:
+                self.tagger.add(*item)
+
+    def handle_result(self, result, designer, size, start_time, journal=True):
+        """Merge one classification into the stats, records and tags"""
+        dest_path = result.path
+        try:
+            if journal and self.journal:
+                self.journal.log_result(journal_relpath(dest_path, self.source_folder),
+                                        result.is_white, result.width, result.height)
+            self.record_file(result, designer, size)
+            if self.thumbnails:
+                self.sheets_dirty.add(designer)
+            if result.is_white:
+                self.stats['white_background'] += 1
+                self.apply_mac_tag(dest_path, GREEN_LABEL)
+            else:
+                self.stats['non_white_background'] += 1
+                self.apply_mac_tag(dest_path, BLUE_LABEL)
+
+            self.processed += 1
+            elapsed_time = time.time() - start_time
+            self.progress_callback(self.processed, self.format_time(elapsed_time), self.stats)
+
+        except Exception as e:
+            self.log(f"Error processing {os.path.basename(dest_path)}: {str(e)}")
+
+    def record_file(self, result, designer, size):
+        image_file = os.path.basename(result.path)
+        ext = os.path.splitext(image_file)[1].lower()
+        self.records.add(FileRecord(result.path, designer, result.is_white, ext, size))
+
+    def open_journal(self):
+        """Start the run journal, returning the state of an interrupted run to resume if there is one"""
+        journal_path = default_journal_path(self.source_folder)
+        state = None
+        if self.resume:
+            try:
+                state = read_journal(journal_path)
+            except (OSError, ValueError) as e:
+                self.log(f"Ignoring unreadable journal: {str(e)}")
+        settings = dict(num_designers=self.num_designers, balance_mode=self.balance_mode, capacities=self.capacities)
+        if state is not None:
+            # Compared as the journal stores them, so a capacities tuple matches the list read back
+            previous = {key: state.header.get(key) for key in settings}
+            if json.loads(json.dumps(settings)) != previous:
+                capacities = previous['capacities']
+                used = (f"{previous['num_designers']} designers, {previous['balance_mode']} balancing"
+                        + (f" and capacities {','.join(map(str, capacities))}" if capacities else ""))
+                raise ValueError(f"An interrupted run on {self.source_folder} used {used}; run again with the same "
+                                 f"settings to resume it, or pass --no-resume to start over")
+            self.log(f"Resuming interrupted run: {len(state.moves)} moves, {len(state.results)} classified")
+        self.journal = RunJournal(journal_path, settings, state)
+        return state
+
+    def recover_run(self, state, start_time):
+        """Rebuild stats and records from the journal, and classify files moved but not yet classified"""
+        unclassified = []
+        for move in state.moves.values():
+            file_id = self.extract_file_id(os.path.basename(move.source))
+            if file_id:
+                self.group_designers[file_id] = move.designer_index
+            dest_path = os.path.join(self.source_folder, move.dest)
+            try:
+                # A cross-device copy interrupted part way
+                remove_partial(dest_path)
+            except OSError as e:
+                self.log(f"Error removing partial copy of {move.source}: {str(e)}")
+            if not os.path.exists(dest_path):
+                # Never moved; the scan finds it in the source folder again
+                continue
+            source_path = os.path.join(self.source_folder, move.source)
+            if os.path.exists(source_path):
+                # Either a cross-device copy completed but its source was not removed yet, or a new
+                # file arrived under the same name, which the scan picks up like any other
+                try:
+                    if finished_copy(source_path, dest_path):
+                        os.unlink(source_path)
+                except OSError as e:
+                    self.log(f"Error finishing move of {move.source}: {str(e)}")
+
+            designer = designer_name(move.designer_index)
+            image_file = os.path.basename(dest_path)
+            ext = os.path.splitext(image_file)[1].lower()
+            self.stats['designer_files'][designer].append(image_file)
+            self.stats['extensions'][ext] = self.stats['extensions'].get(ext, 0) + 1
+            self.stats['total_images'] += 1
+
+            verdict = state.results.get(move.dest)
+            self.balancer.add(move.designer_index, file_weight(self.balance_mode, move.size,
+                                                               bool(verdict[0]) if verdict else None))
+            if verdict is None:
+                unclassified.append((dest_path, designer, move.size))
+            else:
+                is_white, width, height = verdict
+                self.handle_result(Classification(dest_path, bool(is_white), width, height), designer, move.size,
+                                   start_time, journal=False)
+
+        moved = {dest_path: (designer, size) for dest_path, designer, size in unclassified}
+        for result in self.classify_images(list(moved)):
+            designer, size = moved[result.path]
+            self.handle_result(result, designer, size, start_time)
+
+    def designer_folder(self, designer_index):
+        return os.path.join(self.output_folder, designer_name(designer_index))
+
+    def journal_move(self, image_path, dest_path, designer_index, size):
+        if self.journal:
+            self.journal.log_move(journal_relpath(image_path, self.source_folder),
+                                  journal_relpath(dest_path, self.source_folder), designer_index, size)
+
+    def close_tagger(self):
+        if self.tagger:
+            self.tagger.close()
+            self.log(f"Tagged {self.tagger.tagged} files")
+            self.tagger = None
+
+    def open_cache(self):
+        # Applying a plan reuses its verdicts and never classifies, so only thumbnails use the cache
+        if not self.use_cache or (self.mode == 'apply' and not self.make_thumbnails):
+            return
+        try:
+            self.cache = ClassificationCache(self.cache_path)
+        except Exception as e:
+            self.log(f"Classification cache unavailable, continuing without it: {str(e)}")
+            self.cache = None
+
+    def close_cache(self):
+        if self.cache:
+            try:
+                self.log(f"Classification cache: {self.cache.hits} hits, {self.cache.misses} misses")
+                self.cache.close()
+            except Exception as e:
+                self.log(f"Error closing classification cache: {str(e)}")
+            self.cache = None
+
+    def format_time(self, seconds):
+        hours = int(seconds // 3600)
+        minutes = int((seconds % 3600) // 60)
+        seconds = int(seconds % 60)
+        return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+    def apply_mac_tag(self, file_path, tag_index):
+        """Queue a Finder label; labels are applied in batches by the tagger"""
+        if self.tag_queue:
+            self.tag_queue.put((file_path, tag_index))
+        elif self.tagger:
+            self.tagger.add(file_path, tag_index)
+
+    def classify_images(self, image_paths):
+        """Yield a Classification per path, serving unchanged files from the cache"""
+        fingerprints = dict.fromkeys(image_paths)
+        if self.cache:
+            hits, fingerprints = self.cache.lookup(image_paths, self.patch_size, self.white_tolerance)
+            yield from hits
+
+        if self.thumbnails:
+            # Thumbnails come from the same read of the file as the classification
+            classify = partial(classify_with_thumbnail, patch_size=self.patch_size, tolerance=self.white_tolerance,
+                               thumbnail_size=self.thumbnail_size)
+        else:
+            classify = partial(classify_image, patch_size=self.patch_size, tolerance=self.white_tolerance)
+        for result in self._pool_map(classify, list(fingerprints), 'classifying'):
+            if self.thumbnails:
+                result = self.keep_thumbnail(result, fingerprints[result[0].path])
+            if result.error:
+                self.log(result.error)
+            if self.cache:
+                self.cache.store(fingerprints[result.path], result, self.patch_size, self.white_tolerance)
+            yield result
+
+    def keep_thumbnail(self, result, fingerprint):
+        """Spool the thumbnail of a (Classification, thumbnail) result, returning the Classification"""
+        result, thumbnail = result
+        self.thumbnails.add(result.path, thumbnail)
+        if self.cache:
+            self.cache.store_thumbnail(fingerprint, thumbnail, self.thumbnail_size)
+        return result
+
+    def _pool_map(self, function, image_paths, action):
+        """Yield function(path) per path in order, on a process pool when more than one worker is configured"""
+        if self.max_workers > 1 and len(image_paths) > 1:
+            done = 0
+            try:
+                with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                    chunksize = pool_chunksize(len(image_paths), self.max_workers)
+                    for result in executor.map(function, image_paths, chunksize=chunksize):
+                        done += 1
+                        yield result
+                return
+            except (BrokenProcessPool, OSError) as e:
+                # Fall back to the serial path for whatever the pool did not finish
+                self.log(f"Process pool unavailable, {action} serially: {str(e)}")
+                image_paths = image_paths[done:]
+
+        for image_path in image_paths:
+            yield function(image_path)
+
+    def hash_images(self, image_paths):
+        """Yield (path, perceptual hash) per path, serving unchanged files from the cache"""
+        fingerprints = dict.fromkeys(image_paths)
+        if self.cache:
+            hits, fingerprints = self.cache.lookup_hashes(image_paths, HASH_SIZE)
+            yield from hits.items()
+
+        pending = list(fingerprints)
+        for image_path, value in zip(pending, self._pool_map(dhash_image, pending, 'hashing')):
+            if self.cache:
+                self.cache.store_hash(fingerprints[image_path], value, HASH_SIZE)
+            yield image_path, value
+
+    def thumbnail_images(self, image_paths):
+        """Yield (path, thumbnail) for images the classification did not leave a thumbnail for"""
+        fingerprints = dict.fromkeys(image_paths)
+        if self.cache:
+            hits, fingerprints = self.cache.lookup_thumbnails(image_paths, self.thumbnail_size)
+            yield from hits.items()
+
+        pending = list(fingerprints)
+        thumbnail = partial(make_thumbnail, size=self.thumbnail_size)
+        for image_path, data in zip(pending, self._pool_map(thumbnail, pending, 'making thumbnails')):
+            if self.cache:
+                self.cache.store_thumbnail(fingerprints[image_path], data, self.thumbnail_size)
+            yield image_path, data
+
+    def write_contact_sheets(self):
+        """Rewrite the contact sheets of designers that received files since they were last written"""
+        if not self.thumbnails or not self.sheets_dirty:
+            return
+        for designer_index, designer in enumerate(self.stats['designer_files']):
+            if designer not in self.sheets_dirty:
+                continue
+            def records(designer=designer):
+                # Read back from the spool on each pass rather than held in a list
+                for image_file in self.stats['designer_files'][designer]:
+                    record = self.records.get(designer, image_file)
+                    if record is not None:
+                        yield record
+
+            # Files classified in an earlier session, or from a plan, have no thumbnail yet
+            missing = [record.path for record in records() if record.path not in self.thumbnails]
+            for image_path, data in self.thumbnail_images(missing):
+                self.thumbnails.add(image_path, data)
+            try:
+                folder = os.path.join(self.designer_folder(designer_index), CONTACT_SHEET_FOLDER)
+                tiles = ((os.path.basename(record.path), self.thumbnails.get(record.path), record.is_white)
+                         for record in records())
+                self.sheet_pages[designer] = len(write_contact_sheets(folder, designer, tiles, self.thumbnail_size))
+            except Exception as e:
+                self.log(f"Error writing contact sheets for {designer}: {str(e)}")
+        self.sheets_dirty.clear()
+        self.log(f"Contact sheets: {sum(self.sheet_pages.values())} pages")
+
+    def is_white_background(self, image_path):
+        if self.cache:
+            cached = self.cache.get(image_path, self.patch_size, self.white_tolerance)
+            if cached:
+                return cached.is_white
+        return is_white_background(image_path, self.patch_size, self.white_tolerance)
+
+    def extract_file_id(self, filename):
+        return self.id_extractor(filename)
+
+    def duplicate_rows(self):
+        """(set number, designer, file, original path) for every file in a near-duplicate set"""
+        rows = []
+        for set_number, keys in enumerate(self.duplicates.duplicate_sets(), 1):
+            for key in keys:
+                designer_index = self.group_designers.get(self.duplicate_ids[key])
+                dest_path = self.duplicate_dests.get(key)
+                rows.append((set_number, designer_name(designer_index) if designer_index is not None else '',
+                             os.path.basename(dest_path) if dest_path else '', key))
+        return rows
+
+    def create_excel_report(self, start_time):
+        try:
+            excel_path = os.path.join(self.source_folder, 'SplitImg_Report.xlsx')
+            writer = StreamingReportWriter(excel_path)
+
+            # Designer columns, coloured from the verdicts recorded while processing
+            writer.write_designer_files(self.stats['designer_files'], self.records)
+            if self.duplicates:
+                writer.write_duplicates(self.duplicate_rows())
+
+            # Write the summary sheet
+            extensions_text = ', '.join(f"{ext} ({count})" for ext, count in self.stats['extensions'].items())
+            processing_time = self.format_time(time.time() - start_time)
+            writer.write_summary([
+                ('Total Images Processed', self.stats['total_images']),
+                ('White Background Images', self.stats['white_background']),
+                ('Non-White Background Images', self.stats['non_white_background']),
+                ('Supported Extensions', extensions_text),
+                ('Total Processing Time', processing_time)
+            ] + ([('Contact Sheet Pages', sum(self.sheet_pages.values()))] if self.make_thumbnails else []))
+            writer.save()
+
+            self.log(f"Excel report created: {excel_path}")
+            return excel_path
+
+        except Exception as e:
+            self.log(f"Error creating Excel report: {str(e)}")
+            return None
@@ -0,0 +1,300 @@
+import io
+import os
+from typing import List, NamedTuple, Optional, Tuple
+import numpy as np
+from PIL import Image, TiffImagePlugin, TiffTags
+from thumbnail_utils import THUMBNAIL_QUALITY, THUMBNAIL_SIZE
+
+# Rows at the top of an image that the corner check looks at
+CORNER_SIZE = 5
+
+# Decoders that write rows top to bottom, so a tile can be cut short after the rows we need
+STREAMING_DECODERS = {'jpeg', 'zip', 'raw'}
+
+# libjpeg refuses to finish a decode that stopped early, after the rows are already written
+EARLY_STOP_ERROR_DECODERS = {'jpeg'}
+
+# Side of the dHash grid; hashes have HASH_SIZE * HASH_SIZE bits
+HASH_SIZE = 8
+
+# TIFF tags that affect how strip data decodes; everything else is left out of the strip copy
+TIFF_DECODE_TAGS = {
+    254, 256, 258, 259, 262, 266, 277, 278, 284, 317, 320, 322, 323,
+    338, 339, 347, 529, 530, 531, 532
+}
+
+class Classification(NamedTuple):
+    """
+    Background verdict and pixel size of one image; width and height are 0 if it could not be read,
+    and error says why, so it reaches the caller's log from a pool worker
+    """
+    path: str
+    is_white: bool
+    width: int
+    height: int
+    error: Optional[str] = None
+
+def _as_tuple(value) -> tuple:
+    return value if isinstance(value, tuple) else (value,)
+
+def _load_streaming_tiles(img: Image.Image, strip_height: int) -> Optional[Image.Image]:
+    """
+    Decode only the tiles covering the top rows, cutting streaming tiles short
+    """
+    width, height = img.size
+    tiles = []
+    for tile in img.tile:
+        decoder_name, extents, offset, args = tile
+        x0, y0, x1, y1 = extents
+        if y0 >= strip_height:
+            continue
+        if y1 > strip_height:
+            if decoder_name not in STREAMING_DECODERS:
+                return None
+            if decoder_name == 'raw':
+                raw_args = _as_tuple(args) + (0, 1)
+                stride, orientation = raw_args[1], raw_args[2]
+                if orientation < 0:
+                    # Bottom-up rows, so the top of the image is at the end of the tile
+                    if stride <= 0:
+                        return None
+                    offset += (y1 - strip_height) * stride
+            extents = (x0, y0, x1, strip_height)
+        tiles.append(type(tile)(decoder_name, extents, offset, args) if hasattr(tile, '_fields')
+                     else (decoder_name, extents, offset, args))
+    if not tiles:
+        return None
+
+    img.tile = tiles
+    img._size = (width, max(tile[1][3] for tile in tiles))
+    try:
+        img.load()
+    except OSError:
+        if not all(tile[0] in EARLY_STOP_ERROR_DECODERS for tile in tiles):
+            raise
+    return img.crop((0, 0, width, strip_height))
+
+def _load_tiff_strips(img: Image.Image, strip_height: int) -> Optional[Image.Image]:
+    """
+    Copy the first strips or tiles of a libtiff-decoded TIFF into a small TIFF and decode that
+    """
+    tags = img.tag_v2
+    width, height = img.size
+    if tags.get(284, 1) != 1:
+        return None
+
+    if 324 in tags:
+        tile_width, tile_length = tags[322], tags[323]
+        tile_rows = -(-strip_height // tile_length)
+        count = -(-width // tile_width) * tile_rows
+        rows = min(tile_rows * tile_length, height)
+        offset_tag, count_tag = 324, 325
+    else:
+        rows_per_strip = tags.get(278, height)
+        count = -(-strip_height // rows_per_strip)
+        rows = min(count * rows_per_strip, height)
+        offset_tag, count_tag = 273, 279
+    if rows >= height:
+        return None
+
+    offsets = _as_tuple(tags[offset_tag])[:count]
+    byte_counts = _as_tuple(tags[count_tag])[:count]
+    chunks = []
+    for offset, byte_count in zip(offsets, byte_counts):
+        img.fp.seek(offset)
+        chunks.append(img.fp.read(byte_count))
+
+    ifd = TiffImagePlugin.ImageFileDirectory_v2(prefix=tags.prefix)
+    for tag in TIFF_DECODE_TAGS.intersection(tags):
+        ifd.tagtype[tag] = tags.tagtype[tag]
+        ifd[tag] = tags[tag]
+    ifd.tagtype[257] = ifd.tagtype[offset_tag] = ifd.tagtype[count_tag] = TiffTags.LONG
+    ifd[257] = rows
+    ifd[count_tag] = byte_counts
+    ifd[offset_tag] = (0,) * len(byte_counts)
+
+    # Strip data goes straight after the IFD. Pillow already shifts StripOffsets past the
+    # IFD when serialising, TileOffsets have to be placed by hand
+    byteorder = 'little' if tags.prefix == b'II' else 'big'
+    position = 0 if offset_tag == 273 else 8 + len(ifd.tobytes(8))
+    strip_offsets = []
+    for chunk in chunks:
+        strip_offsets.append(position)
+        position += len(chunk)
+    ifd[offset_tag] = tuple(strip_offsets)
+    header = tags.prefix + (42).to_bytes(2, byteorder) + (8).to_bytes(4, byteorder)
+
+    with Image.open(io.BytesIO(header + ifd.tobytes(8) + b''.join(chunks))) as strip:
+        strip.load()
+        return strip.crop((0, 0, width, strip_height))
+
+def _load_partial(img: Image.Image, strip_height: int) -> Optional[Image.Image]:
+    """
+    Decode just the top rows of an open image, or return None if the format needs a full decode
+    """
+    if strip_height >= img.height or not img.tile:
+        return None
+    if img.format == 'PNG' and img.info.get('interlace'):
+        return None
+    if img.format == 'TIFF' and img.tile[0][0] == 'libtiff':
+        return _load_tiff_strips(img, strip_height)
+    return _load_streaming_tiles(img, strip_height)
+
+def _open_image(image_path: str, data: Optional[bytes] = None) -> Image.Image:
+    """
+    Open an image from its path, or from its bytes when the file was already read
+    """
+    return Image.open(io.BytesIO(data) if data is not None else image_path)
+
+def _read_top_strip(image_path: str, strip_height: int, data: Optional[bytes] = None) -> Tuple[Image.Image, Tuple[int, int]]:
+    strip_height = max(1, strip_height)
+    try:
+        with _open_image(image_path, data) as img:
+            size = img.size
+            strip = _load_partial(img, min(strip_height, img.height))
+            if strip is not None:
+                return strip, size
+    except Exception:
+        # Anything unexpected in the partial path gets a plain full decode instead
+        pass
+
+    with _open_image(image_path, data) as img:
+        img.load()
+        return img.crop((0, 0, img.width, min(strip_height, img.height))), img.size
+
+def read_top_strip(image_path: str, strip_height: int = CORNER_SIZE) -> Image.Image:
+    """
+    Return the top rows of an image, decoding as little of the file as the format allows
+    """
+    return _read_top_strip(image_path, strip_height)[0]
+
+def to_rgb_array(img: Image.Image) -> np.ndarray:
+    """
+    Convert an image region to an HxWx3 uint8 array with RGB meaning, whatever its Pillow mode
+    """
+    if img.mode.startswith('I'):
+        # 16-bit greyscale (I;16*, and I as Pillow opens 16-bit PNGs), scaled down to 8 bits
+        values = (np.clip(np.asarray(img, dtype=np.int64), 0, 65535) >> 8).astype(np.uint8)
+        return np.repeat(values[..., np.newaxis], 3, axis=2)
+    if img.mode == 'F':
+        values = np.clip(np.asarray(img), 0, 255).astype(np.uint8)
+        return np.repeat(values[..., np.newaxis], 3, axis=2)
+    if img.mode != 'RGB':
+        # Alpha is dropped, palettes are looked up and CMYK/YCbCr/LAB are converted
+        img = img.convert('RGB')
+    return np.asarray(img)
+
+def corners_are_white(strip: Image.Image, patch_size: int = CORNER_SIZE, tolerance: int = 0) -> bool:
+    """
+    Check the top-left and top-right patches of a strip in one vectorized comparison
+    """
+    width, height = strip.size
+    patch_size = max(1, min(patch_size, width, height))
+    corners = np.stack([
+        to_rgb_array(strip.crop((0, 0, patch_size, patch_size))),
+        to_rgb_array(strip.crop((width - patch_size, 0, width, patch_size)))
+    ])
+    return bool((corners.reshape(2, -1).min(axis=1) >= 255 - tolerance).any())
+
+def classify_image(image_path: str, patch_size: int = CORNER_SIZE, tolerance: int = 0,
+                   data: Optional[bytes] = None) -> Classification:
+    """
+    Classify a single image; module level so it can be sent to a process pool
+    """
+    try:
+        strip, (width, height) = _read_top_strip(image_path, patch_size, data)
+        with strip:
+            return Classification(image_path, corners_are_white(strip, patch_size, tolerance), width, height)
+    except Exception as e:
+        return Classification(image_path, False, 0, 0,
+                              f"Error checking white background of {os.path.basename(image_path)}: {e}")
+
+def is_white_background(image_path: str, patch_size: int = CORNER_SIZE, tolerance: int = 0) -> bool:
+    """
+    Check whether the top-left or top-right corner patch of an image is white within tolerance
+    """
+    return classify_image(image_path, patch_size, tolerance).is_white
+
+def default_worker_count() -> int:
+    """
+    Number of classification workers to use when none is configured
+    """
+    return os.cpu_count() or 1
+
+def pool_chunksize(total: int, workers: int) -> int:
+    """
+    Batch size for process pool maps, keeping IPC overhead low without starving workers
+    """
+    if workers <= 0:
+        return 1
+    return max(1, min(64, total // (workers * 4)))
+
+def classify_batch(image_paths: List[str], patch_size: int = CORNER_SIZE, tolerance: int = 0) -> List[Classification]:
+    """
+    Classify several images in one call, so a pool task carries more than one file
+    """
+    return [classify_image(image_path, patch_size, tolerance) for image_path in image_paths]
+
+def dhash_image(image_path: str, hash_size: int = HASH_SIZE) -> Optional[int]:
+    """
+    Difference hash of an image: brightness gradients of a tiny greyscale copy, which survive
+    resizing, recompression and small colour changes. JPEGs are decoded at reduced size
+    """
+    try:
+        with Image.open(image_path) as img:
+            img.draft(img.mode, (hash_size * 8, hash_size * 8))
+            if img.mode in ('1', 'P', 'PA'):
+                img = img.convert('RGB')
+            elif img.mode.startswith('I;16'):
+                # Pillow cannot resample 16-bit modes directly
+                img = img.convert('I')
+            small = img.resize((hash_size + 1, hash_size), Image.BILINEAR, reducing_gap=2.0)
+            grey = to_rgb_array(small).astype(np.int16).sum(axis=2)
+            bits = np.packbits(grey[:, 1:] > grey[:, :-1])
+            return int.from_bytes(bits.tobytes(), 'big')
+    except Exception as e:
+        print(f"Error hashing {os.path.basename(image_path)}: {e}")
+        return None
+
+def make_thumbnail(image_path: str, size: int = THUMBNAIL_SIZE, data: Optional[bytes] = None) -> Optional[bytes]:
+    """
+    JPEG thumbnail no larger than size on either side, with transparency flattened onto white.
+    JPEGs are decoded at reduced size
+    """
+    try:
+        with _open_image(image_path, data) as img:
+            img.draft('RGB', (size, size))
+            if img.mode.startswith('I;16'):
+                # Pillow cannot resample 16-bit modes directly
+                img = img.convert('I')
+            elif img.mode in ('1', 'P', 'PA', 'LA') or 'transparency' in img.info:
+                img = img.convert('RGBA')
+            img.thumbnail((size, size), Image.BILINEAR, reducing_gap=2.0)
+            if img.mode == 'RGBA':
+                img = Image.alpha_composite(Image.new('RGBA', img.size, 'white'), img)
+            output = io.BytesIO()
+            Image.fromarray(to_rgb_array(img)).save(output, 'JPEG', quality=THUMBNAIL_QUALITY)
+            return output.getvalue()
+    except Exception as e:
+        print(f"Error making thumbnail of {os.path.basename(image_path)}: {e}")
+        return None
+
+def classify_with_thumbnail(image_path: str, patch_size: int = CORNER_SIZE, tolerance: int = 0,
+                            thumbnail_size: int = THUMBNAIL_SIZE) -> Tuple[Classification, Optional[bytes]]:
+    """
+    Classify an image and make its thumbnail from a single read of the file
+    """
+    try:
+        with open(image_path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        return Classification(image_path, False, 0, 0,
+                              f"Error checking white background of {os.path.basename(image_path)}: {e}"), None
+    return classify_image(image_path, patch_size, tolerance, data), make_thumbnail(image_path, thumbnail_size, data)
+
+def classify_thumbnail_batch(image_paths: List[str], patch_size: int = CORNER_SIZE, tolerance: int = 0,
+                             thumbnail_size: int = THUMBNAIL_SIZE) -> List[Tuple[Classification, Optional[bytes]]]:
+    """
+    classify_batch that also makes thumbnails
+    """
+    return [classify_with_thumbnail(image_path, patch_size, tolerance, thumbnail_size) for image_path in image_paths]
@@ -0,0 +1,120 @@
+import io
+import os
+import threading
+import time
+from typing import Callable, Iterable
+
+class JobCancelled(Exception):
+    pass
+
+class JobControl:
+    """
+    Shared between a background job and the Tk thread: the Tk thread asks for cancellation,
+    the job checks for it between blocks and reports the bytes it has processed.
+
+    Progress and log lines go through a ProgressBus, so the Tk thread picks them up on its
+    root.after timer however often the job reports.
+    """
+    def __init__(self, bus=None):
+        self.bus = bus
+        self.cancel_event = threading.Event()
+        self.lock = threading.Lock()
+        self.done_bytes = 0
+        self.total_bytes = 0
+        self.started = time.monotonic()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def check(self):
+        """
+        Raise JobCancelled once cancellation has been asked for
+        """
+        if self.cancel_event.is_set():
+            raise JobCancelled("Cancelled")
+
+    def expect(self, size: int):
+        """
+        Add bytes the job is going to process to its total
+        """
+        with self.lock:
+            self.total_bytes += size
+            self._publish()
+
+    def advance(self, size: int):
+        with self.lock:
+            self.done_bytes += size
+            self._publish()
+
+    def _publish(self):
+        if self.bus is not None:
+            self.bus.publish('progress', self.done_bytes, self.total_bytes, time.monotonic() - self.started)
+
+    def log(self, message: str):
+        if self.bus is not None:
+            self.bus.log(message)
+
+class JobFile(io.FileIO):
+    """
+    Archive opened for reading by a job; every read checks for cancellation and counts
+    toward the job's progress, so extraction can be stopped and followed by archive bytes
+    """
+    def __init__(self, path: str, control: JobControl):
+        super().__init__(path, 'rb')
+        self.control = control
+
+    def read(self, size: int = -1) -> bytes:
+        self.control.check()
+        data = super().read(size)
+        self.control.advance(len(data))
+        return data
+
+    def readinto(self, buffer) -> int:
+        self.control.check()
+        count = super().readinto(buffer)
+        self.control.advance(count or 0)
+        return count
+
+def remove_outputs(paths: Iterable[str], folders: Iterable[str] = ()):
+    """
+    Delete files a cancelled job left behind, then the given folders it created, if empty
+    """
+    for path in paths:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+    # Deepest folders first, so a parent is empty by the time it is tried
+    for folder in sorted(folders, key=len, reverse=True):
+        try:
+            os.rmdir(folder)
+        except OSError:
+            pass
+
+class BackgroundJob(threading.Thread):
+    """
+    Runs work(control) on a daemon thread and publishes how it ended on the bus:
+    'complete' with its return value, 'cancelled', or 'failed' with the error
+    """
+    def __init__(self, work: Callable[[JobControl], object], bus):
+        super().__init__(daemon=True)
+        self.work = work
+        self.bus = bus
+        self.control = JobControl(bus)
+
+    def run(self):
+        try:
+            result = self.work(self.control)
+        except JobCancelled:
+            self.bus.publish('cancelled')
+        except Exception as e:
+            self.bus.publish('failed', str(e))
+        else:
+            self.bus.publish('complete', result)
+
+    def cancel(self):
+        self.control.cancel()
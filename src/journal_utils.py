@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Dict, NamedTuple, Optional, Tuple
+from cache_utils import default_cache_dir
+
+JOURNAL_FORMAT_VERSION = 1
+
+JOURNAL_FILE = 'SplitImg_Journal.jsonl'
+
+# Journals live in the per-user cache directory, so nothing is left in the folders being split
+JOURNAL_FOLDER = 'Journals'
+
+# Journal lines written between fsyncs; every line is flushed to the OS as it is written
+JOURNAL_SYNC_INTERVAL = 500
+
+def default_journal_path(source_folder: str) -> str:
+    """
+    Journal of runs on source_folder: named after the folder, with a hash of its full path so
+    folders with the same name never share one
+    """
+    source_folder = os.path.normcase(os.path.realpath(source_folder))
+    digest = hashlib.blake2b(source_folder.encode('utf-8', 'surrogateescape'), digest_size=8).hexdigest()
+    name = os.path.basename(source_folder.rstrip(os.sep)) or 'root'
+    return os.path.join(default_cache_dir(), JOURNAL_FOLDER, f"{name}_{digest}_{JOURNAL_FILE}")
+
+def journal_relpath(path: str, folder: str) -> str:
+    """
+    Path as the journal records it: relative to folder, or absolute when it is outside it,
+    as designer folders on another volume or Windows drive are
+    """
+    try:
+        relative = os.path.relpath(path, folder)
+    except ValueError:
+        return os.path.abspath(path)
+    if relative == os.pardir or relative.startswith(os.pardir + os.sep):
+        return os.path.abspath(path)
+    return relative
+
+class JournalMove(NamedTuple):
+    """
+    A move recorded before it was attempted, with paths relative to the source folder where possible
+    """
+    source: str
+    dest: str
+    designer_index: int
+    size: int
+
+class JournalState(NamedTuple):
+    """
+    What an interrupted run got through: moves by destination and verdicts by destination
+    """
+    header: dict
+    moves: Dict[str, JournalMove]
+    results: Dict[str, Tuple[int, int, int]]
+
+class RunJournal:
+    """
+    Write-ahead journal for a Split Image run.
+
+    A move is logged before the rename and a verdict after classification, so after a crash
+    every file is either still in the source folder, or in a designer folder with a logged move.
+    Safe to call from several threads.
+    """
+    def __init__(self, path: str, header: dict, state: Optional[JournalState] = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+        # Start from a compacted copy of the previous journal, swapped in atomically
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(dict(header, kind='journal', version=JOURNAL_FORMAT_VERSION,
+                                    created=datetime.now().isoformat(timespec='seconds'))) + '\n')
+            if state is not None:
+                for move in state.moves.values():
+                    f.write(self._line('move', *move))
+                    if move.dest in state.results:
+                        f.write(self._line('done', move.dest, *state.results[move.dest]))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        self._file = open(path, 'a', encoding='utf-8')
+
+    @staticmethod
+    def _line(*fields) -> str:
+        return json.dumps(fields, separators=(',', ':')) + '\n'
+
+    def _write(self, line: str):
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self._unsynced += 1
+            if self._unsynced >= JOURNAL_SYNC_INTERVAL:
+                os.fsync(self._file.fileno())
+                self._unsynced = 0
+
+    def log_move(self, source: str, dest: str, designer_index: int, size: int):
+        self._write(self._line('move', source, dest, designer_index, size))
+
+    def log_result(self, dest: str, is_white: bool, width: int, height: int):
+        self._write(self._line('done', dest, int(is_white), width, height))
+
+    def close(self, remove: bool = False):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+        if remove:
+            os.remove(self.path)
+
+def read_journal(path: str) -> Optional[JournalState]:
+    """
+    Load the journal of an interrupted run, or None if there is none. A line cut short by
+    the crash ends the journal
+    """
+    if not os.path.exists(path):
+        return None
+    moves = {}
+    results = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        header = json.loads(f.readline() or 'null')
+        if not isinstance(header, dict) or header.get('kind') != 'journal':
+            raise ValueError(f"{path} is not a Split Image journal")
+        if header.get('version') != JOURNAL_FORMAT_VERSION:
+            raise ValueError(f"{path} has unsupported version {header.get('version')}")
+        for line in f:
+            try:
+                fields = json.loads(line)
+            except ValueError:
+                break
+            if fields[0] == 'move':
+                move = JournalMove(*fields[1:])
+                moves[move.dest] = move
+            elif fields[0] == 'done':
+                results[fields[1]] = (int(fields[2]), fields[3], fields[4])
+    return JournalState(header, moves, results)
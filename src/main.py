@@ -1,5 +1,6 @@
 import sys
 import os
+import multiprocessing
 import tkinter as tk
 from tkinter import ttk
 import customtkinter as ctk
@@ -544,4 +545,6 @@ def on_activate(root):
     root.focus_force()
 
 if __name__ == "__main__":
+    # Required for the Split Image process pool in the frozen app
+    multiprocessing.freeze_support()
     main() 
\ No newline at end of file
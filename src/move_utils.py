@@ -0,0 +1,222 @@
+import errno
+import filecmp
+import hashlib
+import os
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, NamedTuple, Optional, Tuple
+
+# Read/write buffer for cross-device copies when no kernel copy call is available
+COPY_BUFFER_SIZE = 8 * 1024 * 1024
+
+# Bytes per copy_file_range/sendfile call
+KERNEL_COPY_CHUNK = 64 * 1024 * 1024
+
+PARTIAL_SUFFIX = '.partial'
+
+# copy_file_range and sendfile to a regular file only work on Linux
+KERNEL_COPY = sys.platform.startswith('linux')
+
+class MoveJob(NamedTuple):
+    """
+    A reserved move; dest is final, collisions were resolved when it was reserved
+    """
+    source: str
+    dest: str
+    size: int
+
+def collision_name(name: str, source_key: str, attempt: int = 0) -> str:
+    """
+    Alternative name for a file whose name is taken: a short hash of where it came from, so the
+    same source file always gets the same name whatever order files are moved in
+    """
+    stem, ext = os.path.splitext(name)
+    digest = hashlib.blake2b(source_key.encode('utf-8', 'surrogateescape'), digest_size=4).hexdigest()
+    return f"{stem}_{digest}{ext}" if attempt == 0 else f"{stem}_{digest}_{attempt}{ext}"
+
+class MoveEngine:
+    """
+    Moves files into designer folders: a rename on the same volume, otherwise a copy with fsync
+    followed by unlinking the source. Destination names are reserved up front so files with
+    the same name from different subfolders never overwrite each other.
+    """
+    def __init__(self, source_root: str, workers: int = 1):
+        self.source_root = source_root
+        self.workers = max(1, workers)
+        self._lock = threading.Lock()
+        self._reserved = set()
+        self._dir_devices = {}
+        self.renamed = 0
+        self.copied = 0
+        self.bytes_moved = 0
+        self.bytes_copied = 0
+        self.copy_seconds = 0.0
+        self.started = None
+
+    def reserve(self, source: str, dest_folder: str, size: int = 0) -> MoveJob:
+        """
+        Pick the destination for a file, renaming it if the name is already taken in dest_folder
+        """
+        name = os.path.basename(source)
+        source_key = os.path.relpath(source, self.source_root)
+        with self._lock:
+            dest = os.path.join(dest_folder, name)
+            attempt = 0
+            while dest in self._reserved or os.path.lexists(dest):
+                dest = os.path.join(dest_folder, collision_name(name, source_key, attempt))
+                attempt += 1
+            self._reserved.add(dest)
+        return MoveJob(source, dest, size)
+
+    def same_device(self, source: str, dest: str) -> bool:
+        dest_folder = os.path.dirname(dest)
+        device = self._dir_devices.get(dest_folder)
+        if device is None:
+            device = self._dir_devices[dest_folder] = os.stat(dest_folder).st_dev
+        return os.stat(source).st_dev == device
+
+    def move(self, job: MoveJob):
+        """
+        Carry out a reserved move; raises OSError and leaves the source in place on failure
+        """
+        if self.started is None:
+            self.started = time.perf_counter()
+        if self.same_device(job.source, job.dest):
+            try:
+                os.rename(job.source, job.dest)
+                with self._lock:
+                    self.renamed += 1
+                    self.bytes_moved += job.size
+                return
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+        started = time.perf_counter()
+        copied = copy_file(job.source, job.dest)
+        os.unlink(job.source)
+        with self._lock:
+            self.copied += 1
+            self.bytes_moved += copied
+            self.bytes_copied += copied
+            self.copy_seconds += time.perf_counter() - started
+
+    def move_many(self, jobs: Iterable[MoveJob]) -> Iterator[Tuple[MoveJob, Optional[str]]]:
+        """
+        Move jobs, on a thread pool when workers > 1, yielding each with an error message or None
+        """
+        def run(job):
+            try:
+                self.move(job)
+                return job, None
+            except OSError as e:
+                return job, str(e)
+
+        if self.workers == 1:
+            for job in jobs:
+                yield run(job)
+            return
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            yield from executor.map(run, jobs)
+
+    @property
+    def bytes_per_second(self) -> float:
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        return self.bytes_moved / elapsed if elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        copy_rate = self.bytes_copied / self.copy_seconds if self.copy_seconds > 0 else 0.0
+        return (f"Moved {self.renamed + self.copied} files ({self.renamed} renamed, {self.copied} copied across "
+                f"devices), {self.bytes_moved / 2**20:.1f} MB at {self.bytes_per_second / 2**20:.1f} MB/s"
+                + (f", copies {copy_rate / 2**20:.1f} MB/s per thread" if self.copied else ""))
+
+def _kernel_copy(src_fd: int, dst_fd: int, size: int) -> bool:
+    """
+    Copy with copy_file_range or sendfile (Linux); returns False if neither is usable here
+    """
+    for call in (getattr(os, 'copy_file_range', None), getattr(os, 'sendfile', None)):
+        if call is None:
+            continue
+        offset = 0
+        try:
+            while offset < size:
+                if call is os.sendfile:
+                    sent = call(dst_fd, src_fd, offset, min(KERNEL_COPY_CHUNK, size - offset))
+                else:
+                    sent = call(src_fd, dst_fd, min(KERNEL_COPY_CHUNK, size - offset))
+                if sent == 0:
+                    break
+                offset += sent
+        except OSError as e:
+            if offset == 0 and e.errno in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.ENOTSUP,
+                                           errno.EOPNOTSUPP, errno.EBADF):
+                continue
+            raise
+        if offset == size:
+            return True
+        if offset == 0:
+            continue
+        raise OSError(errno.EIO, f"short copy: {offset} of {size} bytes")
+    return False
+
+def partial_path(dest: str) -> str:
+    """
+    Hidden file a copy to dest is written to before it is renamed into place
+    """
+    folder, name = os.path.split(dest)
+    return os.path.join(folder, '.' + name + PARTIAL_SUFFIX)
+
+def remove_partial(dest: str):
+    """
+    Delete the partial file an interrupted copy to dest left behind, if there is one
+    """
+    try:
+        os.unlink(partial_path(dest))
+    except FileNotFoundError:
+        pass
+
+def finished_copy(source: str, dest: str) -> bool:
+    """
+    Whether dest is a completed cross-device copy of source: on another device, the same size,
+    and the same modification time (copy_file keeps it) or the same contents. Anything else at
+    the source path is a different file
+    """
+    source_stat = os.stat(source)
+    dest_stat = os.stat(dest)
+    if source_stat.st_dev == dest_stat.st_dev or source_stat.st_size != dest_stat.st_size:
+        return False
+    return source_stat.st_mtime_ns == dest_stat.st_mtime_ns or filecmp.cmp(source, dest, shallow=False)
+
+def copy_file(source: str, dest: str) -> int:
+    """
+    Copy source to dest through a partial file that is fsynced and renamed into place, keeping
+    the modification time; returns the bytes copied
+    """
+    partial = partial_path(dest)
+    with open(source, 'rb') as src:
+        size = os.fstat(src.fileno()).st_size
+        try:
+            with open(partial, 'wb') as dst:
+                if not (KERNEL_COPY and _kernel_copy(src.fileno(), dst.fileno(), size)):
+                    buffer = bytearray(COPY_BUFFER_SIZE)
+                    view = memoryview(buffer)
+                    while True:
+                        count = src.readinto(buffer)
+                        if not count:
+                            break
+                        dst.write(view[:count])
+                dst.flush()
+                os.fsync(dst.fileno())
+            if os.path.getsize(partial) != size:
+                raise OSError(errno.EIO, f"copy of {source} is incomplete")
+            shutil.copystat(source, partial)
+            os.replace(partial, dest)
+        except BaseException:
+            try:
+                os.unlink(partial)
+            except OSError:
+                pass
+            raise
+    return size
@@ -0,0 +1,162 @@
+import errno
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Tuple
+from thumbnail_utils import CONTACT_SHEET_FOLDER
+
+PLAN_FORMAT_VERSION = 1
+
+PLAN_FILE = 'SplitImg_Plan.jsonl'
+UNDO_FILE = 'SplitImg_Undo.jsonl'
+
+# Renames per batch; the undo file is flushed once per batch
+RENAME_BATCH_SIZE = 500
+
+class PlanEntry(NamedTuple):
+    """
+    One planned move: the file's path relative to the source folder, its designer, the
+    classification made while planning, so applying the plan does not decode anything, and the
+    destination reserved for it relative to the source folder
+    """
+    source: str
+    designer_index: int
+    is_white: bool
+    size: int
+    width: int
+    height: int
+    dest: str
+
+def designer_name(designer_index: int) -> str:
+    return f'Designer_{designer_index + 1}'
+
+def default_destination(source: str, designer_index: int) -> str:
+    """
+    Destination of a file in plans written before destinations were reserved
+    """
+    return os.path.join(designer_name(designer_index), os.path.basename(source))
+
+class JsonLinesWriter:
+    """
+    Writes a header object followed by one compact JSON array per row
+    """
+    def __init__(self, path: str, header: dict):
+        self.path = path
+        self.rows = 0
+        self._file = open(path, 'w', encoding='utf-8')
+        self._file.write(json.dumps(dict(header, version=PLAN_FORMAT_VERSION,
+                                         created=datetime.now().isoformat(timespec='seconds'))) + '\n')
+
+    def add(self, row: Sequence):
+        self._file.write(json.dumps(list(row), separators=(',', ':')) + '\n')
+        self.rows += 1
+
+    def flush(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+def read_json_lines(path: str, kind: str) -> Tuple[dict, Iterator[list]]:
+    """
+    Read the header of a plan or undo file and return it with an iterator over its rows
+    """
+    f = open(path, 'r', encoding='utf-8')
+    try:
+        header = json.loads(f.readline() or 'null')
+    except ValueError:
+        header = None
+    if not isinstance(header, dict) or header.get('kind') != kind:
+        f.close()
+        raise ValueError(f"{path} is not a Split Image {kind} file")
+    if header.get('version') != PLAN_FORMAT_VERSION:
+        f.close()
+        raise ValueError(f"{path} has unsupported version {header.get('version')}")
+
+    def rows():
+        with f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    return header, rows()
+
+def write_plan(path: str, source_folder: str, num_designers: int, entries: Sequence[PlanEntry], **settings) -> str:
+    writer = JsonLinesWriter(path, dict(settings, kind='plan', source_folder=source_folder,
+                                        num_designers=num_designers, files=len(entries)))
+    try:
+        for entry in entries:
+            writer.add((entry.source, entry.designer_index, int(entry.is_white),
+                        entry.size, entry.width, entry.height, entry.dest))
+    finally:
+        writer.close()
+    return path
+
+def read_plan(path: str) -> Tuple[dict, List[PlanEntry]]:
+    header, rows = read_json_lines(path, 'plan')
+    return header, [PlanEntry(source, designer_index, bool(is_white), size, width, height,
+                              dest[0] if dest else default_destination(source, designer_index))
+                    for source, designer_index, is_white, size, width, height, *dest in rows]
+
+def rename_batch(source_folder: str, moves: Sequence[Tuple[str, str]]) -> List[Tuple[str, str, Optional[str]]]:
+    """
+    Rename (from, to) pairs relative to source_folder, returning each pair with an error or None.
+    A file already at the destination is never overwritten; the pair is reported as a conflict
+    """
+    results = []
+    for from_path, to_path in moves:
+        try:
+            destination = os.path.join(source_folder, to_path)
+            if os.path.lexists(destination):
+                raise FileExistsError(errno.EEXIST, "destination already exists, not overwritten", to_path)
+            os.rename(os.path.join(source_folder, from_path), destination)
+            results.append((from_path, to_path, None))
+        except OSError as e:
+            results.append((from_path, to_path, str(e)))
+    return results
+
+def rename_in_batches(source_folder: str, moves: Sequence[Tuple[str, str]], workers: int = 1) -> Iterator[List[Tuple[str, str, Optional[str]]]]:
+    """
+    Yield rename results batch by batch; with workers > 1 batches run on a thread pool, which
+    hides the per-call latency of network shares
+    """
+    batches = [moves[i:i + RENAME_BATCH_SIZE] for i in range(0, len(moves), RENAME_BATCH_SIZE)]
+    if workers <= 1:
+        for batch in batches:
+            yield rename_batch(source_folder, batch)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(lambda batch: rename_batch(source_folder, batch), batches)
+
+def undo_moves(source_folder: str, undo_path: Optional[str] = None, workers: int = 1) -> Tuple[int, int]:
+    """
+    Move files back to where an applied plan found them, then remove contact sheets and designer
+    folders left empty.
+    Returns the number of files restored and the number that could not be
+    """
+    undo_path = undo_path or os.path.join(source_folder, UNDO_FILE)
+    header, rows = read_json_lines(undo_path, 'undo')
+    moves = [(current, original) for current, original in rows]
+
+    restored = 0
+    failed = 0
+    for results in rename_in_batches(source_folder, moves, workers):
+        for current, original, error in results:
+            if error:
+                failed += 1
+                print(f"Error restoring {current}: {error}")
+            else:
+                restored += 1
+
+    for designer_index in range(header.get('num_designers', 0)):
+        designer_folder = os.path.join(source_folder, designer_name(designer_index))
+        shutil.rmtree(os.path.join(designer_folder, CONTACT_SHEET_FOLDER), ignore_errors=True)
+        try:
+            os.rmdir(designer_folder)
+        except OSError:
+            pass
+    return restored, failed
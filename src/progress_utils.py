@@ -0,0 +1,72 @@
+import threading
+from typing import Callable, Dict, List, Tuple
+
+# Default UI refresh rate for progress updates
+DEFAULT_FPS = 15
+
+class ProgressBus:
+    """
+    Thread-safe channel from worker threads to the Tk main loop.
+
+    Workers publish events from any thread; only the latest arguments per event name are kept
+    and log lines are buffered. The UI thread drains everything on a root.after timer, so widgets
+    are touched once per frame from the main thread however fast the worker reports.
+    """
+    def __init__(self, fps: int = DEFAULT_FPS):
+        self.interval_ms = max(1, int(1000 / fps))
+        self._lock = threading.Lock()
+        self._latest = {}
+        self._logs = []
+        self._after_id = None
+        self._widget = None
+
+    def publish(self, event: str, *args):
+        with self._lock:
+            self._latest[event] = args
+
+    def callback(self, event: str) -> Callable:
+        """
+        A function that publishes its arguments as the given event, for use as a worker callback
+        """
+        return lambda *args: self.publish(event, *args)
+
+    def log(self, message: str):
+        with self._lock:
+            self._logs.append(message)
+
+    def drain(self) -> Tuple[Dict[str, tuple], List[str]]:
+        """
+        Take the latest arguments per event and all buffered log lines
+        """
+        with self._lock:
+            latest, self._latest = self._latest, {}
+            logs, self._logs = self._logs, []
+        return latest, logs
+
+    def start(self, widget, handler: Callable[[Dict[str, tuple], List[str]], None]):
+        """
+        Poll on widget.after and pass each frame's updates to handler on the Tk thread
+        """
+        self.stop()
+        self._widget = widget
+
+        def tick():
+            self._after_id = None
+            if not widget.winfo_exists():
+                return
+            updates, logs = self.drain()
+            if updates or logs:
+                handler(updates, logs)
+            if self._widget is widget:
+                self._after_id = widget.after(self.interval_ms, tick)
+
+        self._after_id = widget.after(self.interval_ms, tick)
+
+    def stop(self):
+        if self._widget is not None and self._after_id is not None:
+            try:
+                self._widget.after_cancel(self._after_id)
+            except Exception:
+                pass
+        self._after_id = None
+        self._widget = None
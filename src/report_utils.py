@@ -0,0 +1,122 @@
+import os
+import sqlite3
+import threading
+from itertools import zip_longest
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+
+# Cell colours for the Designer Files sheet
+WHITE_BACKGROUND_COLOR = "E2EFDA"  # Olive Green, Accent 3, Lighter 80%
+OTHER_BACKGROUND_COLOR = "D9E1F2"  # Dark Blue, Text 2, Lighter 80%
+
+class FileRecord(NamedTuple):
+    """
+    What Split Image learned about one file, recorded once while processing
+    """
+    path: str
+    designer: str
+    is_white: bool
+    ext: str
+    size: int
+
+class RecordSpool:
+    """
+    FileRecords kept in a temporary SQLite database instead of memory, looked up by designer and
+    file name; SQLite only caches a few pages, so memory stays flat however many files are recorded
+    """
+    def __init__(self):
+        # An empty name opens a private database in a temporary file, deleted when it is closed
+        self.db = sqlite3.connect('', check_same_thread=False)
+        self.db.execute('CREATE TABLE records (designer TEXT, name TEXT, path TEXT, is_white INTEGER, '
+                        'ext TEXT, size INTEGER, PRIMARY KEY (designer, name))')
+        self.lock = threading.Lock()
+
+    def add(self, record: FileRecord):
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?)',
+                            (record.designer, os.path.basename(record.path), record.path, int(record.is_white),
+                             record.ext, record.size))
+
+    def get(self, designer: str, image_file: str) -> Optional[FileRecord]:
+        with self.lock:
+            row = self.db.execute('SELECT path, designer, is_white, ext, size FROM records '
+                                  'WHERE designer = ? AND name = ?', (designer, image_file)).fetchone()
+        if row is None:
+            return None
+        path, designer, is_white, ext, size = row
+        return FileRecord(path, designer, bool(is_white), ext, size)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+class StreamingReportWriter:
+    """
+    Write-only openpyxl writer for the Split Image report.
+
+    Rows are serialised to disk as they are appended, and every cell shares one of a few
+    precreated styles, so memory stays flat however many files the report lists.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.workbook = Workbook(write_only=True)
+        thin = Side(style='thin')
+        # Matches the header style pandas used to write
+        self.header_font = Font(bold=True)
+        self.header_border = Border(left=thin, right=thin, top=thin, bottom=thin)
+        self.header_alignment = Alignment(horizontal='center', vertical='top')
+        self.white_fill = PatternFill(start_color=WHITE_BACKGROUND_COLOR, end_color=WHITE_BACKGROUND_COLOR, fill_type="solid")
+        self.other_fill = PatternFill(start_color=OTHER_BACKGROUND_COLOR, end_color=OTHER_BACKGROUND_COLOR, fill_type="solid")
+
+    def header_row(self, worksheet, titles: Sequence[str]) -> List[WriteOnlyCell]:
+        cells = []
+        for title in titles:
+            cell = WriteOnlyCell(worksheet, value=title)
+            cell.font = self.header_font
+            cell.border = self.header_border
+            cell.alignment = self.header_alignment
+            cells.append(cell)
+        return cells
+
+    def file_cell(self, worksheet, image_file: str, is_white: bool) -> WriteOnlyCell:
+        cell = WriteOnlyCell(worksheet, value=image_file)
+        cell.fill = self.white_fill if is_white else self.other_fill
+        return cell
+
+    def write_designer_files(self, designer_files: Dict[str, List[str]], records: RecordSpool):
+        """
+        One column per designer, each file coloured by the verdict in its record
+        """
+        worksheet = self.workbook.create_sheet('Designer Files')
+        designers = list(designer_files)
+        worksheet.append(self.header_row(worksheet, designers))
+        for files in zip_longest(*designer_files.values()):
+            row = []
+            for designer, image_file in zip(designers, files):
+                if image_file is None:
+                    row.append(None)
+                else:
+                    record = records.get(designer, image_file)
+                    row.append(self.file_cell(worksheet, image_file, record.is_white if record else False))
+            worksheet.append(row)
+
+    def write_duplicates(self, rows: Sequence[Tuple[int, str, str, str]]):
+        """
+        One row per file in a near-duplicate set: set number, designer, file name, original path
+        """
+        worksheet = self.workbook.create_sheet('Duplicates')
+        worksheet.append(self.header_row(worksheet, ['Set', 'Designer', 'File', 'Original Path']))
+        for row in rows:
+            worksheet.append(list(row))
+
+    def write_summary(self, rows: Sequence[Tuple[str, object]]):
+        worksheet = self.workbook.create_sheet('Summary')
+        worksheet.append(self.header_row(worksheet, ['Metric', 'Value']))
+        for metric, value in rows:
+            worksheet.append([metric, value])
+
+    def save(self) -> str:
+        self.workbook.save(self.path)
+        return self.path
@@ -0,0 +1,105 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Iterable, Iterator, List, NamedTuple, Tuple
+
+class ScanEntry(NamedTuple):
+    """
+    A file found by the scanner, with the size taken from its DirEntry
+    """
+    path: str
+    name: str
+    ext: str
+    size: int
+
+class FileScanner:
+    """
+    Streams files with the given extensions from a directory tree using os.scandir.
+
+    Directories listed in exclude_dirs (relative to the root) are pruned, sizes come from the
+    DirEntry stat cache, and with threads > 1 directory reads run in a thread pool, which
+    hides the per-directory latency of SMB/NFS mounts.
+    """
+    def __init__(self, root: str, extensions: Iterable[str], exclude_dirs: Iterable[str] = (),
+                 threads: int = 1, with_sizes: bool = True):
+        self.root = root
+        self.extensions = {ext.lower() for ext in extensions}
+        self.exclude_paths = {os.path.normcase(os.path.join(root, name)) for name in exclude_dirs}
+        self.threads = max(1, threads)
+        self.with_sizes = with_sizes
+        self.files_found = 0
+        self.dirs_scanned = 0
+        self.started = None
+        self.finished = None
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def files_per_second(self) -> float:
+        elapsed = self.elapsed
+        return self.files_found / elapsed if elapsed > 0 else 0.0
+
+    def read_dir(self, path: str) -> Tuple[List[ScanEntry], List[str]]:
+        """
+        List one directory, returning matching files and the subdirectories to descend into
+        """
+        files = []
+        subdirs = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if os.path.normcase(entry.path) not in self.exclude_paths:
+                                subdirs.append(entry.path)
+                        elif entry.is_file():
+                            ext = os.path.splitext(entry.name)[1].lower()
+                            if ext in self.extensions:
+                                size = entry.stat().st_size if self.with_sizes else 0
+                                files.append(ScanEntry(entry.path, entry.name, ext, size))
+                    except OSError as e:
+                        print(f"Error reading {entry.path}: {str(e)}")
+        except OSError as e:
+            print(f"Error scanning {path}: {str(e)}")
+        return files, subdirs
+
+    def scan(self) -> Iterator[ScanEntry]:
+        """
+        Yield matching files as directories are read
+        """
+        self.started = time.perf_counter()
+        self.finished = None
+        self.files_found = 0
+        self.dirs_scanned = 0
+        try:
+            if self.threads == 1:
+                pending = [self.root]
+                while pending:
+                    files, subdirs = self.read_dir(pending.pop())
+                    self.dirs_scanned += 1
+                    pending.extend(reversed(subdirs))
+                    for entry in files:
+                        self.files_found += 1
+                        yield entry
+            else:
+                yield from self._scan_threaded()
+        finally:
+            self.finished = time.perf_counter()
+
+    def _scan_threaded(self) -> Iterator[ScanEntry]:
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            running = {executor.submit(self.read_dir, self.root)}
+            while running:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    files, subdirs = future.result()
+                    self.dirs_scanned += 1
+                    for subdir in subdirs:
+                        running.add(executor.submit(self.read_dir, subdir))
+                    for entry in files:
+                        self.files_found += 1
+                        yield entry
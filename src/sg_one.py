@@ -0,0 +1,250 @@
+"""
+Headless command line entry point for SG One.
+
+    python -m sg_one split SOURCE --designers N
+
+Progress is written to stdout as one JSON object per line; diagnostics go to stderr. Only the
+modules a command needs are imported, so nothing here pulls in the GUI toolkits.
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+import time
+from balance_utils import BALANCE_MODES, parse_capacities
+from dedupe_utils import DEFAULT_DUPLICATE_THRESHOLD
+
+# Minimum seconds between progress lines
+DEFAULT_PROGRESS_INTERVAL = 0.5
+
+class JsonLineWriter:
+    """
+    Writes events as JSON lines to a stream, holding back progress events that arrive too often.
+    The latest held-back event is written before the next line of any other event, so the
+    stream never ends on a stale count
+    """
+    def __init__(self, stream, interval: float = DEFAULT_PROGRESS_INTERVAL):
+        self.stream = stream
+        self.interval = interval
+        self.last_emit = {}
+        self.pending = {}
+
+    def emit(self, event: str, throttle: bool = False, **fields):
+        now = time.monotonic()
+        if throttle and now - self.last_emit.get(event, float('-inf')) < self.interval:
+            self.pending[event] = fields
+            return
+        self.pending.pop(event, None)
+        for held_event, held_fields in list(self.pending.items()):
+            self.write(held_event, held_fields)
+        self.pending.clear()
+        self.last_emit[event] = now
+        self.write(event, fields)
+
+    def write(self, event: str, fields: dict):
+        self.stream.write(json.dumps(dict(event=event, **fields)) + '\n')
+        self.stream.flush()
+
+def take_stdout():
+    """
+    Keep the real stdout for JSON output and point fd 1 at stderr, so prints from this
+    process and from pool workers it starts cannot interleave with the JSON lines
+    """
+    sys.stdout.flush()
+    json_stream = os.fdopen(os.dup(1), 'w', encoding='utf-8', buffering=1)
+    os.dup2(2, 1)
+    return json_stream
+
+def run_split(args) -> int:
+    source = os.path.abspath(args.source)
+    json_stream = take_stdout()
+    output = JsonLineWriter(json_stream, args.progress_interval)
+
+    from image_processor import ImageProcessor
+
+    completed = {}
+    start_time = time.time()
+
+    def on_scan(count):
+        output.emit('scan', throttle=True, files=count)
+
+    def on_progress(processed, elapsed, stats):
+        # The last file of the run is always reported
+        output.emit('progress', throttle=processed < stats['total_images'], processed=processed,
+                    total=stats['total_images'],
+                    white_background=stats['white_background'],
+                    non_white_background=stats['non_white_background'], elapsed=elapsed)
+
+    def on_complete(stats):
+        completed.update(stats)
+
+    options = dict(max_workers=args.workers, white_tolerance=args.tolerance, use_cache=not args.no_cache,
+                   cache_path=args.cache_path, pipeline=args.pipeline, scan_threads=args.scan_threads,
+                   balance_mode=args.balance, capacities=args.capacities, mover_workers=args.movers,
+                   resume=not args.no_resume, watch=args.watch, watch_polling=args.poll,
+                   report_interval=args.report_interval, find_duplicates=args.duplicates,
+                   duplicate_threshold=args.duplicate_threshold, thumbnails=args.contact_sheets,
+                   thumbnail_size=args.thumbnail_size,
+                   tag_manifest=args.tag_manifest and os.path.abspath(args.tag_manifest),
+                   output_folder=args.output and os.path.abspath(args.output))
+    if args.settle is not None:
+        options['settle_seconds'] = args.settle
+    if args.id_rules:
+        options['id_extractor'] = args.id_rules
+    if args.apply:
+        options.update(mode='apply', plan_path=os.path.abspath(args.apply))
+    elif args.plan_only:
+        options.update(mode='plan', plan_path=args.plan and os.path.abspath(args.plan))
+    if args.patch_size is not None:
+        options['patch_size'] = args.patch_size
+    processor = ImageProcessor(source, args.designers or 0, on_progress, on_complete, on_scan, **options)
+    if args.watch:
+        # Ctrl+C or a service stop ends watching cleanly, with the report written
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: processor.stop())
+    # Runs on this thread; the GUI starts it as a thread instead
+    processor.run()
+
+    if not completed:
+        output.emit('error', message='Split Image did not complete, see stderr for details')
+        return 1
+    output.emit('complete', total=completed['total_images'],
+                white_background=completed['white_background'],
+                non_white_background=completed['non_white_background'],
+                extensions=completed['extensions'],
+                designers={name: len(files) for name, files in completed['designer_files'].items()},
+                report=processor.report_path,
+                plan=processor.plan_path if args.plan_only else None,
+                phases={name: round(seconds, 3) for name, seconds in processor.phase_times.items()},
+                seconds=round(time.time() - start_time, 3))
+    return 0
+
+def run_undo(args) -> int:
+    source = os.path.abspath(args.source)
+    output = JsonLineWriter(take_stdout())
+
+    from plan_utils import undo_moves
+
+    start_time = time.time()
+    try:
+        restored, failed = undo_moves(source, args.undo_file and os.path.abspath(args.undo_file), args.movers)
+    except (OSError, ValueError) as e:
+        output.emit('error', message=str(e))
+        return 1
+    output.emit('complete', restored=restored, failed=failed, seconds=round(time.time() - start_time, 3))
+    return 0 if failed == 0 else 1
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='sg_one', description='SG One command line tools')
+    commands = parser.add_subparsers(dest='command', metavar='COMMAND')
+    commands.required = True
+
+    split = commands.add_parser('split', help='Distribute images to designer folders and classify backgrounds',
+                                description='Headless Split Image: scan SOURCE, move file groups into '
+                                            'Designer_N folders, tag backgrounds and write SplitImg_Report.xlsx')
+    split.add_argument('source', help='Folder of images to split')
+    split.add_argument('-d', '--designers', type=positive_int, default=None,
+                       help='Number of designer folders (required unless --apply is given)')
+    split.add_argument('-o', '--output', default=None, metavar='FOLDER',
+                       help='Where to create the designer folders (default: SOURCE); may be another volume')
+    split.add_argument('-w', '--workers', type=positive_int, default=None,
+                       help='Classification processes (default: CPU count)')
+    split.add_argument('--pipeline', action='store_true', help='Scan, move and classify concurrently')
+    split.add_argument('--scan-threads', type=positive_int, default=1,
+                       help='Threads reading directories, useful on network shares')
+    split.add_argument('--id-rules', default=None, metavar='FILE',
+                       help='JSON file of file ID rules used to group files (default: 13 leading digits, '
+                            'else the first 12 characters)')
+    split.add_argument('--balance', choices=BALANCE_MODES, default='count',
+                       help='Balance designers by file count, total bytes or estimated retouch effort')
+    split.add_argument('--capacities', default=None, metavar='W1,W2,...',
+                       help='Relative capacity of each designer, e.g. 1,1,0.5')
+    split.add_argument('--duplicates', action='store_true',
+                       help='Find near-duplicate images, keep each set with one designer and list the sets in the report')
+    split.add_argument('--duplicate-threshold', type=int, default=DEFAULT_DUPLICATE_THRESHOLD,
+                       choices=range(65), metavar='0-64',
+                       help=f'Differing hash bits (of 64) still counted as a duplicate (default: {DEFAULT_DUPLICATE_THRESHOLD})')
+    split.add_argument('--contact-sheets', action='store_true',
+                       help="Write thumbnail contact sheets to each designer's 'Contact Sheets' folder")
+    split.add_argument('--thumbnail-size', type=positive_int, default=160, metavar='PIXELS',
+                       help='Longest side of contact sheet thumbnails (default: 160)')
+    split.add_argument('--patch-size', type=positive_int, default=None,
+                       help='Corner patch size in pixels (default: 5)')
+    split.add_argument('--tolerance', type=int, default=0, choices=range(256), metavar='0-255',
+                       help='How far below 255 a corner pixel may be and still count as white')
+    split.add_argument('--tag-manifest', default=None, metavar='FILE',
+                       help='Outside macOS, record the background tags Finder labels would show in this CSV file')
+    split.add_argument('--no-cache', action='store_true', help='Do not use the classification cache')
+    split.add_argument('--cache-path', default=None, help='Classification cache database to use')
+    split.add_argument('--progress-interval', type=float, default=DEFAULT_PROGRESS_INTERVAL,
+                       help='Minimum seconds between progress lines')
+    split.add_argument('--watch', action='store_true',
+                       help='Keep running and distribute new files as they arrive, until interrupted')
+    split.add_argument('--poll', action='store_true',
+                       help='Watch by rescanning instead of inotify, e.g. for network shares')
+    split.add_argument('--settle', type=float, default=None, metavar='SECONDS',
+                       help='Quiet time before newly arrived files are distributed (default: 2)')
+    split.add_argument('--report-interval', type=float, default=30, metavar='SECONDS',
+                       help='Minimum time between report updates while watching')
+    split.add_argument('--no-resume', action='store_true',
+                       help='Start over instead of resuming an interrupted run on SOURCE')
+    split.add_argument('--plan-only', action='store_true',
+                       help='Dry run: classify and distribute, write a plan file and move nothing')
+    split.add_argument('--plan', default=None, metavar='FILE', help='Where --plan-only writes the plan '
+                       '(default: SOURCE/SplitImg_Plan.jsonl)')
+    split.add_argument('--apply', default=None, metavar='PLAN',
+                       help='Execute a plan written by --plan-only without classifying again')
+    split.add_argument('--movers', type=positive_int, default=1,
+                       help='Threads renaming files when applying a plan or in pipeline mode')
+    split.set_defaults(handler=run_split)
+
+    undo = commands.add_parser('undo', help='Move files back to where an applied plan found them')
+    undo.add_argument('source', help='Folder the plan was applied to')
+    undo.add_argument('--undo-file', default=None, metavar='FILE',
+                      help='Undo file written by --apply (default: SOURCE/SplitImg_Undo.jsonl)')
+    undo.add_argument('--movers', type=positive_int, default=1, help='Threads renaming files')
+    undo.set_defaults(handler=run_undo)
+    return parser
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.source):
+        parser.error(f"source folder not found: {args.source}")
+    if args.command == 'split':
+        if args.apply and args.plan_only:
+            parser.error("--apply and --plan-only cannot be combined")
+        if args.output and (args.apply or args.plan_only):
+            parser.error("--output cannot be combined with --apply or --plan-only")
+        if args.output and not os.path.isdir(args.output):
+            parser.error(f"output folder not found: {args.output}")
+        if args.duplicates and (args.apply or args.pipeline):
+            parser.error("--duplicates cannot be combined with --apply or --pipeline")
+        if args.watch and (args.apply or args.plan_only or args.pipeline):
+            parser.error("--watch cannot be combined with --apply, --plan-only or --pipeline")
+        if args.capacities is not None and args.apply:
+            parser.error("--capacities cannot be combined with --apply; the plan already assigns every file")
+        if args.designers is None and not args.apply:
+            parser.error("the following arguments are required: -d/--designers")
+        if args.id_rules:
+            from group_utils import load_id_rules
+            try:
+                args.id_rules = load_id_rules(args.id_rules)
+            except (OSError, ValueError) as e:
+                parser.error(f"--id-rules: {e}")
+        if args.capacities is not None:
+            try:
+                args.capacities = parse_capacities(args.capacities, args.designers)
+            except ValueError as e:
+                parser.error(f"--capacities: {e}")
+    return args.handler(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,132 @@
+import functools
+import lzma
+import os
+import threading
+import time
+import zlib
+from typing import Optional
+
+# Formats that are compressed already; deflating them again saves well under 1%
+STORED_EXTENSIONS = {
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic', '.heif', '.avif',
+    '.mp4', '.m4v', '.mov', '.mkv', '.webm', '.mp3', '.m4a', '.aac', '.ogg', '.flac',
+    '.zip', '.7z', '.rar', '.gz', '.tgz', '.bz2', '.xz', '.zst',
+    '.docx', '.xlsx', '.pptx',
+}
+
+# (offset, bytes) signatures of compressed formats, for files without a telling extension
+COMPRESSED_SIGNATURES = (
+    (0, b'\xff\xd8\xff'),  # JPEG
+    (0, b'\x89PNG\r\n\x1a\n'),  # PNG
+    (0, b'GIF8'),  # GIF
+    (8, b'WEBP'),  # WebP
+    (4, b'ftyp'),  # MP4, MOV, HEIC and AVIF
+    (4, b'moov'),  # Older QuickTime
+    (4, b'mdat'),
+    (0, b'\x1a\x45\xdf\xa3'),  # Matroska and WebM
+    (0, b'ID3'),  # MP3
+    (0, b'OggS'),
+    (0, b'fLaC'),
+    (0, b'PK\x03\x04'),  # ZIP and Office documents
+    (0, b'7z\xbc\xaf\x27\x1c'),
+    (0, b'Rar!\x1a\x07'),
+    (0, b'\x1f\x8b'),  # gzip
+    (0, b'BZh'),
+    (0, b'\xfd7zXZ\x00'),
+    (0, b'\x28\xb5\x2f\xfd'),  # Zstandard
+)
+
+# Bytes read from the start of other files to sniff and trial-compress
+TRIAL_SIZE = 64 * 1024
+
+# Files whose first bytes deflate by less than this fraction are stored
+MIN_TRIAL_SAVING = 0.03
+
+def has_compressed_signature(head: bytes) -> bool:
+    return any(head[offset:offset + len(signature)] == signature for offset, signature in COMPRESSED_SIGNATURES)
+
+def trial_saving(sample: bytes) -> float:
+    """
+    Fraction of the sample that deflate saves
+    """
+    if not sample:
+        return 0.0
+    return 1 - len(zlib.compress(sample)) / len(sample)
+
+# Incompressible bytes timed once to estimate the CPU that storing saves
+CALIBRATION_SIZE = 256 * 1024
+
+@functools.lru_cache(maxsize=None)
+def compress_seconds_per_byte(method: str = 'deflate') -> float:
+    """
+    CPU time 'deflate' or 'lzma' spends per byte of incompressible data on this machine
+    """
+    sample = os.urandom(CALIBRATION_SIZE)
+    started = time.process_time()
+    if method == 'lzma':
+        lzma.compress(sample)
+    else:
+        zlib.compress(sample)
+    return (time.process_time() - started) / len(sample)
+
+def format_bytes(size: float) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+class StorePolicy:
+    """
+    Decides per file whether compressing is worth the CPU: by extension, then by signature,
+    then by trial-compressing the first 64 KB. Counts what it stored for the log.
+    """
+    def __init__(self, trial_size: int = TRIAL_SIZE, min_saving: float = MIN_TRIAL_SAVING):
+        self.trial_size = trial_size
+        self.min_saving = min_saving
+        self.stored_files = 0
+        self.stored_bytes = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def stored_by_extension(path: str) -> bool:
+        return os.path.splitext(path)[1].lower() in STORED_EXTENSIONS
+
+    def reason_to_store(self, path: str, head: Optional[bytes] = None) -> Optional[str]:
+        """
+        Why the file should be stored without compression, or None to compress it. Pass the
+        first bytes of the file as head if they were read already, so it is not opened again
+        """
+        if self.stored_by_extension(path):
+            return 'extension'
+        if head is None:
+            try:
+                with open(path, 'rb') as f:
+                    head = f.read(self.trial_size)
+            except OSError:
+                # Compressing reports the error
+                return None
+        head = head[:self.trial_size]
+        if has_compressed_signature(head):
+            return 'signature'
+        if len(head) >= 1024 and trial_saving(head) < self.min_saving:
+            return 'trial'
+        return None
+
+    def should_store(self, path: str, size: int = 0, head: Optional[bytes] = None) -> bool:
+        if self.reason_to_store(path, head) is None:
+            return False
+        with self.lock:
+            self.stored_files += 1
+            self.stored_bytes += size
+        return True
+
+    def summary(self, method: str = 'deflate') -> str:
+        """
+        One line for the log, or '' when nothing was stored
+        """
+        if not self.stored_files:
+            return ''
+        saved = self.stored_bytes * compress_seconds_per_byte(method)
+        return (f"stored {self.stored_files} already-compressed files ({format_bytes(self.stored_bytes)}) "
+                f"as-is, saving about {saved:.1f}s of CPU")
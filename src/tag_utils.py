@@ -0,0 +1,115 @@
+import csv
+import shutil
+import subprocess
+import sys
+from typing import List, Optional, Tuple
+
+# Finder label indexes used by Split Image
+GREEN_LABEL = 6  # White background
+BLUE_LABEL = 4  # Non-white background
+
+LABEL_NAMES = {
+    0: 'None', 1: 'Orange', 2: 'Red', 3: 'Yellow',
+    4: 'Blue', 5: 'Purple', 6: 'Green', 7: 'Gray'
+}
+
+# Files tagged per osascript invocation; keeps argv well under ARG_MAX
+DEFAULT_BATCH_SIZE = 300
+
+# Every entry gets its own try so one missing file does not stop the rest of the batch
+FINDER_LABEL_SCRIPT = '''on run argv
+    tell application "Finder"
+        repeat with i from 1 to (count of argv) by 2
+            try
+                set label index of (POSIX file (item i of argv) as alias) to ((item (i + 1) of argv) as integer)
+            end try
+        end repeat
+    end tell
+end run
+'''
+
+class TagBackend:
+    """
+    Applies a batch of (path, label index) pairs
+    """
+    def apply(self, batch: List[Tuple[str, int]]):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class OsascriptTagBackend(TagBackend):
+    """
+    Sets Finder label indexes with one AppleScript run per batch instead of one per file
+    """
+    def apply(self, batch: List[Tuple[str, int]]):
+        argv = []
+        for path, label in batch:
+            argv.extend([path, str(label)])
+        result = subprocess.run(['osascript', '-'] + argv, input=FINDER_LABEL_SCRIPT,
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"Error applying tags: {result.stderr.strip()}")
+
+class ManifestTagBackend(TagBackend):
+    """
+    Records tags in a CSV manifest, for platforms without Finder labels
+    """
+    def __init__(self, manifest_path: str):
+        self.manifest_path = manifest_path
+        self._file = None
+        self._writer = None
+
+    def apply(self, batch: List[Tuple[str, int]]):
+        if self._file is None:
+            self._file = open(self.manifest_path, 'w', newline='', encoding='utf-8')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(['path', 'label_index', 'label'])
+        for path, label in batch:
+            self._writer.writerow([path, label, LABEL_NAMES.get(label, str(label))])
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def default_tag_backend(manifest_path: Optional[str] = None) -> Optional[TagBackend]:
+    """
+    Finder labels on macOS; elsewhere a tag manifest if a path was given, otherwise no tagging
+    """
+    if sys.platform == 'darwin' and shutil.which('osascript'):
+        return OsascriptTagBackend()
+    if manifest_path:
+        return ManifestTagBackend(manifest_path)
+    return None
+
+class BatchTagger:
+    """
+    Queues (path, label) pairs and hands them to a backend in batches
+    """
+    def __init__(self, backend: TagBackend, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.backend = backend
+        self.batch_size = max(1, batch_size)
+        self.tagged = 0
+        self._queue = []
+
+    def add(self, path: str, label: int):
+        self._queue.append((path, label))
+        if len(self._queue) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._queue:
+            return
+        batch, self._queue = self._queue, []
+        try:
+            self.backend.apply(batch)
+            self.tagged += len(batch)
+        except Exception as e:
+            print(f"Error applying tags: {str(e)}")
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.backend.close()
@@ -0,0 +1,123 @@
+import io
+import os
+import tempfile
+import threading
+from typing import Hashable, Iterable, List, Optional, Tuple
+from PIL import Image, ImageDraw, ImageFont
+
+# Longest side of a thumbnail in pixels
+THUMBNAIL_SIZE = 160
+
+# JPEG quality of stored thumbnails; about 5 KB each at the default size
+THUMBNAIL_QUALITY = 75
+
+# Contact sheets are written to this subfolder of each designer folder, which scans skip
+CONTACT_SHEET_FOLDER = 'Contact Sheets'
+
+# Thumbnails per contact sheet page
+SHEET_COLUMNS = 6
+SHEET_ROWS = 8
+
+# Space around each tile and the height of the caption under it
+TILE_PADDING = 8
+CAPTION_HEIGHT = 14
+
+# Tile borders, matching the Designer Files colours in the report
+WHITE_BACKGROUND_BORDER = (112, 173, 71)
+OTHER_BACKGROUND_BORDER = (68, 114, 196)
+
+class ThumbnailSpool:
+    """
+    Thumbnails appended to an anonymous temporary file, with only their offsets kept in memory
+    """
+    def __init__(self):
+        self.file = tempfile.TemporaryFile()
+        self.offsets = {}
+        self.lock = threading.Lock()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.offsets
+
+    def add(self, key: Hashable, data: Optional[bytes]):
+        if not data:
+            return
+        with self.lock:
+            self.file.seek(0, os.SEEK_END)
+            self.offsets[key] = (self.file.tell(), len(data))
+            self.file.write(data)
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        with self.lock:
+            location = self.offsets.get(key)
+            if location is None:
+                return None
+            self.file.seek(location[0])
+            return self.file.read(location[1])
+
+    def move(self, old_key: Hashable, new_key: Hashable):
+        """
+        File a thumbnail under a new key, e.g. once its image has been moved
+        """
+        with self.lock:
+            location = self.offsets.pop(old_key, None)
+            if location is not None:
+                self.offsets[new_key] = location
+
+    def close(self):
+        self.file.close()
+        self.offsets = {}
+
+def _fit_caption(draw: ImageDraw.ImageDraw, text: str, font, width: int) -> str:
+    if draw.textlength(text, font=font) <= width:
+        return text
+    while text and draw.textlength(text + '...', font=font) > width:
+        text = text[:-1]
+    return text + '...'
+
+def write_contact_sheets(folder: str, title: str, tiles: Iterable[Tuple[str, Optional[bytes], bool]],
+                         tile_size: int = THUMBNAIL_SIZE) -> List[str]:
+    """
+    Lay (caption, thumbnail, is_white) tiles out on numbered JPEG pages named after title,
+    replacing the pages written last time; returns the page paths
+    """
+    os.makedirs(folder, exist_ok=True)
+    prefix = f"{title}_Contact_"
+    for name in os.listdir(folder):
+        if name.startswith(prefix) and name.endswith('.jpg'):
+            os.unlink(os.path.join(folder, name))
+
+    font = ImageFont.load_default()
+    cell_width = tile_size + 2 * TILE_PADDING
+    cell_height = tile_size + CAPTION_HEIGHT + 2 * TILE_PADDING
+    pages = []
+    sheet = draw = None
+    slot = 0
+
+    def save_page():
+        path = os.path.join(folder, f"{prefix}{len(pages) + 1:03d}.jpg")
+        sheet.save(path, 'JPEG', quality=85)
+        pages.append(path)
+
+    for caption, thumbnail, is_white in tiles:
+        if sheet is None:
+            sheet = Image.new('RGB', (SHEET_COLUMNS * cell_width, SHEET_ROWS * cell_height), 'white')
+            draw = ImageDraw.Draw(sheet)
+            slot = 0
+        x = (slot % SHEET_COLUMNS) * cell_width + TILE_PADDING
+        y = (slot // SHEET_COLUMNS) * cell_height + TILE_PADDING
+        draw.rectangle((x - 2, y - 2, x + tile_size + 1, y + tile_size + 1),
+                       outline=WHITE_BACKGROUND_BORDER if is_white else OTHER_BACKGROUND_BORDER, width=2)
+        if thumbnail:
+            try:
+                with Image.open(io.BytesIO(thumbnail)) as img:
+                    sheet.paste(img, (x + (tile_size - img.width) // 2, y + (tile_size - img.height) // 2))
+            except Exception as e:
+                print(f"Error drawing thumbnail of {caption}: {e}")
+        draw.text((x, y + tile_size + 3), _fit_caption(draw, caption, font, tile_size), fill='black', font=font)
+        slot += 1
+        if slot == SHEET_COLUMNS * SHEET_ROWS:
+            save_page()
+            sheet = None
+    if sheet is not None:
+        save_page()
+    return pages
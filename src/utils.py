@@ -2,24 +2,49 @@ import os
 import py7zr
 import zipfile
 import pyzipper
-from typing import List, Tuple, Optional
+from contextlib import nullcontext
+from typing import Dict, List, Tuple, Optional
 from pathlib import Path
+from fanout_utils import SevenZipWriter, write_archives
+from job_utils import JobCancelled, JobControl, JobFile, remove_outputs
+from store_utils import StorePolicy
+from zip_utils import AesZipWriter, ParallelZipWriter
 
 def get_all_files(path: str) -> List[str]:
     """
     Get all files in a directory recursively, excluding system files
     """
+    return collect_files([path])[0]
+
+def collect_files(paths: List[str]) -> Tuple[List[str], List[str]]:
+    """
+    Walk the paths once and return the files to compress and the system files left out
+    """
     all_files = []
-    if os.path.isfile(path):
-        if not CompressionUtils.should_exclude_file(path):
-            all_files.append(path)
-    else:
-        for root, _, files in os.walk(path):
-            for file in files:
-                file_path = os.path.join(root, file)
-                if not CompressionUtils.should_exclude_file(file_path):
-                    all_files.append(file_path)
-    return all_files
+    excluded = []
+    for path in paths:
+        if os.path.isfile(path):
+            candidates = [path]
+        else:
+            candidates = (os.path.join(root, file) for root, _, files in os.walk(path) for file in files)
+        for file_path in candidates:
+            if CompressionUtils.should_exclude_file(file_path):
+                excluded.append(file_path)
+            else:
+                all_files.append(file_path)
+    return all_files, excluded
+
+def total_size(files: List[str]) -> int:
+    """
+    Bytes in the files that still exist
+    """
+    total = 0
+    for file_path in files:
+        try:
+            total += os.path.getsize(file_path)
+        except OSError:
+            pass
+    return total
 
 class CompressionUtils:
     @staticmethod
@@ -35,88 +60,164 @@ class CompressionUtils:
         return os.path.basename(filename) in excluded_files
 
     @staticmethod
-    def compress_to_zip(paths: List[str], output_path: str, password: Optional[str] = None) -> Tuple[bool, str]:
+    def success_message(policy: Optional[StorePolicy], method: str) -> str:
+        summary = policy.summary(method) if policy else ''
+        return f"Compression successful ({summary})" if summary else "Compression successful"
+
+    @staticmethod
+    def compress_to_formats(paths: List[str], outputs: Dict[str, str], password: Optional[str] = None,
+                            workers: Optional[int] = None, store_compressed: bool = True,
+                            files: Optional[List[str]] = None,
+                            control: Optional[JobControl] = None) -> Dict[str, Tuple[bool, str]]:
         """
-        Compress files and folders to ZIP format with optional encryption
+        Compress files and folders to several formats at once, e.g. {'zip': path, '7z': path}.
+        The tree is walked once (not at all if `files` is given) and each file is read once,
+        with the same blocks fed to every archive while they compress concurrently.
+        Unencrypted ZIPs are deflated on `workers` threads (default: CPU count).
+        With store_compressed, JPEGs, videos, archives and the like are stored as-is.
+        With a control, progress is reported per block read; when it is cancelled the
+        partial archives are deleted and JobCancelled is raised.
         """
+        results = {}
         try:
-            # Get all files to compress
-            all_files = []
-            for path in paths:
-                all_files.extend(get_all_files(path))
-            
-            if password:
-                with pyzipper.AESZipFile(output_path,
-                                       'w',
-                                       compression=pyzipper.ZIP_LZMA,
-                                       encryption=pyzipper.WZ_AES) as zf:
-                    zf.setpassword(password.encode())
-                    for file in all_files:
-                        # Calculate relative path for the archive
-                        rel_path = os.path.relpath(file, os.path.dirname(paths[0]))
-                        zf.write(file, rel_path)
-            else:
-                with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zf:
-                    for file in all_files:
-                        # Calculate relative path for the archive
-                        rel_path = os.path.relpath(file, os.path.dirname(paths[0]))
-                        zf.write(file, rel_path)
-            return True, "Compression successful"
+            all_files = files if files is not None else collect_files(paths)[0]
+            # Calculate relative paths for the archive
+            members = [(file, os.path.relpath(file, os.path.dirname(paths[0]))) for file in all_files]
         except Exception as e:
-            return False, f"Compression failed: {str(e)}"
+            return {kind: (False, f"Compression failed: {str(e)}") for kind in outputs}
+        policy = StorePolicy() if store_compressed else None
+
+        writers = {}
+        for kind, output_path in outputs.items():
+            try:
+                if kind == '7z':
+                    writers[kind] = SevenZipWriter(output_path, password)
+                elif password:
+                    writers[kind] = AesZipWriter(output_path, password)
+                else:
+                    writers[kind] = ParallelZipWriter(output_path, workers)
+            except Exception as e:
+                results[kind] = (False, f"Compression failed: {str(e)}")
+
+        errors = write_archives(members, writers, policy, control)
+        if any(isinstance(error, JobCancelled) for error in errors.values()):
+            remove_outputs(outputs.values())
+            raise JobCancelled("Compression cancelled")
+        for kind, error in errors.items():
+            if error is None:
+                method = 'deflate' if kind == 'zip' and not password else 'lzma'
+                results[kind] = (True, CompressionUtils.success_message(policy, method))
+            else:
+                results[kind] = (False, f"Compression failed: {str(error)}")
+        return {kind: results[kind] for kind in outputs}
 
     @staticmethod
-    def compress_to_7z(paths: List[str], output_path: str, password: Optional[str] = None) -> Tuple[bool, str]:
+    def compress_to_zip(paths: List[str], output_path: str, password: Optional[str] = None,
+                        workers: Optional[int] = None, store_compressed: bool = True) -> Tuple[bool, str]:
         """
-        Compress files and folders to 7Z format with optional encryption
+        Compress files and folders to ZIP format with optional encryption
         """
-        try:
-            # Get all files to compress
-            all_files = []
-            for path in paths:
-                all_files.extend(get_all_files(path))
-            
-            with py7zr.SevenZipFile(output_path, 'w', password=password) as sz:
-                for file in all_files:
-                    # Calculate relative path for the archive
-                    rel_path = os.path.relpath(file, os.path.dirname(paths[0]))
-                    sz.write(file, rel_path)
-            return True, "Compression successful"
-        except Exception as e:
-            return False, f"Compression failed: {str(e)}"
+        return CompressionUtils.compress_to_formats(paths, {'zip': output_path}, password, workers,
+                                                    store_compressed)['zip']
+
+    @staticmethod
+    def compress_to_7z(paths: List[str], output_path: str, password: Optional[str] = None,
+                       store_compressed: bool = True) -> Tuple[bool, str]:
+        """
+        Compress files and folders to 7Z format with optional encryption.
+        With store_compressed, already-compressed files go to folders of the archive that are
+        only copied (and encrypted), since 7z picks filters per folder.
+        """
+        return CompressionUtils.compress_to_formats(paths, {'7z': output_path}, password,
+                                                    store_compressed=store_compressed)['7z']
 
 class ExtractionUtils:
     @staticmethod
-    def extract_zip(archive_path: str, extract_path: str, password: Optional[str] = None) -> Tuple[bool, str]:
+    def archive_source(archive_path: str, control: Optional[JobControl]):
+        """
+        The archive as a path, or opened so that reading it checks for cancellation
         """
-        Extract ZIP archive with optional password
+        return JobFile(archive_path, control) if control is not None else nullcontext(archive_path)
+
+    @staticmethod
+    def new_outputs(extract_path: str, names: List[str]) -> Tuple[List[str], List[str]]:
         """
+        Files and folders that extracting names would create, leaving out what already exists
+        """
+        root = os.path.realpath(extract_path)
+        files = []
+        folders = set()
+        for name in names:
+            target = os.path.realpath(os.path.join(root, name))
+            if not target.startswith(root + os.sep):
+                continue
+            if name.endswith('/'):
+                folder = target
+            else:
+                if not os.path.lexists(target):
+                    files.append(target)
+                folder = os.path.dirname(target)
+            while folder.startswith(root + os.sep) and not os.path.exists(folder):
+                folders.add(folder)
+                folder = os.path.dirname(folder)
+        return files, sorted(folders)
+
+    @staticmethod
+    def extract_zip(archive_path: str, extract_path: str, password: Optional[str] = None,
+                    control: Optional[JobControl] = None) -> Tuple[bool, str]:
+        """
+        Extract ZIP archive with optional password.
+        With a control, progress is the archive bytes read; when it is cancelled the files
+        extracted so far are deleted and JobCancelled is raised.
+        """
+        outputs = ([], [])
         try:
+            if control is not None:
+                control.expect(os.path.getsize(archive_path))
+                with zipfile.ZipFile(archive_path, 'r') as zf:
+                    outputs = ExtractionUtils.new_outputs(extract_path, zf.namelist())
             try:
                 # Try with pyzipper first (for encrypted files)
-                with pyzipper.AESZipFile(archive_path, 'r') as zf:
+                with ExtractionUtils.archive_source(archive_path, control) as source, \
+                        pyzipper.AESZipFile(source, 'r') as zf:
                     if password:
                         zf.setpassword(password.encode())
                     zf.extractall(extract_path)
+            except JobCancelled:
+                raise
             except:
                 # Fall back to regular zipfile for non-encrypted files
-                with zipfile.ZipFile(archive_path, 'r') as zf:
+                with ExtractionUtils.archive_source(archive_path, control) as source, \
+                        zipfile.ZipFile(source, 'r') as zf:
                     if password:
                         zf.setpassword(password.encode())
                     zf.extractall(extract_path)
             return True, "Extraction successful"
+        except JobCancelled:
+            remove_outputs(*outputs)
+            raise
         except Exception as e:
             return False, f"Extraction failed: {str(e)}"
 
     @staticmethod
-    def extract_7z(archive_path: str, extract_path: str, password: Optional[str] = None) -> Tuple[bool, str]:
+    def extract_7z(archive_path: str, extract_path: str, password: Optional[str] = None,
+                   control: Optional[JobControl] = None) -> Tuple[bool, str]:
         """
-        Extract 7Z archive with optional password
+        Extract 7Z archive with optional password, cancellable like extract_zip
         """
+        outputs = ([], [])
         try:
-            with py7zr.SevenZipFile(archive_path, 'r', password=password) as sz:
+            if control is not None:
+                control.expect(os.path.getsize(archive_path))
+                with py7zr.SevenZipFile(archive_path, 'r', password=password) as sz:
+                    outputs = ExtractionUtils.new_outputs(extract_path, sz.getnames())
+            with ExtractionUtils.archive_source(archive_path, control) as source, \
+                    py7zr.SevenZipFile(source, 'r', password=password) as sz:
                 sz.extractall(extract_path)
             return True, "Extraction successful"
+        except JobCancelled:
+            remove_outputs(*outputs)
+            raise
         except Exception as e:
             return False, f"Extraction failed: {str(e)}"
 
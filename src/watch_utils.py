@@ -0,0 +1,205 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from typing import Iterable, List, Optional
+from scan_utils import FileScanner
+
+# Seconds without new arrivals before a batch is handed over, so a group copied in together is split together
+DEFAULT_SETTLE_SECONDS = 2.0
+
+# Seconds between directory scans when inotify is not available
+DEFAULT_POLL_INTERVAL = 2.0
+
+# inotify constants from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+INOTIFY_EVENT = struct.Struct('iIII')
+
+class FolderWatcher:
+    """
+    Reports image files that have finished arriving in a folder tree
+    """
+    def __init__(self, root: str, extensions: Iterable[str], exclude_dirs: Iterable[str] = ()):
+        self.root = root
+        self.extensions = {ext.lower() for ext in extensions}
+        self.exclude_dirs = list(exclude_dirs)
+        self.exclude_paths = {os.path.normcase(os.path.join(root, name)) for name in self.exclude_dirs}
+
+    def wanted(self, path: str) -> bool:
+        return os.path.splitext(path)[1].lower() in self.extensions
+
+    def scan(self, folder: Optional[str] = None) -> List[str]:
+        folder = folder or self.root
+        excluded = [os.path.relpath(path, folder) for path in self.exclude_paths]
+        return [entry.path for entry in FileScanner(folder, self.extensions, excluded, with_sizes=False).scan()]
+
+    def changes(self, timeout: float) -> List[str]:
+        """
+        Wait up to timeout seconds and return the files that became ready
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class PollingWatcher(FolderWatcher):
+    """
+    Rescans the tree every poll interval; a file is ready once its size and mtime hold still for a poll
+    """
+    def __init__(self, root: str, extensions: Iterable[str], exclude_dirs: Iterable[str] = (),
+                 poll_interval: float = DEFAULT_POLL_INTERVAL):
+        super().__init__(root, extensions, exclude_dirs)
+        self.poll_interval = poll_interval
+        self.last_poll = 0.0
+        self.seen = {}
+        self.reported = set()
+
+    def changes(self, timeout: float) -> List[str]:
+        wait = self.last_poll + self.poll_interval - time.monotonic()
+        if wait > timeout:
+            time.sleep(max(0.0, timeout))
+            return []
+        time.sleep(max(0.0, wait))
+        self.last_poll = time.monotonic()
+
+        ready = []
+        current = {}
+        for path in self.scan():
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            current[path] = (st.st_size, st.st_mtime_ns)
+            if path not in self.reported and self.seen.get(path) == current[path]:
+                ready.append(path)
+                self.reported.add(path)
+        # Files that left the tree (processed, or removed) can be reported again if they come back
+        self.reported.intersection_update(current)
+        self.seen = current
+        return ready
+
+class InotifyWatcher(FolderWatcher):
+    """
+    Linux inotify watches on every folder in the tree; a file is ready when it is closed after
+    writing or moved in. Falls back to a full scan if the event queue overflows
+    """
+    def __init__(self, root: str, extensions: Iterable[str], exclude_dirs: Iterable[str] = ()):
+        super().__init__(root, extensions, exclude_dirs)
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.watches = {}
+        self.pending = []
+        self.add_tree(root)
+
+    def add_tree(self, folder: str):
+        """
+        Watch folder and everything below it; files already inside are queued as ready
+        """
+        stack = [folder]
+        while stack:
+            path = stack.pop()
+            if os.path.normcase(path) in self.exclude_paths:
+                continue
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+            if wd < 0:
+                print(f"Error watching {path}: {os.strerror(ctypes.get_errno())}")
+                continue
+            self.watches[wd] = path
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif folder != self.root and entry.is_file() and self.wanted(entry.name):
+                            self.pending.append(entry.path)
+            except OSError as e:
+                print(f"Error scanning {path}: {str(e)}")
+
+    def changes(self, timeout: float) -> List[str]:
+        if not self.pending:
+            readable, _, _ = select.select([self.fd], [], [], max(0.0, timeout))
+            if readable:
+                self.read_events()
+        ready, self.pending = self.pending, []
+        return ready
+
+    def read_events(self):
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = data[offset:offset + name_length].rstrip(b'\0')
+            offset += name_length
+
+            if mask & IN_Q_OVERFLOW:
+                print("Watch event queue overflowed, rescanning")
+                self.pending.extend(self.scan())
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            folder = self.watches.get(wd)
+            if folder is None or not name:
+                continue
+            path = os.path.join(folder, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self.add_tree(path)
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and self.wanted(path):
+                self.pending.append(path)
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+def create_watcher(root: str, extensions: Iterable[str], exclude_dirs: Iterable[str] = (),
+                   polling: bool = False, poll_interval: float = DEFAULT_POLL_INTERVAL) -> FolderWatcher:
+    """
+    inotify on Linux, polling elsewhere or when asked for (inotify misses changes made by other
+    machines on network shares)
+    """
+    if not polling and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(root, extensions, exclude_dirs)
+        except (OSError, AttributeError) as e:
+            print(f"inotify unavailable, polling instead: {str(e)}")
+    return PollingWatcher(root, extensions, exclude_dirs, poll_interval)
+
+def wait_for_batch(watcher: FolderWatcher, stop_event, settle_seconds: float = DEFAULT_SETTLE_SECONDS,
+                   max_wait: float = 60.0, timeout: float = 1.0) -> List[str]:
+    """
+    Collect ready files until none have arrived for settle_seconds, at most max_wait after the
+    first one. Returns an empty list if nothing arrived within timeout or stop_event was set
+    """
+    batch = watcher.changes(timeout)
+    if not batch:
+        return []
+    first = last = time.monotonic()
+    while not stop_event.is_set():
+        now = time.monotonic()
+        if now - last >= settle_seconds or now - first >= max_wait:
+            break
+        arrived = watcher.changes(min(settle_seconds - (now - last), 0.5))
+        if arrived:
+            batch.extend(arrived)
+            last = time.monotonic()
+    return list(dict.fromkeys(batch))
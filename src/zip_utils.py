@@ -0,0 +1,250 @@
+import os
+import struct
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional, Tuple
+import pyzipper
+
+# Bytes read per block; larger files are split into blocks compressed in parallel
+BLOCK_SIZE = 1024 * 1024
+
+# Each block is primed with the end of the one before it, so splitting a file costs almost no ratio
+DICTIONARY_SIZE = 32 * 1024
+
+# Blocks in flight per worker; bounds memory to a few MB per worker whatever the file sizes
+BLOCKS_PER_WORKER = 4
+
+# Record layouts from the ZIP application note (APPNOTE.TXT), sections 4.3.7 to 4.3.16
+LOCAL_HEADER = '<4sHHHHHLLLHH'
+CENTRAL_HEADER = '<4sHHHHHHLLLHHHHHLL'
+END_RECORD = '<4sHHHHLLH'
+ZIP64_END_RECORD = '<4sQHHLLQQQQ'
+ZIP64_END_LOCATOR = '<4sLQL'
+ZIP64_END_RECORD_SIZE = struct.calcsize(ZIP64_END_RECORD) - 12
+ZIP64_EXTRA = 0x0001
+ZIP32_MAX = 0xFFFFFFFF
+ZIP_MAX_ENTRIES = 0xFFFF
+ZIP_VERSION = 20
+ZIP64_VERSION = 45
+UTF8_FLAG = 0x800
+UNIX_SYSTEM = 3
+
+def read_blocks(path: str, block_size: int = BLOCK_SIZE) -> Iterator[Tuple[bytes, bool]]:
+    """
+    Yield (data, is_last) blocks of a file; an empty file yields one empty last block
+    """
+    with open(path, 'rb') as f:
+        data = f.read(block_size)
+        while True:
+            following = f.read(block_size) if len(data) == block_size else b''
+            yield data, not following
+            if not following:
+                return
+            data = following
+
+def deflate_block(data: bytes, dictionary: bytes, last: bool, level: int = zlib.Z_DEFAULT_COMPRESSION) -> bytes:
+    """
+    Raw-deflate one block of a file, primed with the bytes before it.
+
+    Blocks end on a sync flush, and only the last one of a file finishes the stream, so the
+    compressed blocks of a file concatenate into one valid deflate stream.
+    """
+    if dictionary:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=dictionary)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+def dos_date_time(zinfo: zipfile.ZipInfo) -> Tuple[int, int]:
+    year, month, day, hour, minute, second = zinfo.date_time
+    return (year - 1980) << 9 | month << 5 | day, hour << 11 | minute << 5 | second // 2
+
+def encoded_name(zinfo: zipfile.ZipInfo) -> Tuple[bytes, int]:
+    """
+    File name bytes and the flag bits that go with them; non-ASCII names are stored as UTF-8
+    """
+    try:
+        return zinfo.filename.encode('ascii'), 0
+    except UnicodeEncodeError:
+        return zinfo.filename.encode('utf-8'), UTF8_FLAG
+
+def local_header(zinfo: zipfile.ZipInfo, zip64: bool) -> bytes:
+    """
+    Local file header; ZIP64 members carry their sizes in an extra field so the header keeps its
+    length when it is rewritten
+    """
+    name, flags = encoded_name(zinfo)
+    date, time = dos_date_time(zinfo)
+    if zip64:
+        extra = struct.pack('<HHQQ', ZIP64_EXTRA, 16, zinfo.file_size, zinfo.compress_size)
+        file_size = compress_size = ZIP32_MAX
+    else:
+        extra = b''
+        file_size, compress_size = zinfo.file_size, zinfo.compress_size
+    return struct.pack(LOCAL_HEADER, b'PK\x03\x04', ZIP64_VERSION if zip64 else ZIP_VERSION, flags,
+                       zinfo.compress_type, time, date, zinfo.CRC, compress_size, file_size,
+                       len(name), len(extra)) + name + extra
+
+def central_header(zinfo: zipfile.ZipInfo, zip64: bool) -> bytes:
+    """
+    Central directory entry; sizes and offsets past 4 GB move into a ZIP64 extra field
+    """
+    name, flags = encoded_name(zinfo)
+    date, time = dos_date_time(zinfo)
+    values = []
+    file_size, compress_size, offset = zinfo.file_size, zinfo.compress_size, zinfo.header_offset
+    if zip64 or file_size > ZIP32_MAX:
+        values.append(file_size)
+        file_size = ZIP32_MAX
+    if zip64 or compress_size > ZIP32_MAX:
+        values.append(compress_size)
+        compress_size = ZIP32_MAX
+    if offset > ZIP32_MAX:
+        values.append(offset)
+        offset = ZIP32_MAX
+    extra = struct.pack(f'<HH{len(values)}Q', ZIP64_EXTRA, 8 * len(values), *values) if values else b''
+    version = ZIP64_VERSION if values else ZIP_VERSION
+    return struct.pack(CENTRAL_HEADER, b'PK\x01\x02', version | UNIX_SYSTEM << 8, version, flags,
+                       zinfo.compress_type, time, date, zinfo.CRC, compress_size, file_size, len(name),
+                       len(extra), 0, 0, 0, zinfo.external_attr, offset) + name + extra
+
+class ParallelZipWriter:
+    """
+    Standard deflated ZIP written from blocks fed in archive order. Blocks are compressed on a
+    thread pool (zlib releases the GIL) and written in order.
+
+    Local headers are written as placeholders and rewritten once a member's CRC and sizes
+    are known, then the central directory is written on close, with ZIP64 records where needed.
+    """
+    def __init__(self, output_path: str, workers: Optional[int] = None, level: int = zlib.Z_DEFAULT_COMPRESSION):
+        self.workers = workers or os.cpu_count() or 1
+        self.level = level
+        self.fp = open(output_path, 'wb')
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.pending = deque()
+        self.members = []
+        # End of the last finished member, where the central directory goes
+        self.end = 0
+        self.zinfo = None
+        self.previous = None
+        self.zip64 = False
+
+    def begin(self, path: str, arcname: str, stored: bool = False):
+        """
+        Start the next member; stored members are written without compression
+        """
+        zinfo = zipfile.ZipInfo.from_file(path, arcname)
+        zinfo.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+        self.zinfo = zinfo
+        self.previous = None
+
+    def feed(self, data: bytes, last: bool):
+        first = self.previous is None
+        if self.zinfo.compress_type == zipfile.ZIP_STORED:
+            future = None
+        else:
+            dictionary = b'' if first else self.previous[-DICTIONARY_SIZE:]
+            future = self.executor.submit(deflate_block, data, dictionary, last, self.level)
+        self.pending.append((self.zinfo, data, future, first, last))
+        self.previous = data
+        while len(self.pending) > self.workers * BLOCKS_PER_WORKER:
+            self._write_next()
+
+    def _write_next(self):
+        zinfo, data, future, first, last = self.pending.popleft()
+        compressed = data if future is None else future.result()
+        fp = self.fp
+        if first:
+            planned_size = zinfo.file_size
+            zinfo.CRC = zinfo.compress_size = zinfo.file_size = 0
+            if not zinfo.external_attr:
+                zinfo.external_attr = 0o600 << 16
+            # Compressed size can be larger than uncompressed size
+            self.zip64 = planned_size * 1.05 > zipfile.ZIP64_LIMIT
+            zinfo.header_offset = fp.tell()
+            fp.write(local_header(zinfo, self.zip64))
+        zinfo.CRC = zlib.crc32(data, zinfo.CRC)
+        zinfo.file_size += len(data)
+        zinfo.compress_size += len(compressed)
+        fp.write(compressed)
+
+        if last:
+            if not self.zip64 and max(zinfo.file_size, zinfo.compress_size) > zipfile.ZIP64_LIMIT:
+                raise RuntimeError(f"{zinfo.filename} grew past 4 GB while it was being compressed")
+            self.end = fp.tell()
+            fp.seek(zinfo.header_offset)
+            fp.write(local_header(zinfo, self.zip64))
+            fp.seek(self.end)
+            self.members.append((zinfo, self.zip64))
+
+    def _write_central_directory(self):
+        fp = self.fp
+        start = fp.tell()
+        for zinfo, zip64 in self.members:
+            fp.write(central_header(zinfo, zip64))
+        end = fp.tell()
+        count = len(self.members)
+        size = end - start
+        if count > ZIP_MAX_ENTRIES or size > zipfile.ZIP64_LIMIT or start > zipfile.ZIP64_LIMIT:
+            fp.write(struct.pack(ZIP64_END_RECORD, b'PK\x06\x06', ZIP64_END_RECORD_SIZE, ZIP64_VERSION,
+                                 ZIP64_VERSION, 0, 0, count, count, size, start))
+            fp.write(struct.pack(ZIP64_END_LOCATOR, b'PK\x06\x07', 0, end, 1))
+        fp.write(struct.pack(END_RECORD, b'PK\x05\x06', 0, 0, min(count, ZIP_MAX_ENTRIES),
+                             min(count, ZIP_MAX_ENTRIES), min(size, ZIP32_MAX), min(start, ZIP32_MAX), 0))
+
+    def close(self):
+        try:
+            while self.pending:
+                self._write_next()
+            self._write_central_directory()
+        finally:
+            self.executor.shutdown()
+            self.fp.close()
+
+    def abort(self):
+        """
+        Stop without writing queued blocks; the members finished so far stay readable
+        """
+        self.pending.clear()
+        self.executor.shutdown()
+        try:
+            # Drop the part of a member that was being written
+            self.fp.seek(self.end)
+            self.fp.truncate()
+            self._write_central_directory()
+        finally:
+            self.fp.close()
+
+class AesZipWriter:
+    """
+    AES-encrypted ZIP fed the same way as ParallelZipWriter; pyzipper compresses with LZMA
+    on the calling thread
+    """
+    def __init__(self, output_path: str, password: str):
+        self.zf = pyzipper.AESZipFile(output_path, 'w', compression=pyzipper.ZIP_LZMA, encryption=pyzipper.WZ_AES)
+        self.zf.setpassword(password.encode())
+        self.member = None
+
+    def begin(self, path: str, arcname: str, stored: bool = False):
+        zinfo = self.zf.zipinfo_cls.from_file(path, arcname)
+        zinfo.compress_type = pyzipper.ZIP_STORED if stored else pyzipper.ZIP_LZMA
+        self.member = self.zf.open(zinfo, 'w')
+
+    def feed(self, data: bytes, last: bool):
+        self.member.write(data)
+        if last:
+            self.member.close()
+            self.member = None
+
+    def close(self):
+        self.zf.close()
+
+    def abort(self):
+        try:
+            if self.member is not None:
+                self.member.close()
+        finally:
+            self.member = None
+            self.zf.close()
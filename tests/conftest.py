@@ -0,0 +1,69 @@
+import os
+import random
+import sys
+
+import pytest
+from PIL import Image
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.insert(0, SRC)
+
+import cache_utils
+import journal_utils
+from image_processor import ImageProcessor
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    """
+    Keep classification caches and run journals out of the real per-user cache directory
+    """
+    path = str(tmp_path / 'cache')
+    monkeypatch.setattr(cache_utils, 'default_cache_dir', lambda: path)
+    monkeypatch.setattr(journal_utils, 'default_cache_dir', lambda: path)
+    return path
+
+@pytest.fixture
+def source(tmp_path):
+    folder = tmp_path / 'source'
+    folder.mkdir()
+    return str(folder)
+
+def write_image(path, seed, white=False, size=(96, 96), quality=90):
+    """
+    Save a noise image, on a white border when white is set; the same seed gives the same picture
+    """
+    rng = random.Random(seed)
+    image = Image.new('RGB', size, (255, 255, 255) if white else (40, 60, 80))
+    pixels = image.load()
+    margin = 16 if white else 0
+    for y in range(margin, size[1] - margin, 8):
+        for x in range(margin, size[0] - margin, 8):
+            colour = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+            for dy in range(8):
+                for dx in range(8):
+                    pixels[x + dx, y + dy] = colour
+    image.save(path, quality=quality) if path.endswith('.jpg') else image.save(path)
+    return path
+
+@pytest.fixture
+def split():
+    """
+    Run ImageProcessor on the calling thread; returns the processor and its final stats, or
+    None when the run did not complete
+    """
+    def run(source_folder, num_designers=2, **options):
+        completed = []
+        options.setdefault('use_cache', False)
+        options.setdefault('max_workers', 2)
+        processor = ImageProcessor(source_folder, num_designers, lambda *args: None, completed.append,
+                                   lambda *args: None, **options)
+        processor.run()
+        return processor, completed[0] if completed else None
+    return run
+
+def designer_contents(folder):
+    """
+    Designer folder name -> sorted file names in it
+    """
+    return {name: sorted(os.listdir(os.path.join(folder, name))) for name in sorted(os.listdir(folder))
+            if name.startswith('Designer_')}
@@ -0,0 +1,109 @@
+import os
+import random
+import zipfile
+
+import py7zr
+import pytest
+
+import zip_utils
+from utils import CompressionUtils, ExtractionUtils
+from zip_utils import ParallelZipWriter, read_blocks
+
+from .conftest import write_image
+
+@pytest.fixture
+def tree(tmp_path):
+    """
+    A folder with an empty file, a text file spanning several blocks, a JPEG and a non-ASCII name
+    """
+    folder = tmp_path / 'shoot'
+    (folder / 'nested').mkdir(parents=True)
+    (folder / 'empty.txt').write_bytes(b'')
+    rng = random.Random(7)
+    words = [''.join(rng.choice('abcdefgh') for _ in range(6)) for _ in range(500)]
+    (folder / 'nested' / 'notes.txt').write_text(' '.join(rng.choice(words) for _ in range(600000)))
+    write_image(str(folder / 'front.jpg'), seed=3)
+    (folder / 'nested' / 'café.txt').write_text('crème brûlée')
+    # Dated in the past, so archives that stamp the current time instead are caught
+    for root, _, files in os.walk(str(folder)):
+        for file in files:
+            os.utime(os.path.join(root, file), (1700000000, 1700000000))
+    return str(folder)
+
+def tree_contents(folder):
+    """
+    Path relative to the folder's parent -> file bytes
+    """
+    contents = {}
+    for root, _, files in os.walk(folder):
+        for file in files:
+            path = os.path.join(root, file)
+            with open(path, 'rb') as f:
+                contents[os.path.relpath(path, os.path.dirname(folder)).replace(os.sep, '/')] = f.read()
+    return contents
+
+def zip_contents(archive_path):
+    with zipfile.ZipFile(archive_path) as zf:
+        assert zf.testzip() is None
+        return {name: zf.read(name) for name in zf.namelist()}
+
+def test_zip_round_trip(tree, tmp_path):
+    archive_path = str(tmp_path / 'shoot.zip')
+    ok, message = CompressionUtils.compress_to_zip([tree], archive_path, workers=3)
+    assert ok, message
+    assert os.path.getsize(os.path.join(tree, 'nested', 'notes.txt')) > 2 * zip_utils.BLOCK_SIZE
+    assert zip_contents(archive_path) == tree_contents(tree)
+    with zipfile.ZipFile(archive_path) as zf:
+        assert zf.getinfo('shoot/front.jpg').compress_type == zipfile.ZIP_STORED
+        assert zf.getinfo('shoot/nested/notes.txt').compress_type == zipfile.ZIP_DEFLATED
+
+    extract_path = str(tmp_path / 'extracted')
+    ok, message = ExtractionUtils.extract_zip(archive_path, extract_path)
+    assert ok, message
+    assert tree_contents(os.path.join(extract_path, 'shoot')) == tree_contents(tree)
+
+def test_zip64_records_round_trip(tree, tmp_path, monkeypatch):
+    # Every member and the central directory take the ZIP64 path without writing 4 GB; an empty
+    # file would still be planned as a plain member
+    os.remove(os.path.join(tree, 'empty.txt'))
+    monkeypatch.setattr(zipfile, 'ZIP64_LIMIT', 1)
+    archive_path = str(tmp_path / 'shoot.zip')
+    ok, message = CompressionUtils.compress_to_zip([tree], archive_path)
+    assert ok, message
+    monkeypatch.undo()
+    assert zip_contents(archive_path) == tree_contents(tree)
+
+def test_aborted_zip_keeps_finished_members(tree, tmp_path, monkeypatch):
+    # Blocks are written as soon as they are fed, so the second member is cut off part way
+    monkeypatch.setattr(zip_utils, 'BLOCKS_PER_WORKER', 0)
+    archive_path = str(tmp_path / 'shoot.zip')
+    writer = ParallelZipWriter(archive_path, workers=1)
+    first = os.path.join(tree, 'front.jpg')
+    writer.begin(first, 'front.jpg')
+    for data, last in read_blocks(first):
+        writer.feed(data, last)
+    second = os.path.join(tree, 'nested', 'notes.txt')
+    writer.begin(second, 'notes.txt')
+    writer.feed(next(read_blocks(second))[0], False)
+    writer.abort()
+
+    with open(first, 'rb') as f:
+        assert zip_contents(archive_path) == {'front.jpg': f.read()}
+
+@pytest.mark.parametrize('password', [None, 'secret'])
+def test_7z_round_trip(tree, tmp_path, password):
+    archive_path = str(tmp_path / 'shoot.7z')
+    ok, message = CompressionUtils.compress_to_7z([tree], archive_path, password)
+    assert ok, message
+    with py7zr.SevenZipFile(archive_path, 'r', password=password) as sz:
+        assert sz.testzip() is None
+        # The JPEG is only copied, the text files are compressed, each in its own folder
+        assert sz.archiveinfo().blocks >= 2
+        # Members keep their own modification time, not the time they were archived
+        notes = [info for info in sz.list() if info.filename == 'shoot/nested/notes.txt'][0]
+        assert abs(notes.creationtime.timestamp() - os.path.getmtime(os.path.join(tree, 'nested', 'notes.txt'))) < 2
+
+    extract_path = str(tmp_path / 'extracted')
+    ok, message = ExtractionUtils.extract_7z(archive_path, extract_path, password)
+    assert ok, message
+    assert tree_contents(os.path.join(extract_path, 'shoot')) == tree_contents(tree)
@@ -0,0 +1,25 @@
+import os
+
+from journal_utils import default_journal_path
+
+from .conftest import designer_contents, write_image
+
+def test_unreadable_file_does_not_abort_duplicate_detection(source, split):
+    write_image(os.path.join(source, '1000000000001_front.jpg'), seed=1, quality=95)
+    write_image(os.path.join(source, '1000000000002_front.jpg'), seed=1, quality=80)
+    # Enough other groups that the duplicate set fits under the per-designer cap
+    for number in range(3, 11):
+        write_image(os.path.join(source, f'10000000000{number:02d}_front.jpg'), seed=number)
+    with open(os.path.join(source, '1000000000099_front.jpg'), 'wb') as f:
+        f.write(b'not an image')
+
+    processor, stats = split(source, 2, find_duplicates=True)
+
+    assert stats is not None
+    assert stats['total_images'] == 11
+    assert processor.duplicates.duplicate_sets() == [['1000000000001_front.jpg', '1000000000002_front.jpg']]
+    folders = designer_contents(source)
+    assert sum(len(files) for files in folders.values()) == 11
+    assert any({'1000000000001_front.jpg', '1000000000002_front.jpg'} <= set(files) for files in folders.values())
+    # A completed run leaves no journal to resume
+    assert not os.path.exists(default_journal_path(source))
@@ -0,0 +1,103 @@
+import os
+
+from journal_utils import RunJournal, default_journal_path, read_journal
+from plan_utils import PLAN_FILE, UNDO_FILE, read_plan, undo_moves
+
+from .conftest import designer_contents, write_image
+
+def write_shoot(source, groups=6):
+    """
+    Groups of a white-background and a coloured shot, half of them in a subfolder; returns the
+    relative path of every file
+    """
+    paths = []
+    for number in range(groups):
+        folder = os.path.join(source, 'Shoot_B') if number % 2 else source
+        os.makedirs(folder, exist_ok=True)
+        for view, white in (('front', True), ('back', False)):
+            path = os.path.join(folder, f'20000000000{number:02d}_{view}.png')
+            write_image(path, seed=number * 2 + white, white=white)
+            paths.append(os.path.relpath(path, source))
+    return sorted(paths)
+
+def image_files(source):
+    """
+    Relative paths of the images under source, wherever they are
+    """
+    return sorted(os.path.relpath(os.path.join(root, file), source) for root, _, files in os.walk(source)
+                  for file in files if file.endswith('.png'))
+
+def test_plan_apply_undo_round_trip(source, split):
+    original = write_shoot(source)
+
+    _, planned = split(source, 3, mode='plan')
+    assert planned is not None
+    assert image_files(source) == original
+    assert designer_contents(source) == {}
+    header, entries = read_plan(os.path.join(source, PLAN_FILE))
+    assert header['num_designers'] == 3
+    assert sorted(entry.source for entry in entries) == original
+
+    _, applied = split(source, 3, mode='apply')
+    assert applied is not None
+    assert (applied['white_background'], applied['non_white_background']) == (6, 6)
+    assert sorted(entry.dest for entry in entries) == image_files(source)
+    # Files of a group stay together
+    for files in designer_contents(source).values():
+        ids = [name.split('_')[0] for name in files if name.endswith('.png')]
+        assert all(ids.count(file_id) == 2 for file_id in ids)
+
+    restored, failed = undo_moves(source, os.path.join(source, UNDO_FILE))
+    assert (restored, failed) == (12, 0)
+    assert image_files(source) == original
+    assert designer_contents(source) == {}
+
+def interrupt_run(source, header, moved):
+    """
+    Leave the source folder as a run killed after moving some files would: the moves are journaled
+    and done, the first one also classified
+    """
+    journal = RunJournal(default_journal_path(source), header)
+    os.makedirs(os.path.join(source, 'Designer_1'), exist_ok=True)
+    for number, relative in enumerate(moved):
+        dest = os.path.join('Designer_1', os.path.basename(relative))
+        journal.log_move(relative, dest, 0, os.path.getsize(os.path.join(source, relative)))
+        os.rename(os.path.join(source, relative), os.path.join(source, dest))
+        if number == 0:
+            # A verdict the run would not reach itself, so the test can tell it came from the journal
+            journal.log_result(dest, False, 1, 1)
+    journal.close()
+
+def test_interrupted_run_resumes_from_journal(source, split):
+    write_shoot(source)
+    # The white front shot is journaled as classified non-white
+    moved = ['2000000000000_front.png', '2000000000000_back.png']
+    interrupt_run(source, dict(num_designers=2, balance_mode='count', capacities=None), moved)
+
+    _, stats = split(source, 2)
+
+    assert stats is not None
+    assert stats['total_images'] == 12
+    assert (stats['white_background'], stats['non_white_background']) == (5, 7)
+    folders = designer_contents(source)
+    assert set(os.path.basename(path) for path in moved) <= set(folders['Designer_1'])
+    assert sum(len(files) for files in folders.values()) == 12
+    assert not os.path.exists(default_journal_path(source))
+
+def test_resume_with_other_settings_is_refused(source, split):
+    original = write_shoot(source)
+    moved = [path for path in original if path.startswith('2000000000000_')]
+    interrupt_run(source, dict(num_designers=3, balance_mode='count', capacities=None), moved)
+
+    _, stats = split(source, 2)
+
+    # Nothing is moved and the journal is kept for a run with the right settings
+    assert stats is None
+    assert len(image_files(os.path.join(source, 'Designer_1'))) == 2
+    assert designer_contents(source).keys() == {'Designer_1'}
+    assert len(read_journal(default_journal_path(source)).moves) == 2
+
+    # Starting over splits what is left in the source folder
+    _, stats = split(source, 2, resume=False)
+    assert stats is not None
+    assert stats['total_images'] == 10